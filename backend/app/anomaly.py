@@ -0,0 +1,237 @@
+import math
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.database import engine
+from app.models import AnomalyState
+from app.motor_state import motor_state_store
+from app.notifications import notification_store
+
+# Mesure -> (libellé, unité)
+CHANNELS: Dict[str, Tuple[str, str]] = {
+    "temperature": ("température", "°C"),
+    "vibration": ("vibration", "mm/s"),
+    "current": ("courant", "A"),
+    "speed_rpm": ("vitesse", "tr/min"),
+}
+STATE_FIELDS = ("count", "mean", "variance", "cusum_high", "cusum_low", "in_anomaly", "updated_at")
+
+
+class ChannelState:
+    """Détecteur d'une mesure d'un moteur : quelques flottants, mis à jour en O(1)"""
+    __slots__ = STATE_FIELDS
+
+    def __init__(self, **fields):
+        self.count = fields.get("count", 0)
+        self.mean = fields.get("mean", 0.0)
+        self.variance = fields.get("variance", 0.0)
+        self.cusum_high = fields.get("cusum_high", 0.0)
+        self.cusum_low = fields.get("cusum_low", 0.0)
+        self.in_anomaly = fields.get("in_anomaly", False)
+        self.updated_at = fields.get("updated_at")
+
+
+class AnomalyEvent(NamedTuple):
+    motor_id: int
+    channel: str
+    kind: str  # "spike", "drift_up", "drift_down"
+    value: float
+    mean: float
+    score: float
+    at: datetime
+
+
+class AnomalyDetector:
+    """
+    Détection d'anomalies en ligne sur la télémétrie commitée, par moteur et par mesure.
+    Une moyenne et une variance exponentielles (EWMA) donnent la normale de chaque mesure ;
+    un écart instantané (z-score) signale un pic, un CUSUM sur les écarts normalisés
+    signale une dérive lente (usure de roulement, courant qui monte à vitesse constante).
+    Seules les lectures moteur en marche sont prises en compte. L'état est en mémoire
+    et sauvegardé dans AnomalyState par checkpoint(), jamais sur le chemin d'ingestion.
+    """
+
+    def __init__(
+        self,
+        alpha: float,
+        warmup: int,
+        z_threshold: float,
+        cusum_threshold: float,
+        cusum_slack: float
+    ):
+        self.alpha = alpha
+        self.warmup = warmup
+        self.z_threshold = z_threshold
+        self.cusum_threshold = cusum_threshold
+        self.cusum_slack = cusum_slack
+        self._states: Dict[Tuple[int, str], ChannelState] = {}
+        self._dirty: Set[Tuple[int, str]] = set()
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.detected = 0
+
+    def load(self, session: Session) -> None:
+        """Recharge l'état des détecteurs sauvegardé au dernier checkpoint"""
+        rows = session.exec(select(AnomalyState)).all()
+        with self._lock:
+            self._states = {
+                (row.motor_id, row.channel): ChannelState(**{name: getattr(row, name) for name in STATE_FIELDS})
+                for row in rows
+            }
+            self._dirty.clear()
+
+    def remove_motor(self, motor_id: int) -> None:
+        with self._lock:
+            for channel in CHANNELS:
+                self._states.pop((motor_id, channel), None)
+                self._dirty.discard((motor_id, channel))
+
+    def evaluate(self, rows: List[dict]) -> List[AnomalyEvent]:
+        """Met à jour les détecteurs avec un lot de lectures et retourne les anomalies détectées"""
+        events = []
+        with self._lock:
+            states = self._states
+            for row in sorted(rows, key=lambda row: row["created_at"]):
+                if not row["is_running"]:
+                    continue
+                motor_id = row["motor_id"]
+                at = row["created_at"]
+                for channel in CHANNELS:
+                    key = (motor_id, channel)
+                    state = states.get(key)
+                    if state is None:
+                        state = states[key] = ChannelState()
+                    elif state.updated_at is not None and at < state.updated_at:
+                        # Lot rattrapé : plus ancien que l'état courant
+                        continue
+                    event = self._update(state, row[channel], at)
+                    if event is not None:
+                        events.append(AnomalyEvent(motor_id, channel, *event, at))
+                    self._dirty.add(key)
+                self.evaluated += 1
+        self.detected += len(events)
+        return events
+
+    def _update(self, state: ChannelState, value: float, at: datetime) -> Optional[Tuple[str, float, float, float]]:
+        state.updated_at = at
+        state.count += 1
+        if state.count == 1:
+            state.mean = value
+            return None
+
+        diff = value - state.mean
+        std = max(math.sqrt(state.variance), 1e-3 * abs(state.mean), 1e-6)
+        mean = state.mean
+        # Pendant le rodage, moyenne cumulative pour converger rapidement
+        alpha = max(self.alpha, 1.0 / state.count)
+        state.mean += alpha * diff
+        state.variance = (1 - alpha) * (state.variance + alpha * diff * diff)
+        if state.count <= self.warmup:
+            return None
+
+        z = diff / std
+        state.cusum_high = max(0.0, state.cusum_high + z - self.cusum_slack)
+        state.cusum_low = max(0.0, state.cusum_low - z - self.cusum_slack)
+
+        if state.in_anomaly:
+            # Fin de l'épisode quand la dérive cumulée est résorbée ; le CUSUM est plafonné
+            # pour qu'une longue dérive ne retarde pas indéfiniment ce retour
+            state.cusum_high = min(state.cusum_high, 2 * self.cusum_threshold)
+            state.cusum_low = min(state.cusum_low, 2 * self.cusum_threshold)
+            if abs(z) < 1 and state.cusum_high == 0 and state.cusum_low == 0:
+                state.in_anomaly = False
+            return None
+
+        if abs(z) >= self.z_threshold:
+            event = ("spike", value, mean, z)
+        elif state.cusum_high >= self.cusum_threshold:
+            event = ("drift_up", value, mean, state.cusum_high)
+        elif state.cusum_low >= self.cusum_threshold:
+            event = ("drift_down", value, mean, state.cusum_low)
+        else:
+            return None
+        state.in_anomaly = True
+        return event
+
+    def apply(self, connection: Connection, events: List[AnomalyEvent]) -> None:
+        """Enregistre les anomalies comme notifications de type "anomaly" """
+        if not events:
+            return
+        notifications = []
+        for event in events:
+            label, unit = CHANNELS[event.channel]
+            motor = motor_state_store.get(event.motor_id)
+            name = motor.code if motor else f"#{event.motor_id}"
+            if event.kind == "spike":
+                detail = f"écart de {event.score:+.1f} σ"
+            elif event.kind == "drift_up":
+                detail = "dérive à la hausse"
+            else:
+                detail = "dérive à la baisse"
+            notifications.append({
+                "motor_id": event.motor_id,
+                "user_id": None,
+                "type": "anomaly",
+                "title": "Anomalie détectée",
+                "message": (
+                    f"{name} : {label} {event.value:.1f} {unit}, {detail} "
+                    f"(normale {event.mean:.1f} {unit})"
+                ),
+                "is_read": False,
+                "created_at": event.at,
+            })
+        changes = notification_store.record(connection, notifications)
+        connection.commit()
+        notification_store.committed(changes)
+
+    def checkpoint(self) -> int:
+        """Sauvegarde l'état des détecteurs modifiés (un upsert groupé)"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            params = [
+                {
+                    "motor_id": motor_id,
+                    "channel": channel,
+                    **{name: getattr(self._states[(motor_id, channel)], name) for name in STATE_FIELDS}
+                }
+                for motor_id, channel in dirty if (motor_id, channel) in self._states
+            ]
+        if not params:
+            return 0
+
+        table = AnomalyState.__table__
+        statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["motor_id", "channel"],
+            set_={name: statement.excluded[name] for name in STATE_FIELDS}
+        )
+        try:
+            with engine.begin() as connection:
+                connection.execute(statement, params)
+        except Exception:
+            with self._lock:
+                self._dirty |= {(row["motor_id"], row["channel"]) for row in params}
+            raise
+        return len(params)
+
+    def stats(self) -> dict:
+        return {
+            "tracked_channels": len(self._states),
+            "evaluated": self.evaluated,
+            "detected": self.detected,
+        }
+
+
+anomaly_detector = AnomalyDetector(
+    alpha=settings.anomaly_ewma_alpha,
+    warmup=settings.anomaly_warmup_readings,
+    z_threshold=settings.anomaly_z_threshold,
+    cusum_threshold=settings.anomaly_cusum_threshold,
+    cusum_slack=settings.anomaly_cusum_slack,
+)
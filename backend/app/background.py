@@ -0,0 +1,21 @@
+import asyncio
+import logging
+from typing import Any, Callable
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(interval_seconds: float, func: Callable[[], Any]) -> None:
+    """
+    Exécute `func` (bloquante) dans le threadpool toutes les `interval_seconds`.
+    Une erreur est journalisée sans arrêter la boucle ; à lancer avec asyncio.create_task
+    depuis le lifespan et à annuler à l'arrêt.
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(func)
+        except Exception:
+            logger.exception("Periodic task %s failed", getattr(func, "__qualname__", func))
@@ -0,0 +1,82 @@
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+# Format binaire colonnaire de la télémétrie (négocié via l'en-tête Accept)
+#
+# En-tête (little-endian) : magic b"MGTC", version (u8), flags (u8), nombre de lignes n (u32)
+# puis les colonnes, chacune contiguë :
+#   created_at      : n x int64, epoch en millisecondes (UTC)
+#                     flag DELTA : 1 x int64 absolu puis (n - 1) x int32 d'écarts successifs
+#   temperature     : n x float32
+#   vibration       : n x float32
+#   current         : n x float32
+#   speed_rpm       : n x float32
+#   battery_percent : n x float32 (NaN si absent)
+#   is_running      : n x uint8
+COLUMNAR_MEDIA_TYPE = "application/vnd.motorguard.telemetry-columns"
+COLUMNAR_MAGIC = b"MGTC"
+COLUMNAR_VERSION = 1
+FLAG_DELTA = 0x01
+
+_HEADER = struct.Struct("<4sBBI")
+_INT32_MIN, _INT32_MAX = -2 ** 31, 2 ** 31 - 1
+_UNIX_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def accepts_columnar(accept: Optional[str]) -> bool:
+    """Indique si le client demande le format colonnaire dans son en-tête Accept"""
+    if not accept:
+        return False
+    return any(
+        part.split(";")[0].strip().lower() == COLUMNAR_MEDIA_TYPE
+        for part in accept.split(",")
+    )
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_telemetry_columns(rows: Sequence, delta: bool = False) -> bytes:
+    """
+    Encode des lignes de télémétrie (Row ou objets ayant les mêmes attributs) en colonnes,
+    sans passer par un modèle Pydantic par ligne. L'encodage delta n'est appliqué que si
+    tous les écarts tiennent sur 32 bits.
+    """
+    timestamps = array("q", (
+        # Les datetime de la base sont en UTC naïf
+        (row.created_at - _UNIX_EPOCH) // _MILLISECOND for row in rows
+    ))
+    flags = 0
+    if delta and timestamps:
+        deltas = array("i")
+        previous = timestamps[0]
+        for timestamp in timestamps[1:]:
+            step = timestamp - previous
+            if not _INT32_MIN <= step <= _INT32_MAX:
+                break
+            deltas.append(step)
+            previous = timestamp
+        else:
+            flags |= FLAG_DELTA
+
+    parts = [_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, flags, len(rows))]
+    if flags & FLAG_DELTA:
+        parts.append(_little_endian(array("q", timestamps[:1])))
+        parts.append(_little_endian(deltas))
+    else:
+        parts.append(_little_endian(timestamps))
+    for column in ("temperature", "vibration", "current", "speed_rpm"):
+        parts.append(_little_endian(array("f", (getattr(row, column) for row in rows))))
+    parts.append(_little_endian(array("f", (
+        math.nan if row.battery_percent is None else row.battery_percent for row in rows
+    ))))
+    parts.append(array("B", (1 if row.is_running else 0 for row in rows)).tobytes())
+    return b"".join(parts)
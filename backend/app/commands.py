@@ -0,0 +1,254 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, delete, func, insert, update
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.models import DeviceCommand, ESP32Device
+
+COMMAND_ACTIONS = ("START", "STOP")
+
+_commands = DeviceCommand.__table__
+
+
+class CommandQueue:
+    """
+    File de commandes des ESP32, durable en base (table devicecommand) : chaque commande a
+    un numéro de séquence propre à son ESP32, qui l'acquitte en renvoyant le dernier numéro
+    exécuté (acquittement cumulatif). Une commande non acquittée est remise à nouveau à
+    chaque interrogation jusqu'à son expiration (command_ttl_seconds).
+    L'ESP32 interroge par long-polling : sa requête est mise en attente en mémoire et
+    réveillée dès qu'une commande est commitée pour lui, y compris par le writer de
+    télémétrie (arrêts automatiques du moteur de sécurité). Le dernier numéro attribué et le
+    dernier acquitté de chaque ESP32 sont tenus en mémoire : une interrogation sans
+    commande nouvelle ni acquittement ne fait aucune requête SQL.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._latest: Dict[int, int] = {}  # device_id -> dernier numéro commité
+        self._acked: Dict[int, int] = {}  # device_id -> dernier numéro acquitté
+        # Une requête en attente par ESP32 (une nouvelle interrogation remplace la précédente)
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed = False
+        self.enqueued = 0
+        self.delivered = 0
+        self.acknowledged = 0
+        self.wakeups = 0
+
+    def load(self, session: Session) -> None:
+        """Derniers numéros attribués et acquittés de chaque ESP32, au démarrage"""
+        acked_seq = case((_commands.c.acked_at != None, _commands.c.seq))
+        rows = session.exec(
+            select(_commands.c.device_id, func.max(_commands.c.seq), func.max(acked_seq))
+            .group_by(_commands.c.device_id)
+        ).all()
+        self._latest = {device_id: latest for device_id, latest, _ in rows}
+        self._acked = {device_id: acked for device_id, _, acked in rows if acked is not None}
+        # Boucle d'événements des requêtes : les commandes commitées par un autre thread
+        # y sont signalées
+        self._loop = asyncio.get_running_loop()
+        self._closed = False
+
+    @staticmethod
+    def _next_seq(device_id):
+        """Numéro suivant de la file d'un ESP32, calculé dans l'INSERT"""
+        return (
+            select(func.coalesce(func.max(_commands.c.seq), 0) + 1)
+            .where(_commands.c.device_id == device_id)
+            .scalar_subquery()
+        )
+
+    async def enqueue(
+        self,
+        session: AsyncSession,
+        device_id: int,
+        motor_id: int,
+        action: str,
+        target_speed_rpm: Optional[float] = None,
+        user_id: Optional[int] = None
+    ) -> dict:
+        """
+        Ajoute une commande à la file d'un ESP32 et la commite. Le numéro de séquence est
+        calculé dans l'INSERT (SQLite sérialise les écritures : pas de doublon possible).
+        """
+        now = datetime.utcnow()
+        command_id, seq = (await session.execute(
+            insert(_commands)
+            .values(
+                device_id=device_id, motor_id=motor_id, seq=self._next_seq(device_id), action=action,
+                target_speed_rpm=target_speed_rpm, created_by_user_id=user_id,
+                created_at=now, expires_at=now + self.ttl,
+            )
+            .returning(_commands.c.id, _commands.c.seq)
+        )).one()
+        await session.commit()
+        self.enqueued += 1
+        self._notify(device_id, seq)
+        return {"id": command_id, "device_id": device_id, "seq": seq, "expires_at": now + self.ttl}
+
+    def record_stops(self, connection: Connection, motor_ids: Iterable[int]) -> List[Tuple[int, int]]:
+        """
+        Ajoute une commande STOP à la file de l'ESP32 actif de chaque moteur, dans la
+        transaction en cours de `connection` (writer de télémétrie), sans la commiter.
+        Retourne les (device_id, seq) à passer à committed() après le commit.
+        """
+        motor_ids = list(motor_ids)
+        if not motor_ids:
+            return []
+        # ESP32 actif de chaque moteur (le premier, comme /iot/motor/command)
+        devices = connection.execute(
+            select(ESP32Device.motor_id, func.min(ESP32Device.id))
+            .where(ESP32Device.motor_id.in_(motor_ids))
+            .where(ESP32Device.is_active == True)
+            .group_by(ESP32Device.motor_id)
+        ).all()
+        now = datetime.utcnow()
+        queued = []
+        for motor_id, device_id in devices:
+            seq = connection.execute(
+                insert(_commands)
+                .values(
+                    device_id=device_id, motor_id=motor_id, seq=self._next_seq(device_id),
+                    action="STOP", created_at=now, expires_at=now + self.ttl,
+                )
+                .returning(_commands.c.seq)
+            ).scalar_one()
+            queued.append((device_id, seq))
+        return queued
+
+    def committed(self, queued: List[Tuple[int, int]]) -> None:
+        """Signale des commandes commitées par un autre thread (retour de record_stops)"""
+        if not queued:
+            return
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            for device_id, seq in queued:
+                self._latest[device_id] = max(seq, self._latest.get(device_id, 0))
+            self.enqueued += len(queued)
+            return
+        loop.call_soon_threadsafe(self._notify_all, queued)
+
+    def _notify_all(self, queued: List[Tuple[int, int]]) -> None:
+        self.enqueued += len(queued)
+        for device_id, seq in queued:
+            self._notify(device_id, seq)
+
+    def _notify(self, device_id: int, seq: int) -> None:
+        self._latest[device_id] = max(seq, self._latest.get(device_id, 0))
+        waiter = self._waiters.pop(device_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(True)
+            self.wakeups += 1
+
+    async def poll(self, session: AsyncSession, device_id: int, after: int, wait: float) -> List[dict]:
+        """
+        Interrogation d'un ESP32 : acquitte les commandes jusqu'à `after` (dernier numéro
+        exécuté), puis retourne les commandes suivantes non acquittées et non expirées,
+        en attendant au plus `wait` secondes qu'il y en ait.
+        """
+        # Un numéro au-delà du dernier attribué ne peut rien acquitter de plus
+        after = min(after, self._latest.get(device_id, 0))
+        if after > self._acked.get(device_id, 0):
+            result = await session.execute(
+                update(_commands)
+                .where(_commands.c.device_id == device_id)
+                .where(_commands.c.seq <= after)
+                .where(_commands.c.acked_at == None)
+                .values(acked_at=datetime.utcnow())
+            )
+            await session.commit()
+            self._acked[device_id] = after
+            self.acknowledged += result.rowcount
+
+        known = max(after, self._acked.get(device_id, 0))
+        latest = self._latest.get(device_id, 0)
+        if latest > known:
+            commands = await self._deliver(session, device_id, known)
+            if commands or wait <= 0:
+                return commands
+            # Commandes restantes toutes expirées : attendre une commande plus récente
+            known = latest
+        elif wait <= 0:
+            return []
+
+        if await self._wait(device_id, known, wait):
+            return await self._deliver(session, device_id, known)
+        return []
+
+    async def _deliver(self, session: AsyncSession, device_id: int, after: int) -> List[dict]:
+        """Commandes à remettre, marquées remises (première remise) dans la même requête"""
+        now = datetime.utcnow()
+        rows = (await session.execute(
+            update(_commands)
+            .where(_commands.c.device_id == device_id)
+            .where(_commands.c.seq > after)
+            .where(_commands.c.acked_at == None)
+            .where(_commands.c.expires_at > now)
+            .values(delivered_at=func.coalesce(_commands.c.delivered_at, now))
+            .returning(*_commands.c)
+        )).mappings().all()
+        await session.commit()
+        self.delivered += len(rows)
+        # RETURNING ne garantit pas l'ordre des lignes
+        return sorted((dict(row) for row in rows), key=lambda row: row["seq"])
+
+    async def _wait(self, device_id: int, after: int, timeout: float) -> bool:
+        """Attend une commande de numéro supérieur à `after` ; False à l'expiration du délai"""
+        if self._closed:
+            return False
+        if self._latest.get(device_id, 0) > after:
+            return True
+        previous = self._waiters.pop(device_id, None)
+        if previous is not None and not previous.done():
+            # L'ESP32 s'est reconnecté : l'ancienne requête se termine sans commande
+            previous.set_result(False)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[device_id] = waiter
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if self._waiters.get(device_id) is waiter:
+                del self._waiters[device_id]
+
+    async def remove_device(self, session: AsyncSession, device_id: int) -> None:
+        """Supprime la file d'un ESP32 (à appeler avant le commit de sa suppression)"""
+        await session.execute(delete(_commands).where(_commands.c.device_id == device_id))
+
+    def forget_device(self, device_id: int) -> None:
+        """Oublie un ESP32 supprimé (après commit) et termine sa requête en attente"""
+        self._latest.pop(device_id, None)
+        self._acked.pop(device_id, None)
+        waiter = self._waiters.pop(device_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(False)
+
+    def close(self) -> None:
+        """Termine les requêtes en attente (arrêt du serveur)"""
+        self._closed = True
+        for waiter in self._waiters.values():
+            if not waiter.done():
+                waiter.set_result(False)
+        self._waiters.clear()
+
+    def stats(self) -> dict:
+        return {
+            "waiting_devices": len(self._waiters),
+            "unacknowledged": sum(
+                latest - self._acked.get(device_id, 0) for device_id, latest in self._latest.items()
+            ),
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "acknowledged": self.acknowledged,
+            "wakeups": self.wakeups,
+        }
+
+
+command_queue = CommandQueue(ttl_seconds=settings.command_ttl_seconds)
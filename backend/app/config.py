@@ -0,0 +1,82 @@
+from typing import Literal, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Configuration de l'application, surchargeable par variables d'environnement MOTORGUARD_*"""
+    model_config = SettingsConfigDict(env_prefix="MOTORGUARD_", env_file=".env", extra="ignore")
+
+    # Base SQLite : profil appliqué à chaque connexion (PRAGMA)
+    database_path: str = "./motorguard.db"
+    database_echo: bool = False  # Journaliser chaque requête SQL (débogage)
+    sqlite_journal_mode: Literal["WAL", "DELETE", "TRUNCATE"] = "WAL"  # WAL : les lectures ne bloquent pas l'écriture
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL"] = "NORMAL"  # NORMAL : pas de fsync par commit en WAL
+    sqlite_cache_size_kib: int = 65_536  # Cache de pages par connexion
+    sqlite_mmap_size_mb: int = 256  # Lecture de la base par mmap (0 : désactivé)
+    sqlite_busy_timeout_ms: int = 5000  # Attente d'un verrou avant "database is locked"
+    database_read_pool_size: int = 8  # Connexions des routes en lecture seule
+
+    # Ingestion de la télémétrie (write-behind + group commit)
+    # "commit" : la requête est acquittée après le commit du lot qui la contient
+    # "enqueue" : la requête est acquittée dès la mise en file (perte possible en cas de crash)
+    ingest_durability: Literal["commit", "enqueue"] = "commit"
+    ingest_flush_interval_ms: int = 50  # Délai max avant le commit d'un lot
+    ingest_batch_rows: int = 1000  # Taille max d'un lot (commit anticipé au-delà)
+    ingest_max_pending_rows: int = 100_000  # Au-delà, les nouvelles lectures sont refusées (503)
+
+    # Stockage de la télémétrie partitionné par période
+    telemetry_partition_days: int = 1  # Largeur d'une partition (1 = jour, 7 = semaine)
+    telemetry_retention_days: Optional[int] = None  # None : conservation illimitée
+    telemetry_retention_check_interval_seconds: float = 3600
+
+    # État en direct des moteurs, réécrit dans la table Motor à cet intervalle
+    motor_state_checkpoint_interval_seconds: float = 5
+
+    # Détection d'anomalies en ligne (EWMA + CUSUM par moteur et par mesure)
+    anomaly_ewma_alpha: float = 0.02  # Poids d'une nouvelle lecture dans la moyenne/variance
+    anomaly_warmup_readings: int = 200  # Lectures nécessaires avant toute alerte
+    anomaly_z_threshold: float = 4.0  # Écart instantané en nombre d'écarts-types
+    anomaly_cusum_threshold: float = 8.0  # Dérive cumulée (en écarts-types) avant alerte
+    anomaly_cusum_slack: float = 0.5  # Écart toléré par lecture dans le CUSUM
+    anomaly_checkpoint_interval_seconds: float = 60
+
+    # Notifications : une alerte identique (même moteur, même type) dans ce délai
+    # est regroupée sur la notification existante au lieu de créer une ligne
+    notification_cooldown_seconds: float = 600
+
+    # Diffusion en direct (WebSocket / SSE)
+    live_queue_size: int = 1000  # Messages en attente par abonné avant sa déconnexion
+    live_keepalive_seconds: float = 15
+
+    # Vue d'ensemble du parc (GET /fleet/overview)
+    fleet_online_timeout_seconds: float = 60  # Sans contact de l'ESP32 depuis ce délai : hors ligne
+
+    # File de commandes des ESP32 (GET /iot/commands, long-polling)
+    command_ttl_seconds: float = 300  # Commande non remise dans ce délai : abandonnée
+    command_poll_max_wait_seconds: float = 60  # Attente maximale d'un long-polling
+
+    # Authentification des ESP32
+    device_cache_size: int = 10_000
+    device_cache_ttl_seconds: float = 300  # Filet de sécurité si la base est modifiée hors API
+    # Clés inconnues ou inactives, à part : des clés aléatoires n'évincent pas les ESP32 valides
+    unknown_api_key_cache_size: int = 1_000
+    unknown_api_key_cache_ttl_seconds: float = 10
+    last_seen_flush_interval_seconds: float = 10
+
+    # Authentification des utilisateurs
+    user_cache_size: int = 10_000
+    user_cache_ttl_seconds: float = 60
+    access_token_expire_minutes: int = 60
+    refresh_token_expire_days: int = 30  # Renouvelé à chaque /auth/refresh
+
+    # Mots de passe : bcrypt dans un pool de processus dédié
+    password_hash_rounds: int = 12  # Coût bcrypt ; les hash d'un autre coût sont refaits à la connexion
+    password_hash_workers: Optional[int] = None  # None : un processus par cœur
+    password_hash_max_pending: int = 256  # Au-delà, les connexions sont refusées (503)
+
+    # Métriques Prometheus (GET /metrics)
+    metrics_token: Optional[str] = None  # Si défini, exigé en "Authorization: Bearer <jeton>"
+
+
+settings = Settings()
@@ -1,11 +1,140 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
-from pathlib import Path
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, Union
+
+from app.config import settings
+from app.metrics import sql_metrics
 
 # Chemin vers la base de données SQLite
-DATABASE_URL = "sqlite:///./motorguard.db"
+DATABASE_URL = f"sqlite:///{settings.database_path}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{settings.database_path}"
+
+
+def sqlite_pragmas() -> Dict[str, Union[str, int]]:
+    """PRAGMA du profil SQLite défini dans les paramètres"""
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "cache_size": -settings.sqlite_cache_size_kib,
+        "mmap_size": settings.sqlite_mmap_size_mb * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+
+
+def set_sqlite_pragmas(sync_engine: Engine, pragmas: Dict[str, Union[str, int]], query_only: bool = False) -> None:
+    """Applique des PRAGMA à chaque nouvelle connexion d'un moteur (synchrone ou asynchrone)"""
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if query_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+
+
+class WriteLockMeter:
+    """
+    Mesure l'attente du verrou d'écriture SQLite (un seul écrivain à la fois).
+    Une transaction prend le verrou à sa première instruction d'écriture, qui attend
+    jusqu'à busy_timeout tant qu'un autre écrivain le détient : la durée de cette
+    instruction est comptée comme attente (majorant : elle inclut son exécution).
+    Les erreurs "database is locked" (busy_timeout dépassé) sont comptées à part.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.transactions = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.locked_errors = 0
+
+    def attach(self, sync_engine: Engine) -> None:
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_execute(connection, cursor, statement, parameters, context, executemany):
+            if "write_lock" not in connection.info and statement.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+                connection.info["write_lock"] = time.perf_counter()
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_execute(connection, cursor, statement, parameters, context, executemany):
+            started = connection.info.get("write_lock")
+            if started:
+                connection.info["write_lock"] = None  # Verrou détenu jusqu'à la fin de la transaction
+                self._record(time.perf_counter() - started)
+
+        @event.listens_for(sync_engine, "commit")
+        @event.listens_for(sync_engine, "rollback")
+        def end_transaction(connection):
+            connection.info.pop("write_lock", None)
 
-# Créer le moteur de base de données
-engine = create_engine(DATABASE_URL, echo=True, connect_args={"check_same_thread": False})
+        @event.listens_for(sync_engine, "checkin")
+        def checkin(dbapi_connection, connection_record):
+            # Connexion rendue au pool sans commit : annulée par le pool
+            connection_record.info.pop("write_lock", None)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(context):
+            if context.connection is not None:
+                context.connection.info.pop("write_lock", None)
+            if "database is locked" in str(context.original_exception):
+                with self._lock:
+                    self.locked_errors += 1
+
+    def _record(self, wait: float) -> None:
+        with self._lock:
+            self.transactions += 1
+            self.wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "wait_seconds": round(self.wait_seconds, 6),
+                "max_wait_seconds": round(self.max_wait_seconds, 6),
+                "locked_errors": self.locked_errors,
+            }
+
+
+write_lock_meter = WriteLockMeter()
+
+# Créer le moteur de base de données (démarrage, writer d'ingestion, tâches de fond)
+engine = create_engine(
+    DATABASE_URL, echo=settings.database_echo, connect_args={"check_same_thread": False}
+)
+set_sqlite_pragmas(engine, sqlite_pragmas())
+write_lock_meter.attach(engine)
+sql_metrics.attach(engine, "sync")
+
+# Moteurs asynchrones des routes : une requête en attente de SQLite n'occupe pas de thread.
+# SQLite n'accepte qu'un écrivain à la fois : les routes qui modifient la base partagent
+# une seule connexion, les routes en lecture seule un pool de connexions (query_only),
+# qui en WAL lisent pendant les écritures sans les bloquer.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, echo=settings.database_echo, pool_size=1, max_overflow=0
+)
+set_sqlite_pragmas(async_engine.sync_engine, sqlite_pragmas())
+write_lock_meter.attach(async_engine.sync_engine)
+sql_metrics.attach(async_engine.sync_engine, "writer")
+
+async_read_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=settings.database_echo,
+    pool_size=settings.database_read_pool_size,
+    max_overflow=0
+)
+set_sqlite_pragmas(async_read_engine.sync_engine, sqlite_pragmas(), query_only=True)
+sql_metrics.attach(async_read_engine.sync_engine, "reader")
 
 
 def create_db_and_tables():
@@ -18,3 +147,18 @@ def get_session():
     with Session(engine) as session:
         yield session
 
+
+async def get_async_session():
+    """
+    Dépendance pour obtenir une session asynchrone (routes qui modifient la base).
+    Les objets restent utilisables après commit (pas de rechargement implicite, impossible en asynchrone) :
+    les modèles n'ont pas de valeur calculée par la base hors id, inutile de les recharger (refresh).
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+async def get_async_read_session():
+    """Dépendance pour obtenir une session asynchrone en lecture seule (pool de lecteurs)"""
+    async with AsyncSession(async_read_engine) as session:
+        yield session
@@ -1,13 +1,18 @@
 from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import bindparam, update
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from jose import JWTError, jwt
-import bcrypt
-from typing import Optional
+import threading
+from typing import Dict, Optional
 
-from app.database import get_session
+from app.cache import MISSING, TTLCache
+from app.config import settings
+from app.database import async_read_engine, engine
 from app.models import User, ESP32Device
-from datetime import datetime
+from app.passwords import check_password, hash_password
+from datetime import datetime, timedelta
 
 # Configuration JWT
 SECRET_KEY = "motorguard-secret-key-change-in-production"
@@ -23,34 +28,88 @@ oauth2_scheme = OAuth2PasswordBearer(
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Vérifie un mot de passe en clair contre un hash"""
-    try:
-        # Si le hash commence par $2b$, c'est un hash bcrypt
-        if hashed_password.startswith("$2b$") or hashed_password.startswith("$2a$"):
-            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-        # Sinon, comparaison directe (pour compatibilité avec les mots de passe en clair en dev)
-        return plain_password == hashed_password
-    except Exception:
-        return False
+    """Vérifie un mot de passe en clair contre un hash (bloquant, voir app/passwords.py)"""
+    return check_password(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash un mot de passe"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash un mot de passe au coût configuré (bloquant, voir app/passwords.py)"""
+    return hash_password(password, settings.password_hash_rounds)
 
 
 def create_access_token(data: dict) -> str:
-    """Crée un token JWT"""
+    """Crée un token JWT d'accès, valable access_token_expire_minutes"""
     to_encode = data.copy()
+    to_encode.update({
+        "type": "access",
+        "exp": datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes),
+    })
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_refresh_token(user_id: int) -> str:
+    """Crée un token de rafraîchissement, échangeable contre un token d'accès sans mot de passe"""
+    to_encode = {
+        "sub": str(user_id),
+        "type": "refresh",
+        "exp": datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days),
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def create_tokens(user_id: int) -> dict:
+    """Réponse d'une connexion : token d'accès et token de rafraîchissement"""
+    return {
+        "access_token": create_access_token(data={"sub": str(user_id)}),
+        "token_type": "bearer",
+        "expires_in": settings.access_token_expire_minutes * 60,
+        "refresh_token": create_refresh_token(user_id),
+    }
+
+
+def decode_token(token: str, token_type: str) -> Optional[int]:
+    """
+    Retourne l'id utilisateur d'un token valide du type attendu, None sinon.
+    Les tokens émis avant l'ajout du champ "type" sont des tokens d'accès.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("type", "access") != token_type:
+            return None
+        return int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
+        return None
+
+
+# Cache des principaux authentifiés : user_id -> User (détaché de sa session)
+user_cache = TTLCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds)
+
+
+def invalidate_user(user_id: int) -> None:
+    """À appeler après le commit de toute modification du rôle ou de l'état d'un utilisateur"""
+    user_cache.invalidate(user_id)
+
+
+async def _load_user(user_id: int) -> Optional[User]:
+    async with AsyncSession(async_read_engine) as session:
+        statement = select(User).where(User.id == user_id)
+        return (await session.exec(statement)).first()
+
+
+async def get_user(user_id: int) -> Optional[User]:
+    """Utilisateur par id, depuis le cache des principaux ou la base"""
+    user = user_cache.get(user_id)
+    if user is MISSING:
+        generation = user_cache.generation
+        user = await _load_user(user_id)
+        if user is not None:
+            user_cache.set(user_id, user, generation=generation)
+    return user
+
+
 async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    session: Session = Depends(get_session)
+    token: str = Depends(oauth2_scheme)
 ) -> User:
     """Récupère l'utilisateur actuel à partir du token JWT"""
     credentials_exception = HTTPException(
@@ -58,16 +117,11 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
+    user_id = decode_token(token, "access")
+    if user_id is None:
         raise credentials_exception
     
-    statement = select(User).where(User.id == user_id)
-    user = session.exec(statement).first()
+    user = await get_user(user_id)
     if user is None:
         raise credentials_exception
     return user
@@ -96,16 +150,110 @@ async def get_current_admin_user(
 
 
 
+class LastSeenTracker:
+    """
+    Regroupe en mémoire les mises à jour de ESP32Device.last_seen.
+    flush() les écrit toutes en un seul UPDATE groupé ; il est appelé périodiquement
+    et à l'arrêt du serveur, si bien que last_seen a au plus un intervalle de retard.
+    """
+
+    def __init__(self, online_timeout_seconds: float):
+        self._pending: Dict[int, datetime] = {}
+        # Dernier contact connu de chaque device depuis le démarrage (vue d'ensemble du parc)
+        self._latest: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self._online_timeout = timedelta(seconds=online_timeout_seconds)
+        # Incrémentée quand un device (re)passe en ligne, pas à chaque contact : la vue
+        # d'ensemble n'est pas reconstruite à chaque requête d'un ESP32 déjà en ligne
+        self.version = 0
+
+    def touch(self, device_id: int) -> None:
+        now = datetime.utcnow()
+        with self._lock:
+            previous = self._latest.get(device_id)
+            self._pending[device_id] = self._latest[device_id] = now
+            if previous is None or now - previous >= self._online_timeout:
+                self.version += 1
+
+    def discard(self, device_id: int) -> None:
+        with self._lock:
+            self._pending.pop(device_id, None)
+            self._latest.pop(device_id, None)
+
+    def latest(self) -> Dict[int, datetime]:
+        """Dernier contact de chaque device vu depuis le démarrage (y compris déjà écrit en base)"""
+        with self._lock:
+            return dict(self._latest)
+
+    def flush(self) -> int:
+        """Écrit les last_seen en attente et retourne le nombre de devices mis à jour"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        # UPDATE Core (et non ORM) : un device supprimé entre-temps est simplement ignoré
+        table = ESP32Device.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("device_id"))
+            .values(last_seen=bindparam("seen"))
+        )
+        with Session(engine) as session:
+            session.exec(
+                statement,
+                params=[{"device_id": device_id, "seen": seen} for device_id, seen in pending.items()]
+            )
+            session.commit()
+        return len(pending)
+
+
+# Cache API Key -> ESP32Device des clés valides, et cache négatif (petit, de courte
+# durée) des clés inconnues ou inactives : un client qui envoie des clés aléatoires
+# ne remplit que ce dernier et n'évince pas les ESP32 valides
+esp32_device_cache = TTLCache(
+    maxsize=settings.device_cache_size,
+    ttl=settings.device_cache_ttl_seconds
+)
+unknown_api_key_cache = TTLCache(
+    maxsize=settings.unknown_api_key_cache_size,
+    ttl=settings.unknown_api_key_cache_ttl_seconds
+)
+last_seen_tracker = LastSeenTracker(online_timeout_seconds=settings.fleet_online_timeout_seconds)
+
+
+def invalidate_esp32_device(api_key: str) -> None:
+    """
+    À appeler après le commit de toute modification de l'API Key, de l'état ou du
+    moteur d'un ESP32 (un chargement concurrent plus ancien ne sera pas remis en cache)
+    """
+    esp32_device_cache.invalidate(api_key)
+    unknown_api_key_cache.invalidate(api_key)
+
+
+async def _load_esp32_device(api_key: str) -> Optional[ESP32Device]:
+    async with AsyncSession(async_read_engine) as session:
+        statement = select(ESP32Device).where(
+            ESP32Device.api_key == api_key,
+            ESP32Device.is_active == True
+        )
+        return (await session.exec(statement)).first()
+
+
 async def get_esp32_device_by_api_key(
-    x_api_key: str = Header(..., alias="X-API-Key", description="API Key de l'ESP32"),
-    session: Session = Depends(get_session)
+    x_api_key: str = Header(..., alias="X-API-Key", description="API Key de l'ESP32")
 ) -> ESP32Device:
     """Vérifie l'API Key de l'ESP32 et retourne le device"""
-    statement = select(ESP32Device).where(
-        ESP32Device.api_key == x_api_key,
-        ESP32Device.is_active == True
-    )
-    device = session.exec(statement).first()
+    device = esp32_device_cache.get(x_api_key)
+    if device is MISSING:
+        device = unknown_api_key_cache.get(x_api_key)  # None : clé connue comme invalide
+    if device is MISSING:
+        # Chargement asynchrone, puis mise en cache (l'absence dans le cache négatif)
+        generations = (esp32_device_cache.generation, unknown_api_key_cache.generation)
+        device = await _load_esp32_device(x_api_key)
+        if device is not None:
+            esp32_device_cache.set(x_api_key, device, generation=generations[0])
+        else:
+            unknown_api_key_cache.set(x_api_key, None, generation=generations[1])
     
     if not device:
         raise HTTPException(
@@ -113,11 +261,7 @@ async def get_esp32_device_by_api_key(
             detail="Invalid or inactive API key"
         )
     
-    # Mettre à jour last_seen
-    device.last_seen = datetime.utcnow()
-    session.add(device)
-    session.commit()
-    session.refresh(device)
+    # Mettre à jour last_seen (écrit en base par lots)
+    last_seen_tracker.touch(device.id)
     
     return device
-
@@ -0,0 +1,130 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.deps import last_seen_tracker
+from app.models import ESP32Device, MaintenanceTask
+from app.motor_state import IDENTITY_FIELDS, LIVE_FIELDS, motor_state_store
+from app.safety_engine import safety_engine
+from app.schemas import FleetOverviewResponse
+
+OPEN_TASK_STATUSES = ("PLANNED", "IN_PROGRESS")
+
+
+class FleetSnapshot(NamedTuple):
+    """Vue d'ensemble sérialisée, son ETag et les versions des sources dont elle est issue"""
+    body: bytes
+    etag: str
+    versions: Tuple[int, ...]
+    expires_at: Optional[datetime]  # Premier passage hors ligne d'un moteur en ligne
+
+
+class FleetOverview:
+    """
+    Vue d'ensemble du parc, assemblée depuis l'état en mémoire (valeurs en direct, sécurité,
+    derniers contacts des ESP32) et deux requêtes groupées (ESP32 par moteur, tâches ouvertes
+    par moteur) gardées jusqu'à invalidate(). La réponse sérialisée est réutilisée tant que
+    les versions des sources n'ont pas changé et qu'aucun moteur n'a dépassé le délai hors
+    ligne : un rafraîchissement sans changement ne coûte qu'une comparaison.
+    """
+
+    def __init__(self):
+        self.generation = 0  # Incrémentée par invalidate()
+        self._loaded_generation = -1
+        self._devices: Dict[int, Tuple[int, Optional[datetime]]] = {}  # id -> (motor_id, last_seen en base)
+        self._open_tasks: Dict[int, int] = {}
+        self._snapshot: Optional[FleetSnapshot] = None
+        self.builds = 0
+        self.reused = 0
+
+    def invalidate(self) -> None:
+        """À appeler après le commit d'une modification des ESP32 ou des tâches de maintenance"""
+        self.generation += 1
+
+    async def snapshot(self, session: AsyncSession) -> FleetSnapshot:
+        now = datetime.utcnow()
+        # Versions lues avant les données : un changement concurrent forcera la reconstruction suivante
+        versions = (
+            motor_state_store.version, safety_engine.version, last_seen_tracker.version, self.generation
+        )
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.versions == versions and (
+            snapshot.expires_at is None or now < snapshot.expires_at
+        ):
+            self.reused += 1
+            return snapshot
+
+        if self._loaded_generation != versions[3]:
+            await self._load(session, versions[3])
+        snapshot = self._snapshot = self._build(now, versions)
+        self.builds += 1
+        return snapshot
+
+    async def _load(self, session: AsyncSession, generation: int) -> None:
+        devices = (await session.exec(
+            select(ESP32Device.id, ESP32Device.motor_id, ESP32Device.last_seen)
+            .where(ESP32Device.motor_id != None, ESP32Device.is_active == True)
+        )).all()
+        open_tasks = (await session.exec(
+            select(MaintenanceTask.motor_id, func.count())
+            .where(MaintenanceTask.status.in_(OPEN_TASK_STATUSES))
+            .group_by(MaintenanceTask.motor_id)
+        )).all()
+        self._devices = {device_id: (motor_id, last_seen) for device_id, motor_id, last_seen in devices}
+        self._open_tasks = dict(open_tasks)
+        self._loaded_generation = generation
+
+    def _build(self, now: datetime, versions: Tuple[int, ...]) -> FleetSnapshot:
+        # Dernier contact par moteur : le plus récent de ses ESP32 (mémoire, sinon base)
+        contacts = last_seen_tracker.latest()
+        last_seen: Dict[int, datetime] = {}
+        for device_id, (motor_id, stored) in self._devices.items():
+            seen = contacts.get(device_id, stored)
+            if seen is not None and (motor_id not in last_seen or seen > last_seen[motor_id]):
+                last_seen[motor_id] = seen
+
+        safety = safety_engine.motor_status()
+        timeout = timedelta(seconds=settings.fleet_online_timeout_seconds)
+        expires_at = None
+        motors = []
+        for state in motor_state_store.all():
+            seen = max((t for t in (last_seen.get(state.id), state.last_update) if t is not None), default=None)
+            online = seen is not None and now - seen < timeout
+            if online and (expires_at is None or seen + timeout < expires_at):
+                expires_at = seen + timeout
+            safety_status, violations = safety.get(state.id, ("UNMONITORED", []))
+            motors.append({
+                **{name: getattr(state, name) for name in IDENTITY_FIELDS + LIVE_FIELDS},
+                "last_seen": seen,
+                "online": online,
+                "safety_status": safety_status,
+                "safety_violations": violations,
+                "open_tasks": self._open_tasks.get(state.id, 0),
+            })
+
+        overview = FleetOverviewResponse(
+            online_timeout_seconds=settings.fleet_online_timeout_seconds, motors=motors
+        )
+        body = overview.model_dump_json().encode()
+        # ETag sans last_seen, qui avance à chaque contact : seul le passage en ligne ou
+        # hors ligne (online) change l'ETag, un client à jour reçoit 304
+        etag_input = overview.model_dump_json(exclude={"motors": {"__all__": {"last_seen"}}}).encode()
+        etag = f'"{hashlib.blake2b(etag_input, digest_size=12).hexdigest()}"'
+        return FleetSnapshot(body, etag, versions, expires_at)
+
+    def stats(self) -> dict:
+        return {"builds": self.builds, "reused": self.reused}
+
+
+fleet_overview = FleetOverview()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Vrai si l'en-tête If-None-Match désigne l'ETag courant (comparaison faible)"""
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
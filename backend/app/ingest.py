@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Deque, List, Optional, Sequence, Tuple, Union
+
+from fastapi import HTTPException, status
+from sqlalchemy import insert
+from sqlalchemy.engine import Connection
+from sqlmodel import Session
+
+from app.anomaly import anomaly_detector
+from app.config import settings
+from app.database import engine
+from app.motor_state import motor_state_store
+from app.partitions import retention_cutoff, telemetry_partitions
+from app.pubsub import telemetry_bus
+from app.rollups import upsert_rollups
+from app.safety_engine import safety_engine
+from app.schemas import TelemetryCreate, TelemetryReading
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_timestamp(timestamp: Optional[datetime], default: datetime) -> datetime:
+    """
+    Convertit l'horodatage d'un ESP32 en UTC naïf (convention de la base).
+    Une horloge en avance est ramenée à l'heure de réception.
+    """
+    if timestamp is None:
+        return default
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(timestamp, default)
+
+
+def build_telemetry_rows(
+    motor_id: int,
+    readings: Sequence[Union[TelemetryCreate, TelemetryReading]]
+) -> List[dict]:
+    """Prépare les lignes de télémétrie à insérer (horodatées à la réception si l'ESP32 ne l'a pas fait)"""
+    now = datetime.utcnow()
+    return [
+        {
+            "motor_id": motor_id,
+            "temperature": reading.temperature,
+            "vibration": reading.vibration,
+            "current": reading.current,
+            "speed_rpm": reading.speed_rpm,
+            "is_running": reading.is_running,
+            "battery_percent": reading.battery_percent,
+            "created_at": normalize_timestamp(getattr(reading, "timestamp", None), now),
+        }
+        for reading in readings
+    ]
+
+
+def storable_rows(rows: List[dict]) -> List[dict]:
+    """Écarte les lectures déjà hors de la période de rétention"""
+    cutoff = retention_cutoff()
+    if cutoff is None:
+        return rows
+    return [row for row in rows if row["created_at"] >= cutoff]
+
+
+def write_telemetry_rows(session: Session, rows: List[dict]) -> None:
+    """
+    Insère des lectures (éventuellement de plusieurs moteurs) avec une requête
+    multi-lignes par partition et les fusionne dans les agrégats 1m/1h/1d.
+    Les partitions doivent exister (TelemetryPartitions.ensure) ; le commit reste
+    à la charge de l'appelant. L'état des moteurs est tenu en mémoire (app/motor_state.py).
+    """
+    if not rows:
+        return
+
+    rows_by_partition = {}
+    for row in rows:
+        partition = telemetry_partitions.find(row["created_at"])
+        if partition is None:
+            raise RuntimeError(f"No telemetry partition for {row['created_at']}")
+        rows_by_partition.setdefault(partition.table, []).append(row)
+    for table, partition_rows in rows_by_partition.items():
+        session.exec(insert(table), params=partition_rows)
+    upsert_rollups(session, rows)
+
+
+class IngestQueueFull(Exception):
+    """La file d'ingestion a atteint sa capacité maximale"""
+
+
+class IngestBuffer:
+    """
+    File d'ingestion en mémoire vidée par un thread d'écriture unique.
+    Les lectures sont regroupées et commitées ensemble toutes les `flush_interval_ms`
+    ou dès que `batch_rows` lignes sont en attente (group commit).
+
+    Le writer étant le seul à insérer de la télémétrie, les id sont attribués dès la
+    mise en file (un seul processus serveur par base). Chaque soumission reçoit un
+    Future résolu avec ses id une fois le lot commité.
+    """
+
+    def __init__(self, flush_interval_ms: int, batch_rows: int, max_pending_rows: int):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_rows = batch_rows
+        self.max_pending_rows = max_pending_rows
+        self._items: Deque[Tuple[List[dict], Future]] = deque()
+        self._pending_rows = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._connection: Optional[Connection] = None
+        self._next_id = 1
+        # Compteurs (le writer est le seul à modifier committed_*)
+        self.committed_rows = 0
+        self.committed_batches = 0
+        self.rejected_rows = 0
+
+    @property
+    def pending_rows(self) -> int:
+        return self._pending_rows
+
+    def start(self) -> None:
+        """Démarre le thread d'écriture"""
+        if self._thread and self._thread.is_alive():
+            return
+        with engine.connect() as connection:
+            self._next_id = telemetry_partitions.max_id(connection) + 1
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Arrête le thread d'écriture après avoir commité tout ce qui est en file"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, rows: List[dict]) -> Tuple[List[int], Future]:
+        """Met des lignes en file et retourne leurs id ainsi qu'un Future résolu au commit"""
+        future: Future = Future()
+        with self._condition:
+            if self._stopping or not self._thread:
+                raise RuntimeError("Ingest buffer is not running")
+            if self._pending_rows + len(rows) > self.max_pending_rows:
+                self.rejected_rows += len(rows)
+                raise IngestQueueFull()
+            ids = list(range(self._next_id, self._next_id + len(rows)))
+            self._next_id += len(rows)
+            for row, telemetry_id in zip(rows, ids):
+                row["id"] = telemetry_id
+            self._items.append((rows, future))
+            self._pending_rows += len(rows)
+            if self._pending_rows >= self.batch_rows:
+                self._condition.notify()
+            elif len(self._items) == 1:
+                # Réveiller le writer pour qu'il démarre le délai de flush
+                self._condition.notify()
+        return ids, future
+
+    def _run(self) -> None:
+        # Le writer garde sa propre connexion : il ne doit jamais attendre le pool
+        # occupé par les requêtes qui attendent justement son commit
+        with engine.connect() as connection:
+            self._connection = connection
+            self._drain()
+        self._connection = None
+
+    def _drain(self) -> None:
+        while True:
+            with self._condition:
+                while not self._items and not self._stopping:
+                    self._condition.wait()
+                if not self._items:
+                    return
+
+                # Attendre que le lot se remplisse, sans dépasser le délai de flush
+                deadline = time.monotonic() + self.flush_interval
+                while self._pending_rows < self.batch_rows and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = []
+                batch_rows = 0
+                while self._items and batch_rows < self.batch_rows:
+                    rows, future = self._items.popleft()
+                    batch.append((rows, future))
+                    batch_rows += len(rows)
+                self._pending_rows -= batch_rows
+
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[List[dict], Future]]) -> None:
+        """Commite un lot en une transaction ; en cas d'échec, isole les soumissions fautives"""
+        try:
+            self._write([row for rows, _ in batch for row in rows])
+        except Exception:
+            for item in batch:
+                self._commit_one(item)
+            return
+
+        self._committed([row for rows, _ in batch for row in rows])
+        for _, future in batch:
+            future.set_result(None)
+
+    def _commit_one(self, item: Tuple[List[dict], Future]) -> None:
+        rows, future = item
+        try:
+            self._write(rows)
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            self._committed(rows)
+            future.set_result(None)
+
+    def _committed(self, rows: List[dict]) -> None:
+        # Après le commit et avant d'acquitter : état en direct des moteurs, règles de
+        # sécurité (alertes et arrêts automatiques), anomalies, diffusion aux abonnés
+        self.committed_rows += len(rows)
+        self.committed_batches += 1
+        try:
+            motor_state_store.apply_readings(rows)
+            events = safety_engine.evaluate(rows)
+            anomalies = anomaly_detector.evaluate(rows)
+            if events or anomalies:
+                try:
+                    safety_engine.apply(self._connection, events)
+                    anomaly_detector.apply(self._connection, anomalies)
+                except Exception:
+                    self._connection.rollback()
+                    raise
+            telemetry_bus.publish(rows)
+        except Exception:
+            logger.exception("Post-commit telemetry handling failed")
+
+    def stats(self) -> dict:
+        return {
+            "pending_rows": self._pending_rows,
+            "committed_rows": self.committed_rows,
+            "committed_batches": self.committed_batches,
+            "rejected_rows": self.rejected_rows,
+        }
+
+    def _write(self, rows: List[dict]) -> None:
+        # Déjà filtrées par enqueue_telemetry ; seule une lecture à la limite de la
+        # rétention, expirée entre la mise en file et le commit, est encore écartée
+        rows = storable_rows(rows)
+        telemetry_partitions.ensure(self._connection, (row["created_at"] for row in rows))
+        with Session(self._connection) as session:
+            write_telemetry_rows(session, rows)
+            session.commit()
+
+
+ingest_buffer = IngestBuffer(
+    flush_interval_ms=settings.ingest_flush_interval_ms,
+    batch_rows=settings.ingest_batch_rows,
+    max_pending_rows=settings.ingest_max_pending_rows,
+)
+
+
+async def enqueue_telemetry(rows: List[dict], wait_for_commit: Optional[bool] = None) -> List[int]:
+    """
+    Soumet des lectures au buffer d'ingestion et retourne les id de celles qui seront
+    stockées : les lectures déjà hors de la période de rétention sont écartées avant
+    l'attribution des id (422 si aucune ne peut l'être).
+    Selon le mode de durabilité, attend le commit du lot (sans bloquer la boucle
+    d'événements) ou rend la main dès la mise en file.
+    """
+    if wait_for_commit is None:
+        wait_for_commit = settings.ingest_durability == "commit"
+    rows = storable_rows(rows)
+    if not rows:
+        raise HTTPException(
+            status_code=422,
+            detail="Telemetry is older than the retention period"
+        )
+    try:
+        ids, future = ingest_buffer.submit(rows)
+    except IngestQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Telemetry ingest queue is full, retry later"
+        )
+    if wait_for_commit:
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Telemetry could not be stored"
+            )
+    return ids
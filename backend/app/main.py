@@ -1,13 +1,39 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
+import math
+import secrets
 from sqlmodel import Session, select
 
-from app.database import create_db_and_tables, get_session, engine
-from app.deps import get_password_hash
+from app.anomaly import anomaly_detector
+from app.background import run_periodically
+from app.commands import command_queue
+from app.config import settings
+from app.database import (
+    async_engine, async_read_engine, create_db_and_tables, get_session, engine, write_lock_meter
+)
+from app.deps import (
+    get_password_hash, get_current_admin_user, last_seen_tracker, user_cache, esp32_device_cache,
+    unknown_api_key_cache
+)
+from app.fleet import fleet_overview
+from app.ingest import ingest_buffer
+from app.metrics import MetricsMiddleware, render_metrics
+from app.partitions import init_telemetry_storage
+from app.rollups import drop_expired_telemetry, rebuild_rollups
+from app.safety_engine import safety_engine
 from app.models import User
+from app.motor_state import motor_state_store
+from app.notifications import notification_store, upgrade_notification_table
+from app.passwords import password_hasher
+from app.pubsub import telemetry_bus
+from app.query_budget import query_budget
 from app.routers import (
-    auth, users, motors, telemetry, maintenance, safety, iot, esp32_devices
+    auth, users, motors, telemetry, maintenance, safety, iot, esp32_devices, live, notifications, fleet
 )
 
 
@@ -16,6 +42,13 @@ async def lifespan(app: FastAPI):
     # Au démarrage : créer les tables et l'admin par défaut
     create_db_and_tables()
     
+    # Charger les partitions de télémétrie (et migrer l'ancienne table si besoin),
+    # puis calculer les agrégats s'ils n'existent pas encore
+    with engine.connect() as connection:
+        init_telemetry_storage(connection)
+        rebuild_rollups(connection)
+        upgrade_notification_table(connection)
+    
     # Créer l'admin par défaut s'il n'existe pas
     with Session(engine) as session:
         statement = select(User).where(User.email == "admin@motorguard.local")
@@ -32,8 +65,51 @@ async def lifespan(app: FastAPI):
             session.commit()
             print("✅ Admin par défaut créé : admin@motorguard.local / admin123")
     
+    # Charger l'état en direct des moteurs (servi depuis la mémoire),
+    # les seuils de sécurité et détecteurs d'anomalies évalués à l'ingestion,
+    # les compteurs de notifications non lues et les files de commandes des ESP32
+    with Session(engine) as session:
+        motor_state_store.load(session)
+        safety_engine.load(session)
+        anomaly_detector.load(session)
+        notification_store.load(session)
+        command_queue.load(session)
+    
+    # Démarrer le writer de télémétrie (group commit) et le pool de hachage des mots de passe
+    ingest_buffer.start()
+    password_hasher.start()
+    
+    # Écriture groupée des last_seen des ESP32, de l'état des moteurs et des détecteurs,
+    # et rétention de la télémétrie par suppression des partitions expirées
+    background_tasks = [
+        asyncio.create_task(run_periodically(
+            settings.last_seen_flush_interval_seconds, last_seen_tracker.flush
+        )),
+        asyncio.create_task(run_periodically(
+            settings.motor_state_checkpoint_interval_seconds, motor_state_store.checkpoint
+        )),
+        asyncio.create_task(run_periodically(
+            settings.anomaly_checkpoint_interval_seconds, anomaly_detector.checkpoint
+        )),
+        asyncio.create_task(run_periodically(
+            settings.telemetry_retention_check_interval_seconds, drop_expired_telemetry
+        )),
+    ]
+    
     yield
-    # Au shutdown (rien à faire pour l'instant)
+    # Au shutdown : terminer les long-polling des ESP32, arrêter les tâches de fond
+    # et écrire ce qui est encore en mémoire
+    command_queue.close()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    ingest_buffer.stop()
+    password_hasher.stop()
+    last_seen_tracker.flush()
+    motor_state_store.checkpoint()
+    anomaly_detector.checkpoint()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
 
 
 app = FastAPI(
@@ -56,8 +132,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "ETag"],
 )
 
+# Latence, statuts et requêtes SQL par route (GET /metrics) ; ajouté en dernier,
+# il englobe les autres middlewares
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """
+    422 comme le gestionnaire par défaut, mais une valeur refusée NaN / Infinity est renvoyée
+    en texte dans "input" : telle quelle, la réponse ne serait pas du JSON valide (500)
+    """
+    return JSONResponse(
+        status_code=422,
+        content={"detail": jsonable_encoder(
+            exc.errors(), custom_encoder={float: lambda value: value if math.isfinite(value) else str(value)}
+        )},
+    )
+
 # Inclure les routers
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -67,15 +162,73 @@ app.include_router(maintenance.router)
 app.include_router(safety.router)
 app.include_router(iot.router)
 app.include_router(esp32_devices.router)
+app.include_router(live.router)
+app.include_router(notifications.router)
+app.include_router(fleet.router)
 
 
 @app.get("/health")
+@query_budget(0)
 def health_check():
     """Vérification de santé de l'API"""
     return {"status": "ok"}
 
 
+@app.get("/health/caches")
+@query_budget(1)
+def cache_stats(current_user = Depends(get_current_admin_user)):
+    """Statistiques des caches d'authentification et du hachage des mots de passe (ADMIN uniquement)"""
+    return {
+        "users": user_cache.stats(),
+        "esp32_devices": esp32_device_cache.stats(),
+        "unknown_api_keys": unknown_api_key_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+    }
+
+
+@app.get("/health/database")
+@query_budget(1)
+def database_stats(current_user = Depends(get_current_admin_user)):
+    """Attente du verrou d'écriture SQLite et file d'ingestion (ADMIN uniquement)"""
+    return {
+        "write_lock": write_lock_meter.stats(),
+        "ingest_pending_rows": ingest_buffer.pending_rows,
+    }
+
+
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+@query_budget(0)
+async def metrics(request: Request):
+    """Métriques au format Prometheus (jeton MOTORGUARD_METRICS_TOKEN si défini)"""
+    if settings.metrics_token:
+        expected = f"Bearer {settings.metrics_token}".encode()
+        if not secrets.compare_digest(request.headers.get("authorization", "").encode(), expected):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Jeton de métriques invalide",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    return PlainTextResponse(
+        render_metrics({
+            "user_cache": user_cache.stats(),
+            "device_cache": esp32_device_cache.stats(),
+            "unknown_api_key_cache": unknown_api_key_cache.stats(),
+            "ingest": ingest_buffer.stats(),
+            "password_hasher": password_hasher.stats(),
+            "telemetry_bus": telemetry_bus.stats(),
+            "safety_engine": safety_engine.stats(),
+            "anomaly_detector": anomaly_detector.stats(),
+            "notifications": notification_store.stats(),
+            "sqlite_write_lock": write_lock_meter.stats(),
+            "fleet_overview": fleet_overview.stats(),
+            "device_commands": command_queue.stats(),
+        }),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 @app.get("/")
+@query_budget(0)
 def root():
     """Page d'accueil de l'API"""
     return {
@@ -0,0 +1,234 @@
+import bisect
+import contextvars
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Bornes (secondes) des histogrammes de latence, communes à toutes les routes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Statistiques des composants exportées comme compteurs (valeurs croissantes) ; les autres sont des jauges
+COUNTER_STATS = {
+    "hits", "misses", "evaluated", "detected", "triggered", "created", "coalesced",
+    "published", "dropped_subscribers", "hashed", "verified", "rejected",
+    "transactions", "wait_seconds", "locked_errors",
+    "committed_rows", "committed_batches", "rejected_rows", "builds", "reused",
+    "enqueued", "delivered", "acknowledged", "wakeups",
+}
+
+
+class RequestQueries:
+    """Requêtes SQL exécutées pendant une requête HTTP"""
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# Compteur SQL de la requête HTTP en cours (None hors requête : writer, tâches de fond)
+_request_queries: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar(
+    "request_queries", default=None
+)
+
+
+class RouteMetrics:
+    """Histogramme de latence (seaux préalloués), statuts et SQL d'une route"""
+    __slots__ = ("buckets", "latency_sum", "statuses", "sql_statements", "sql_seconds")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.statuses: Dict[int, int] = {}
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+
+
+class HttpMetrics:
+    """
+    Métriques HTTP par route. Elles ne sont modifiées que depuis la boucle d'événements
+    (middleware) : pas de verrou, une observation coûte une recherche dichotomique et
+    quelques additions.
+    """
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, queries: RequestQueries) -> None:
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[(method, route)] = RouteMetrics()
+        metrics.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        metrics.latency_sum += seconds
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.sql_statements += queries.statements
+        metrics.sql_seconds += queries.seconds
+
+
+class SqlMetrics:
+    """
+    Nombre et durée des requêtes SQL par moteur, mesurés par les événements SQLAlchemy.
+    Chaque thread (boucle d'événements, writer d'ingestion, pool de threads) incrémente
+    ses propres compteurs, additionnés à la lecture : pas de verrou sur le chemin des requêtes.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[Dict[str, List[float]]] = []
+        self._shards_lock = threading.Lock()  # Seulement à la création des compteurs d'un thread
+
+    def attach(self, sync_engine: Engine, name: str) -> None:
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def before_execute(connection, cursor, statement, parameters, context, executemany):
+            connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def after_execute(connection, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - connection.info["query_started"].pop()
+            self._record(name, elapsed)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def handle_error(context):
+            if context.connection is not None and context.connection.info.get("query_started"):
+                context.connection.info["query_started"].pop()
+
+    def _record(self, name: str, elapsed: float) -> None:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        totals = shard.get(name)
+        if totals is None:
+            totals = shard[name] = [0, 0.0]
+        totals[0] += 1
+        totals[1] += elapsed
+
+        queries = _request_queries.get()
+        if queries is not None:
+            queries.statements += 1
+            queries.seconds += elapsed
+
+    def totals(self) -> Dict[str, Tuple[int, float]]:
+        """Nombre et durée totale des requêtes par moteur"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: Dict[str, Tuple[int, float]] = {}
+        for shard in shards:
+            for name, (count, seconds) in list(shard.items()):
+                previous = totals.get(name, (0, 0.0))
+                totals[name] = (previous[0] + count, previous[1] + seconds)
+        return totals
+
+
+http_metrics = HttpMetrics()
+sql_metrics = SqlMetrics()
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence, statut, requêtes en cours et SQL de chaque requête HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        queries = RequestQueries()
+        token = _request_queries.set(queries)
+        http_metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_metrics.in_flight -= 1
+            _request_queries.reset(token)
+            # Gabarit de la route (/motors/{motor_id}) et non le chemin : nombre de séries borné
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_metrics.observe(scope["method"], route, status, elapsed, queries)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_metrics(components: Dict[str, dict]) -> str:
+    """
+    Métriques au format texte Prometheus : HTTP par route, SQL par moteur, puis les
+    statistiques numériques de chaque composant (motorguard_<composant>_<statistique>)
+    """
+    lines: List[str] = []
+
+    def family(name: str, kind: str, description: str) -> None:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    routes = sorted(http_metrics.routes.items())
+
+    family("motorguard_http_requests_in_flight", "gauge", "Requêtes HTTP en cours")
+    lines.append(f"motorguard_http_requests_in_flight {http_metrics.in_flight}")
+
+    family("motorguard_http_request_duration_seconds", "histogram", "Durée des requêtes HTTP par route")
+    for (method, route), metrics in routes:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), metrics.buckets):
+            cumulative += count
+            lines.append(
+                f"motorguard_http_request_duration_seconds_bucket{_labels(method=method, route=route, le=bound)} {cumulative}"
+            )
+        labels = _labels(method=method, route=route)
+        lines.append(f"motorguard_http_request_duration_seconds_sum{labels} {metrics.latency_sum:.6f}")
+        lines.append(f"motorguard_http_request_duration_seconds_count{labels} {cumulative}")
+
+    family("motorguard_http_responses_total", "counter", "Réponses HTTP par route et statut")
+    for (method, route), metrics in routes:
+        for status, count in sorted(metrics.statuses.items()):
+            lines.append(f"motorguard_http_responses_total{_labels(method=method, route=route, status=status)} {count}")
+
+    family("motorguard_http_sql_statements_total", "counter", "Requêtes SQL exécutées pendant les requêtes HTTP, par route")
+    for (method, route), metrics in routes:
+        lines.append(f"motorguard_http_sql_statements_total{_labels(method=method, route=route)} {metrics.sql_statements}")
+    family("motorguard_http_sql_seconds_total", "counter", "Durée des requêtes SQL pendant les requêtes HTTP, par route")
+    for (method, route), metrics in routes:
+        lines.append(f"motorguard_http_sql_seconds_total{_labels(method=method, route=route)} {metrics.sql_seconds:.6f}")
+
+    sql_totals = sorted(sql_metrics.totals().items())
+    family("motorguard_sql_statements_total", "counter", "Requêtes SQL exécutées, par moteur")
+    for name, (count, _) in sql_totals:
+        lines.append(f"motorguard_sql_statements_total{_labels(engine=name)} {count}")
+    family("motorguard_sql_seconds_total", "counter", "Durée des requêtes SQL, par moteur")
+    for name, (_, seconds) in sql_totals:
+        lines.append(f"motorguard_sql_seconds_total{_labels(engine=name)} {seconds:.6f}")
+
+    for component, stats in components.items():
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in COUNTER_STATS:
+                name = f"motorguard_{component}_{key}_total"
+                family(name, "counter", f"{component} : {key}")
+            else:
+                name = f"motorguard_{component}_{key}"
+                family(name, "gauge", f"{component} : {key}")
+            lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -1,3 +1,4 @@
+from sqlalchemy import UniqueConstraint
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
 from datetime import datetime
@@ -39,6 +40,8 @@ class Motor(SQLModel, table=True):
 
 
 class Telemetry(SQLModel, table=True):
+    # Table historique : la télémétrie est stockée dans des partitions temporelles
+    # (voir app/partitions.py) et cette table est migrée vers elles au démarrage
     id: Optional[int] = Field(default=None, primary_key=True)
     motor_id: int = Field(foreign_key="motor.id")
     temperature: float
@@ -50,6 +53,44 @@ class Telemetry(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class TelemetryRollup(SQLModel, table=True):
+    # Agrégats de télémétrie par moteur et par intervalle ("1m", "1h", "1d"),
+    # tenus à jour à l'ingestion (voir app/rollups.py)
+    motor_id: int = Field(primary_key=True)
+    resolution: str = Field(primary_key=True)
+    bucket_start: datetime = Field(primary_key=True)
+    count: int = 0
+    running_count: int = 0  # Lectures moteur en marche
+    temperature_sum: float = 0
+    temperature_sumsq: float = 0
+    temperature_min: float = 0
+    temperature_max: float = 0
+    vibration_sum: float = 0
+    vibration_sumsq: float = 0
+    vibration_min: float = 0
+    vibration_max: float = 0
+    current_sum: float = 0
+    current_sumsq: float = 0
+    current_min: float = 0
+    current_max: float = 0
+    speed_rpm_sum: float = 0
+    speed_rpm_sumsq: float = 0
+    speed_rpm_min: float = 0
+    speed_rpm_max: float = 0
+
+
+class TelemetryHistogram(SQLModel, table=True):
+    # Répartition des lectures par moteur, intervalle ("1h", "1d") et mesure, en classes
+    # de largeur fixe (voir HISTOGRAM_BIN_WIDTHS dans app/rollups.py), tenue à jour à l'ingestion
+    __table_args__ = {"sqlite_with_rowid": False}
+    motor_id: int = Field(primary_key=True)
+    resolution: str = Field(primary_key=True)
+    bucket_start: datetime = Field(primary_key=True)
+    metric: str = Field(primary_key=True)
+    bin: int = Field(primary_key=True)  # Classe [bin * largeur, (bin + 1) * largeur)
+    count: int = 0
+
+
 class TaskStatus(str, Enum):
     PLANNED = "PLANNED"
     IN_PROGRESS = "IN_PROGRESS"
@@ -101,11 +142,36 @@ class Notification(SQLModel, table=True):
     motor_id: Optional[int] = Field(default=None, foreign_key="motor.id")
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     
-    type: str  # "connection_lost", "high_temperature", "high_vibration", "low_battery", "maintenance_due"
+    type: str  # "connection_lost", "high_temperature", "high_vibration", "low_battery", "maintenance_due", "anomaly"
     title: str
     message: str
     is_read: bool = Field(default=False)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    # Alertes répétées regroupées sur une seule ligne (voir app/notifications.py)
+    occurrences: int = Field(default=1)
+    last_occurred_at: Optional[datetime] = Field(default=None, index=True)  # Ordre de la liste
+
+
+class NotificationRead(SQLModel, table=True):
+    # Lecture d'une notification adressée à tous (user_id NULL) par un utilisateur :
+    # chacun a son propre état lu (is_read ne sert qu'aux notifications personnelles)
+    notification_id: int = Field(foreign_key="notification.id", primary_key=True)
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    read_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class AnomalyState(SQLModel, table=True):
+    # État des détecteurs d'anomalies (EWMA / CUSUM) par moteur et par mesure,
+    # tenu en mémoire et sauvegardé périodiquement (voir app/anomaly.py)
+    motor_id: int = Field(primary_key=True)
+    channel: str = Field(primary_key=True)  # "temperature", "vibration", "current", "speed_rpm"
+    count: int = 0
+    mean: float = 0
+    variance: float = 0
+    cusum_high: float = 0
+    cusum_low: float = 0
+    in_anomaly: bool = False
+    updated_at: Optional[datetime] = None
 
 
 class ESP32Device(SQLModel, table=True):
@@ -118,3 +184,19 @@ class ESP32Device(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_seen: Optional[datetime] = None
 
+
+class DeviceCommand(SQLModel, table=True):
+    # File de commandes des ESP32 : numéro de séquence par ESP32, remise par long-polling
+    # et acquittement cumulatif (voir app/commands.py)
+    __table_args__ = (UniqueConstraint("device_id", "seq"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    device_id: int = Field(foreign_key="esp32device.id")
+    motor_id: int = Field(foreign_key="motor.id", index=True)
+    seq: int
+    action: str  # "START" ou "STOP"
+    target_speed_rpm: Optional[float] = None
+    created_by_user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime  # Non remise avant cette date : abandonnée
+    delivered_at: Optional[datetime] = None  # Première remise à l'ESP32
+    acked_at: Optional[datetime] = None  # Acquittement par l'ESP32
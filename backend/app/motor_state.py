@@ -0,0 +1,209 @@
+import threading
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import and_, bindparam, or_, update
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import Motor
+from app.partitions import fetch_telemetry
+
+# Champs de Motor portés par l'état en direct (mis à jour par l'ingestion)
+LIVE_FIELDS = (
+    "is_running", "last_temperature", "last_vibration", "last_current",
+    "last_speed_rpm", "last_battery_percent", "last_update"
+)
+# Champs d'identité (mis à jour par les routes /motors)
+IDENTITY_FIELDS = ("id", "name", "code", "location", "description", "esp32_uid")
+
+
+class MotorState:
+    """État courant d'un moteur ; mêmes attributs que Motor, sans ORM ni __dict__"""
+    __slots__ = IDENTITY_FIELDS + LIVE_FIELDS
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def copy(self) -> "MotorState":
+        return MotorState(**{name: getattr(self, name) for name in self.__slots__})
+
+
+class MotorStateStore:
+    """
+    État en direct des moteurs, source de vérité pour les lectures de statut.
+    L'ingestion le met à jour en mémoire après chaque commit ; les moteurs modifiés
+    sont réécrits dans la table Motor par checkpoint() (périodique et à l'arrêt),
+    au lieu d'un UPDATE par lot de lectures.
+    """
+
+    def __init__(self):
+        self._states: Dict[int, MotorState] = {}
+        self._by_esp32_uid: Dict[str, int] = {}
+        self._by_code: Dict[str, int] = {}
+        self._dirty: Set[int] = set()
+        self._lock = threading.Lock()
+        # Incrémentée à chaque modification : permet de savoir sans copie si l'état a changé
+        self.version = 0
+
+    def load(self, session: Session) -> None:
+        """
+        Charge les moteurs depuis la base, puis rattrape leur dernière lecture
+        (perdue si le serveur s'est arrêté avant le dernier checkpoint).
+        """
+        motors = session.exec(select(Motor)).all()
+        with self._lock:
+            self._states.clear()
+            self._by_esp32_uid.clear()
+            self._by_code.clear()
+            self._dirty.clear()
+            for motor in motors:
+                self._put(MotorState(**{name: getattr(motor, name) for name in MotorState.__slots__}))
+            self.version += 1
+        for motor in motors:
+            latest = fetch_telemetry(session, motor.id, start=motor.last_update, limit=1)
+            if latest:
+                self.apply_readings([dict(latest[0]._mapping)])
+
+    def get(self, motor_id: int) -> Optional[MotorState]:
+        """Copie de l'état d'un moteur, ou None"""
+        with self._lock:
+            state = self._states.get(motor_id)
+            return state.copy() if state else None
+
+    def get_by_esp32_uid(self, esp32_uid: str) -> Optional[MotorState]:
+        with self._lock:
+            motor_id = self._by_esp32_uid.get(esp32_uid)
+        return self.get(motor_id) if motor_id is not None else None
+
+    def get_by_code(self, code: str) -> Optional[MotorState]:
+        with self._lock:
+            motor_id = self._by_code.get(code)
+        return self.get(motor_id) if motor_id is not None else None
+
+    def all(self) -> List[MotorState]:
+        """Copie de l'état de tous les moteurs, par id"""
+        with self._lock:
+            return [self._states[motor_id].copy() for motor_id in sorted(self._states)]
+
+    def upsert_motor(self, motor: Motor) -> MotorState:
+        """
+        Enregistre un moteur créé ou modifié via l'API (après commit).
+        Les champs d'identité viennent de la base, l'état en direct reste celui de la mémoire.
+        """
+        with self._lock:
+            state = self._states.get(motor.id)
+            if state is None:
+                state = MotorState(**{name: getattr(motor, name) for name in MotorState.__slots__})
+            else:
+                self._unindex(state)
+                for name in IDENTITY_FIELDS:
+                    setattr(state, name, getattr(motor, name))
+            self._put(state)
+            self.version += 1
+            return state.copy()
+
+    def remove(self, motor_id: int) -> None:
+        with self._lock:
+            state = self._states.pop(motor_id, None)
+            if state is not None:
+                self._unindex(state)
+                self.version += 1
+            self._dirty.discard(motor_id)
+
+    def update_live(self, motor_id: int, **fields) -> None:
+        """Modifie l'état en direct d'un moteur (ex. commande START/STOP déjà commitée)"""
+        with self._lock:
+            state = self._states.get(motor_id)
+            if state is None:
+                return
+            for name, value in fields.items():
+                setattr(state, name, value)
+            self.version += 1
+
+    def apply_readings(self, rows: List[dict]) -> None:
+        """
+        Applique des lectures commitées : chaque moteur prend sa lecture la plus récente,
+        sauf si son état est déjà plus récent (lot rattrapé après une coupure).
+        """
+        newest_by_motor: Dict[int, dict] = {}
+        for row in rows:
+            newest = newest_by_motor.get(row["motor_id"])
+            if newest is None or row["created_at"] >= newest["created_at"]:
+                newest_by_motor[row["motor_id"]] = row
+
+        with self._lock:
+            for motor_id, newest in newest_by_motor.items():
+                state = self._states.get(motor_id)
+                if state is None:
+                    continue
+                if state.last_update is not None and state.last_update > newest["created_at"]:
+                    continue
+                state.is_running = newest["is_running"]
+                state.last_temperature = newest["temperature"]
+                state.last_vibration = newest["vibration"]
+                state.last_current = newest["current"]
+                state.last_speed_rpm = newest["speed_rpm"]
+                state.last_battery_percent = newest["battery_percent"]
+                state.last_update = newest["created_at"]
+                self._dirty.add(motor_id)
+                self.version += 1
+
+    def checkpoint(self) -> int:
+        """Écrit l'état en direct des moteurs modifiés dans la table Motor (un UPDATE groupé)"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            params = [
+                {
+                    "motor_id": motor_id,
+                    **{f"new_{name}": getattr(self._states[motor_id], name) for name in LIVE_FIELDS}
+                }
+                for motor_id in dirty if motor_id in self._states
+            ]
+        if not params:
+            return 0
+
+        table = Motor.__table__
+        statement = (
+            update(table)
+            .where(and_(
+                table.c.id == bindparam("motor_id"),
+                # Une commande commitée entre-temps reste prioritaire si elle est plus récente
+                or_(table.c.last_update == None, table.c.last_update <= bindparam("new_last_update"))
+            ))
+            .values({name: bindparam(f"new_{name}") for name in LIVE_FIELDS})
+        )
+        try:
+            with engine.begin() as connection:
+                connection.execute(statement, params)
+        except Exception:
+            with self._lock:
+                self._dirty |= {row["motor_id"] for row in params}
+            raise
+        return len(params)
+
+    def _put(self, state: MotorState) -> None:
+        self._states[state.id] = state
+        self._by_code[state.code] = state.id
+        self._index_esp32_uid(state.esp32_uid)
+
+    def _unindex(self, state: MotorState) -> None:
+        if self._by_code.get(state.code) == state.id:
+            del self._by_code[state.code]
+        if state.esp32_uid and self._by_esp32_uid.get(state.esp32_uid) == state.id:
+            del self._by_esp32_uid[state.esp32_uid]
+            self._index_esp32_uid(state.esp32_uid, exclude=state.id)
+
+    def _index_esp32_uid(self, esp32_uid: Optional[str], exclude: Optional[int] = None) -> None:
+        # esp32_uid n'est pas unique : comme la requête SQL, on retient le plus petit id
+        if not esp32_uid:
+            return
+        candidates = [
+            motor_id for motor_id, state in self._states.items()
+            if state.esp32_uid == esp32_uid and motor_id != exclude
+        ]
+        if candidates:
+            self._by_esp32_uid[esp32_uid] = min(candidates)
+
+
+motor_state_store = MotorStateStore()
@@ -0,0 +1,265 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, exists, func, insert, inspect, literal, or_, text, update
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from app.config import settings
+from app.models import Notification, NotificationRead
+
+# Clé de regroupement d'une alerte : (motor_id, type)
+AlertKey = Tuple[Optional[int], str]
+
+
+class NotificationChanges(NamedTuple):
+    """Effets d'un record() à reporter en mémoire une fois la transaction commitée"""
+    recent: Dict[AlertKey, Tuple[int, datetime]]
+    unread: Dict[int, int]  # user_id -> variation des non lues personnelles
+    broadcast: int  # Notifications adressées à tous créées
+    broadcast_read: Dict[int, int]  # user_id -> variation des lues parmi celles adressées à tous
+    created: int
+    coalesced: int
+
+
+def upgrade_notification_table(connection: Connection) -> None:
+    """Ajoute les colonnes et index de regroupement à une table `notification` existante"""
+    table = Notification.__table__
+    columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    if "occurrences" not in columns:
+        connection.execute(text("ALTER TABLE notification ADD COLUMN occurrences INTEGER NOT NULL DEFAULT 1"))
+    if "last_occurred_at" not in columns:
+        connection.execute(text("ALTER TABLE notification ADD COLUMN last_occurred_at DATETIME"))
+        connection.execute(update(table).values(last_occurred_at=table.c.created_at))
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+    connection.commit()
+
+
+def visible_to(user_id: int):
+    """Notifications d'un utilisateur : les siennes et celles adressées à tous (user_id NULL)"""
+    table = Notification.__table__
+    return or_(table.c.user_id == user_id, table.c.user_id == None)
+
+
+def _broadcast_read_by(user_id: int):
+    reads = NotificationRead.__table__
+    return exists().where(
+        and_(reads.c.notification_id == Notification.__table__.c.id, reads.c.user_id == user_id)
+    )
+
+
+def read_by(user_id: int):
+    """État lu d'une notification pour un utilisateur (is_read, ou sa lecture si adressée à tous)"""
+    table = Notification.__table__
+    return case((table.c.user_id == None, _broadcast_read_by(user_id)), else_=table.c.is_read)
+
+
+def unread_by(user_id: int):
+    """Notifications visibles par un utilisateur et qu'il n'a pas lues"""
+    table = Notification.__table__
+    return or_(
+        and_(table.c.user_id == user_id, table.c.is_read == False),
+        and_(table.c.user_id == None, ~_broadcast_read_by(user_id)),
+    )
+
+
+class NotificationStore:
+    """
+    Écriture des alertes automatiques et compteurs de notifications non lues.
+    Une alerte de même (motor_id, type) qu'une notification survenue il y a moins de
+    notification_cooldown_seconds est regroupée sur celle-ci (occurrences + 1, message
+    et date de dernière occurrence mis à jour, remise à non lue) : un capteur instable
+    produit une ligne, pas des milliers.
+    Une notification adressée à tous est lue par chaque utilisateur séparément (table
+    notificationread) ; une notification personnelle porte son état dans is_read.
+    Les compteurs de non lues sont tenus en mémoire et ajustés après chaque commit,
+    à partir des lignes réellement modifiées.
+    """
+
+    def __init__(self, cooldown_seconds: float):
+        self.cooldown = timedelta(seconds=cooldown_seconds)
+        # Notifications adressées à tous, celles que chaque utilisateur a lues,
+        # et non lues personnelles de chaque utilisateur
+        self._broadcast = 0
+        self._broadcast_read: Dict[int, int] = {}
+        self._user_unread: Dict[int, int] = {}
+        # Dernière notification de chaque clé : (id, dernière occurrence)
+        self._recent: Dict[AlertKey, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.coalesced = 0
+
+    def load(self, session: Session) -> None:
+        """Calcule les compteurs de non lues et l'index des alertes récentes"""
+        table = Notification.__table__
+        reads = NotificationRead.__table__
+        unread = session.exec(
+            select(table.c.user_id, func.count())
+            .where(table.c.is_read == False)
+            .group_by(table.c.user_id)
+        ).all()
+        broadcast = session.exec(select(func.count()).where(table.c.user_id == None)).one()
+        broadcast_read = session.exec(
+            select(reads.c.user_id, func.count()).group_by(reads.c.user_id)
+        ).all()
+        recent_rows = session.exec(
+            select(table.c.id, table.c.motor_id, table.c.type, table.c.last_occurred_at)
+            .where(table.c.last_occurred_at >= datetime.utcnow() - self.cooldown)
+            .order_by(table.c.id)
+        ).all()
+        with self._lock:
+            self._broadcast = broadcast
+            self._broadcast_read = dict(broadcast_read)
+            self._user_unread = {user_id: count for user_id, count in unread if user_id is not None}
+            self._recent = {
+                (motor_id, type_): (notification_id, last_occurred_at)
+                for notification_id, motor_id, type_, last_occurred_at in recent_rows
+            }
+
+    def unread_count(self, user_id: int) -> int:
+        """Nombre de notifications non lues visibles par un utilisateur (sans requête)"""
+        with self._lock:
+            return (
+                max(0, self._broadcast - self._broadcast_read.get(user_id, 0))
+                + self._user_unread.get(user_id, 0)
+            )
+
+    def record(self, connection: Connection, notifications: List[dict]) -> NotificationChanges:
+        """
+        Écrit des alertes (dictionnaires de colonnes de Notification) dans la transaction
+        de `connection`, sans commit. Le résultat est à passer à committed() après le commit.
+        """
+        table = Notification.__table__
+        reads = NotificationRead.__table__
+        with self._lock:
+            recent = dict(self._recent)
+        changes = NotificationChanges({}, {}, 0, {}, 0, 0)
+        created = coalesced = broadcast = 0
+
+        for notification in notifications:
+            key = (notification["motor_id"], notification["type"])
+            at = notification["created_at"]
+            previous = recent.get(key)
+            if previous is not None and at - previous[1] < self.cooldown:
+                notification_id, last_occurred_at = previous
+                last_occurred_at = max(at, last_occurred_at)
+                existing = connection.execute(
+                    update(table)
+                    .where(table.c.id == notification_id)
+                    .values(
+                        occurrences=table.c.occurrences + 1,
+                        last_occurred_at=last_occurred_at,
+                        title=notification["title"],
+                        message=notification["message"],
+                    )
+                    .returning(table.c.user_id)
+                ).first()
+                if existing is not None:
+                    # Remise à non lue : pour tous ceux qui l'avaient lue
+                    owner = existing.user_id
+                    if owner is None:
+                        readers = connection.execute(
+                            delete(reads).where(reads.c.notification_id == notification_id)
+                            .returning(reads.c.user_id)
+                        ).scalars().all()
+                        for user_id in readers:
+                            changes.broadcast_read[user_id] = changes.broadcast_read.get(user_id, 0) - 1
+                    elif connection.execute(
+                        update(table)
+                        .where(and_(table.c.id == notification_id, table.c.is_read == True))
+                        .values(is_read=False)
+                    ).rowcount:
+                        changes.unread[owner] = changes.unread.get(owner, 0) + 1
+                    recent[key] = changes.recent[key] = (notification_id, last_occurred_at)
+                    coalesced += 1
+                    continue
+                # Notification supprimée entre-temps : en créer une nouvelle
+
+            result = connection.execute(
+                insert(table).values(
+                    {**notification, "is_read": False, "occurrences": 1, "last_occurred_at": at}
+                )
+            )
+            notification_id = result.inserted_primary_key[0]
+            user_id = notification["user_id"]
+            if user_id is None:
+                broadcast += 1
+            else:
+                changes.unread[user_id] = changes.unread.get(user_id, 0) + 1
+            recent[key] = changes.recent[key] = (notification_id, at)
+            created += 1
+
+        return changes._replace(broadcast=broadcast, created=created, coalesced=coalesced)
+
+    def committed(self, changes: NotificationChanges) -> None:
+        """Reporte en mémoire les effets d'un record() commité"""
+        with self._lock:
+            self._recent.update(changes.recent)
+            self._broadcast += changes.broadcast
+            self._apply(changes.unread, changes.broadcast_read)
+            self.created += changes.created
+            self.coalesced += changes.coalesced
+
+    def mark_read(
+        self,
+        session: Session,
+        user_id: int,
+        ids: Optional[List[int]] = None,
+        motor_id: Optional[int] = None
+    ) -> int:
+        """
+        Marque comme lues les notifications non lues visibles par un utilisateur
+        (toutes, ou celles de `ids` et/ou d'un moteur) : is_read pour les siennes, une
+        lecture à son nom pour celles adressées à tous. Retourne le nombre de notifications marquées.
+        """
+        table = Notification.__table__
+        reads = NotificationRead.__table__
+        conditions = []
+        if ids is not None:
+            if not ids:
+                return 0
+            conditions.append(table.c.id.in_(ids))
+        if motor_id is not None:
+            conditions.append(table.c.motor_id == motor_id)
+        connection = session.connection()
+        personal = connection.execute(
+            update(table)
+            .where(and_(table.c.user_id == user_id, table.c.is_read == False, *conditions))
+            .values(is_read=True)
+        ).rowcount
+        broadcast = connection.execute(
+            insert(reads).from_select(
+                ["notification_id", "user_id", "read_at"],
+                select(table.c.id, literal(user_id), literal(datetime.utcnow()))
+                .where(and_(table.c.user_id == None, ~_broadcast_read_by(user_id), *conditions))
+            )
+        ).rowcount
+        session.commit()
+
+        with self._lock:
+            self._apply({user_id: -personal}, {user_id: broadcast})
+        return personal + broadcast
+
+    def _apply(self, unread: Dict[int, int], broadcast_read: Dict[int, int]) -> None:
+        for counters, changes in ((self._user_unread, unread), (self._broadcast_read, broadcast_read)):
+            for user_id, delta in changes.items():
+                count = max(0, counters.get(user_id, 0) + delta)
+                if count:
+                    counters[user_id] = count
+                else:
+                    counters.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "broadcast": self._broadcast,
+                "broadcast_reads": sum(self._broadcast_read.values()),
+                "users_with_unread": len(self._user_unread),
+                "created": self.created,
+                "coalesced": self.coalesced,
+            }
+
+
+notification_store = NotificationStore(cooldown_seconds=settings.notification_cooldown_seconds)
@@ -0,0 +1,94 @@
+import math
+import struct
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+# Format binaire compact des lectures envoyées par les ESP32 (Content-Type PACKED_MEDIA_TYPE)
+#
+# En-tête (little-endian, 12 octets) : magic b"MGTP", version (u8), flags (u8, 0),
+# nombre de lectures n (u16), motor_id (u32)
+# puis n lectures de 49 octets, sans alignement (struct packed côté ESP32) :
+#   timestamp       : int64, epoch en millisecondes (UTC) ; 0 : heure de réception
+#   temperature     : float64
+#   vibration       : float64
+#   current         : float64
+#   speed_rpm       : float64
+#   battery_percent : float64 (NaN si absent)
+#   is_running      : uint8
+# Les mesures sont en float64 : un float32 (55.3 -> 55.29999923706055) serait stocké tel
+# quel, et l'arrondir au décodage coûterait plus cher que le décodage lui-même.
+PACKED_MEDIA_TYPE = "application/vnd.motorguard.telemetry-packed"
+PACKED_MAGIC = b"MGTP"
+PACKED_VERSION = 1
+PACKED_MAX_READINGS = 1000  # Comme un lot JSON (TelemetryBatchCreate)
+
+_HEADER = struct.Struct("<4sBBHI")
+_READING = struct.Struct("<qdddddB")
+_UNIX_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def encode_packed_telemetry(motor_id: int, readings: List[dict]) -> bytes:
+    """
+    Encode des lectures (clés de TelemetryReading, `timestamp` datetime UTC naïf optionnel)
+    comme le ferait un ESP32 ; utilisé par les benchmarks
+    """
+    parts = [_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, 0, len(readings), motor_id)]
+    for reading in readings:
+        timestamp = reading.get("timestamp")
+        battery = reading.get("battery_percent")
+        parts.append(_READING.pack(
+            0 if timestamp is None else (timestamp - _UNIX_EPOCH) // _MILLISECOND,
+            reading["temperature"], reading["vibration"], reading["current"], reading["speed_rpm"],
+            math.nan if battery is None else battery,
+            1 if reading["is_running"] else 0,
+        ))
+    return b"".join(parts)
+
+
+def decode_packed_telemetry(body: bytes) -> Tuple[int, List[dict]]:
+    """
+    Décode un envoi au format compact en (motor_id, lignes prêtes pour l'ingestion, comme
+    build_telemetry_rows). Les lectures sont découpées par struct.iter_unpack sur le corps
+    reçu, sans copie ni modèle Pydantic par lecture. ValueError si l'envoi est invalide.
+    """
+    view = memoryview(body)
+    if len(view) < _HEADER.size:
+        raise ValueError("Truncated header")
+    magic, version, flags, count, motor_id = _HEADER.unpack_from(view)
+    if magic != PACKED_MAGIC or version != PACKED_VERSION or flags:
+        raise ValueError("Unsupported packed telemetry format")
+    if not 1 <= count <= PACKED_MAX_READINGS:
+        raise ValueError(f"Between 1 and {PACKED_MAX_READINGS} readings expected")
+    if len(view) != _HEADER.size + count * _READING.size:
+        raise ValueError("Body length does not match the reading count")
+
+    now = datetime.utcnow()
+    rows = []
+    for timestamp, temperature, vibration, current, speed_rpm, battery, running in _READING.iter_unpack(
+        view[_HEADER.size:]
+    ):
+        # Une seule vérification par lecture : la somme n'est finie que si chaque mesure l'est
+        # (hors batterie, où NaN signifie « absent » : seul ±Infinity y est refusé)
+        if not math.isfinite(temperature + vibration + current + speed_rpm) or abs(battery) == math.inf:
+            raise ValueError("Measurements must be finite numbers")
+        if timestamp:
+            try:
+                created_at = _UNIX_EPOCH + timestamp * _MILLISECOND
+            except OverflowError:
+                raise ValueError("Invalid timestamp")
+            # Une horloge en avance est ramenée à l'heure de réception (normalize_timestamp)
+            created_at = min(created_at, now)
+        else:
+            created_at = now
+        rows.append({
+            "motor_id": motor_id,
+            "temperature": temperature,
+            "vibration": vibration,
+            "current": current,
+            "speed_rpm": speed_rpm,
+            "is_running": running != 0,
+            "battery_percent": None if battery != battery else battery,  # NaN : absent
+            "created_at": created_at,
+        })
+    return motor_id, rows
@@ -0,0 +1,83 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+
+class TelemetryCursor(NamedTuple):
+    """Position dans l'historique : dernière clé (created_at, id) lue et sens de lecture"""
+    key: Tuple[datetime, int]
+    direction: str  # "next" : plus ancien, "prev" : plus récent
+    start: Optional[datetime]  # Borne basse de la fenêtre fixée par la première page
+
+
+class NotificationCursor(NamedTuple):
+    """Position dans la liste des notifications : dernière clé (date de tri, id) lue"""
+    key: Tuple[datetime, int]
+
+
+def _encode_token(payload: dict) -> str:
+    """Sérialise un curseur en jeton opaque (base64 url-safe)"""
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _decode_token(token: str) -> dict:
+    data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    payload = json.loads(data)
+    if not isinstance(payload, dict):
+        raise ValueError(payload)
+    return payload
+
+
+def _decode_key(payload: dict) -> Tuple[datetime, int]:
+    at, row_id = payload["k"]
+    return datetime.fromisoformat(at), int(row_id)
+
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor"
+    )
+
+
+def encode_cursor(cursor: TelemetryCursor) -> str:
+    """Sérialise un curseur d'historique en jeton opaque"""
+    return _encode_token({
+        "k": [cursor.key[0].isoformat(), cursor.key[1]],
+        "d": cursor.direction,
+        "s": cursor.start.isoformat() if cursor.start else None,
+    })
+
+
+def decode_cursor(token: str) -> TelemetryCursor:
+    """Décode un jeton de curseur d'historique (400 s'il est invalide)"""
+    try:
+        payload = _decode_token(token)
+        direction = payload["d"]
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return TelemetryCursor(
+            key=_decode_key(payload),
+            direction=direction,
+            start=datetime.fromisoformat(payload["s"]) if payload.get("s") else None,
+        )
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError):
+        raise _invalid_cursor()
+
+
+def encode_notification_cursor(cursor: NotificationCursor) -> str:
+    """Sérialise un curseur de notifications en jeton opaque"""
+    return _encode_token({"k": [cursor.key[0].isoformat(), cursor.key[1]]})
+
+
+def decode_notification_cursor(token: str) -> NotificationCursor:
+    """Décode un jeton de curseur de notifications (400 s'il est invalide)"""
+    try:
+        return NotificationCursor(key=_decode_key(_decode_token(token)))
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, ValueError):
+        raise _invalid_cursor()
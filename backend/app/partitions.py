@@ -0,0 +1,312 @@
+import bisect
+import re
+import threading
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, Index, Integer, MetaData, Table,
+    delete, func, insert, select, text, tuple_
+)
+from sqlalchemy.engine import Connection, Row
+from sqlmodel import Session
+
+from app.config import settings
+from app.database import engine
+from app.models import Telemetry
+
+# Les partitions ont leur propre MetaData : elles sont créées à la demande,
+# jamais par SQLModel.metadata.create_all
+partition_metadata = MetaData()
+
+PARTITION_PREFIX = "telemetry_p"
+_PARTITION_NAME = re.compile(r"^telemetry_p(\d{8})_(\d{8})$")
+_EPOCH = date(1970, 1, 1)
+
+
+class TelemetryPartition(NamedTuple):
+    start: datetime  # inclus
+    end: datetime  # exclu
+    table: Table
+
+
+def partition_table(name: str) -> Table:
+    """Table d'une partition de télémétrie (mêmes colonnes que Telemetry)"""
+    if name in partition_metadata.tables:
+        return partition_metadata.tables[name]
+    return Table(
+        name,
+        partition_metadata,
+        Column("id", Integer, primary_key=True),
+        Column("motor_id", Integer, nullable=False),
+        Column("temperature", Float, nullable=False),
+        Column("vibration", Float, nullable=False),
+        Column("current", Float, nullable=False),
+        Column("speed_rpm", Float, nullable=False),
+        Column("is_running", Boolean, nullable=False),
+        Column("battery_percent", Float),
+        Column("created_at", DateTime, nullable=False),
+        # L'id (rowid) est implicitement inclus en fin d'index
+        Index(f"ix_{name}_motor_id_created_at", "motor_id", "created_at"),
+    )
+
+
+class TelemetryPartitions:
+    """
+    Registre des partitions temporelles de la télémétrie.
+    Chaque partition couvre une plage [start, end) disjointe des autres ; une nouvelle
+    partition est alignée sur `width_days` jours puis rognée sur ses voisines, ce qui
+    permet de changer la largeur sans migration.
+    """
+
+    def __init__(self, width_days: int):
+        self.width_days = width_days
+        # (partitions triées par start, leurs start) remplacés d'un bloc à chaque modification
+        self._index: Tuple[List[TelemetryPartition], List[datetime]] = ([], [])
+        self._lock = threading.Lock()
+
+    def load(self, connection: Connection) -> None:
+        """Charge les partitions existantes depuis le schéma SQLite"""
+        names = connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix"),
+            {"prefix": PARTITION_PREFIX + "%"}
+        ).scalars()
+        partitions = []
+        for name in names:
+            match = _PARTITION_NAME.match(name)
+            if match:
+                start, end = (datetime.strptime(value, "%Y%m%d") for value in match.groups())
+                partitions.append(TelemetryPartition(start, end, partition_table(name)))
+        with self._lock:
+            self._set(partitions)
+
+    def all(self) -> List[TelemetryPartition]:
+        return list(self._index[0])
+
+    def find(self, timestamp: datetime) -> Optional[TelemetryPartition]:
+        """Partition contenant `timestamp`, ou None"""
+        partitions, starts = self._index
+        index = bisect.bisect_right(starts, timestamp) - 1
+        if index >= 0 and timestamp < partitions[index].end:
+            return partitions[index]
+        return None
+
+    def covering(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        descending: bool = False
+    ) -> List[TelemetryPartition]:
+        """Partitions intersectant [start, end), dans l'ordre chronologique ou inverse"""
+        selected = [
+            partition for partition in self._index[0]
+            if (start is None or partition.end > start) and (end is None or partition.start < end)
+        ]
+        if descending:
+            selected.reverse()
+        return selected
+
+    def ensure(self, connection: Connection, timestamps: Iterable[datetime]) -> None:
+        """
+        Crée les partitions manquantes pour ces horodatages.
+        Le DDL est commité sur `connection` avant d'enregistrer les partitions,
+        qui ne référencent donc jamais une table annulée par un rollback.
+        """
+        missing = sorted({timestamp for timestamp in timestamps if self.find(timestamp) is None})
+        if not missing:
+            return
+
+        with self._lock:
+            partitions = self.all()
+            try:
+                for timestamp in missing:
+                    if any(partition.start <= timestamp < partition.end for partition in partitions):
+                        continue
+                    # Alignement sur width_days, rogné sur les partitions voisines
+                    aligned_start = self._aligned_start(timestamp)
+                    start = max(
+                        [aligned_start]
+                        + [partition.end for partition in partitions if partition.end <= timestamp]
+                    )
+                    end = min(
+                        [aligned_start + timedelta(days=self.width_days)]
+                        + [partition.start for partition in partitions if partition.start > timestamp]
+                    )
+                    name = f"{PARTITION_PREFIX}{start:%Y%m%d}_{end:%Y%m%d}"
+                    table = partition_table(name)
+                    table.create(connection, checkfirst=True)
+                    partitions.append(TelemetryPartition(start, end, table))
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            self._set(partitions)
+
+    def drop_before(self, connection: Connection, cutoff: datetime) -> List[str]:
+        """Supprime (DROP TABLE) les partitions entièrement antérieures à `cutoff`"""
+        with self._lock:
+            partitions = self.all()
+            expired = [partition for partition in partitions if partition.end <= cutoff]
+            if not expired:
+                return []
+            # Retirer du registre d'abord : plus aucune lecture ni écriture ne les cible
+            self._set([partition for partition in partitions if partition.end > cutoff])
+        for partition in expired:
+            partition.table.drop(connection, checkfirst=True)
+            partition_metadata.remove(partition.table)
+        connection.commit()
+        return [partition.table.name for partition in expired]
+
+    def max_id(self, connection: Connection) -> int:
+        """Plus grand id de télémétrie, toutes partitions confondues"""
+        last_id = 0
+        for partition in self.all():
+            value = connection.execute(select(func.max(partition.table.c.id))).scalar()
+            last_id = max(last_id, value or 0)
+        return last_id
+
+    def _aligned_start(self, timestamp: datetime) -> datetime:
+        days = (timestamp.date() - _EPOCH).days // self.width_days * self.width_days
+        return datetime.combine(_EPOCH + timedelta(days=days), datetime.min.time())
+
+    def _set(self, partitions: List[TelemetryPartition]) -> None:
+        # Remplacement atomique de l'index : les lecteurs n'ont pas besoin du verrou
+        partitions = sorted(partitions, key=lambda partition: partition.start)
+        self._index = (partitions, [partition.start for partition in partitions])
+
+
+telemetry_partitions = TelemetryPartitions(width_days=settings.telemetry_partition_days)
+
+
+def retention_cutoff() -> Optional[datetime]:
+    """Date avant laquelle la télémétrie n'est plus conservée (None : conservation illimitée)"""
+    if not settings.telemetry_retention_days:
+        return None
+    return datetime.utcnow() - timedelta(days=settings.telemetry_retention_days)
+
+
+def init_telemetry_storage(connection: Connection) -> None:
+    """
+    Charge les partitions et y migre le contenu de l'ancienne table `telemetry`
+    (une seule fois, en SQL ensembliste, en conservant les id).
+    """
+    telemetry_partitions.load(connection)
+
+    legacy = Telemetry.__table__
+    days = connection.execute(select(func.date(legacy.c.created_at)).distinct()).scalars().all()
+    if not days:
+        return
+
+    telemetry_partitions.ensure(
+        connection, (datetime.strptime(day, "%Y-%m-%d") for day in days)
+    )
+    columns = [column.name for column in legacy.columns]
+    for partition in telemetry_partitions.all():
+        connection.execute(
+            insert(partition.table).from_select(
+                columns,
+                select(*legacy.columns)
+                .where(legacy.c.created_at >= partition.start)
+                .where(legacy.c.created_at < partition.end)
+            )
+        )
+    connection.execute(delete(legacy))
+    connection.commit()
+
+
+def drop_expired_partitions() -> List[str]:
+    """Applique la rétention : supprime les partitions expirées (tâche périodique)"""
+    cutoff = retention_cutoff()
+    if cutoff is None:
+        return []
+    with engine.connect() as connection:
+        return telemetry_partitions.drop_before(connection, cutoff)
+
+
+def fetch_telemetry(
+    session: Session,
+    motor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    descending: bool = True,
+    after: Optional[Tuple[datetime, int]] = None
+) -> List[Row]:
+    """
+    Lit la télémétrie d'un moteur sur [start, end) en n'interrogeant que les partitions
+    qui couvrent la plage, de la plus récente à la plus ancienne (ou l'inverse),
+    et s'arrête dès que `limit` lignes ont été lues.
+    `after` est une clé (created_at, id) de pagination : seules les lignes situées
+    après elle dans le sens de lecture sont retournées (coût constant par page).
+    """
+    if after is not None:
+        # Ignorer les partitions entièrement situées avant la clé dans le sens de lecture
+        if descending:
+            bound = after[0] + timedelta(microseconds=1)
+            end = bound if end is None else min(end, bound)
+        else:
+            start = after[0] if start is None else max(start, after[0])
+
+    rows: List[Row] = []
+    for partition in telemetry_partitions.covering(start, end, descending):
+        table = partition.table
+        statement = select(table).where(table.c.motor_id == motor_id)
+        if start is not None:
+            statement = statement.where(table.c.created_at >= start)
+        if end is not None:
+            statement = statement.where(table.c.created_at < end)
+        if after is not None:
+            key = tuple_(table.c.created_at, table.c.id)
+            statement = statement.where(key < after if descending else key > after)
+        if descending:
+            statement = statement.order_by(table.c.created_at.desc(), table.c.id.desc())
+        else:
+            statement = statement.order_by(table.c.created_at, table.c.id)
+        if limit is not None:
+            statement = statement.limit(limit - len(rows))
+        rows.extend(session.exec(statement).all())
+        if limit is not None and len(rows) >= limit:
+            break
+    return rows
+
+
+def iter_telemetry(
+    connection: Connection,
+    motor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = 1000
+) -> Iterator[List[Row]]:
+    """
+    Parcourt la télémétrie d'un moteur sur [start, end) par ordre chronologique,
+    par paquets de `chunk_size` lignes. Chaque paquet est lu dans sa propre transaction
+    et repris après la dernière clé (created_at, id) : la mémoire reste bornée et
+    aucune lecture longue ne bloque le writer d'ingestion.
+    """
+    for partition in telemetry_partitions.covering(start, end):
+        table = partition.table
+        last_key = None
+        while True:
+            statement = select(table).where(table.c.motor_id == motor_id)
+            if start is not None:
+                statement = statement.where(table.c.created_at >= start)
+            if end is not None:
+                statement = statement.where(table.c.created_at < end)
+            if last_key is not None:
+                statement = statement.where(tuple_(table.c.created_at, table.c.id) > last_key)
+            statement = statement.order_by(table.c.created_at, table.c.id).limit(chunk_size)
+            try:
+                rows = connection.execute(statement).all()
+            except Exception:
+                # Partition supprimée par la rétention pendant l'export
+                if partition not in telemetry_partitions.all():
+                    break
+                raise
+            finally:
+                connection.rollback()
+            if not rows:
+                break
+            yield rows
+            if len(rows) < chunk_size:
+                break
+            last_key = (rows[-1].created_at, rows[-1].id)
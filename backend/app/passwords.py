@@ -0,0 +1,157 @@
+import asyncio
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from app.config import settings
+
+# Coût d'un hash bcrypt : "$2b$12$..." -> 12
+_BCRYPT_COST = re.compile(r"^\$2[aby]\$(\d{2})\$")
+
+
+def hash_password(password: str, rounds: int) -> str:
+    """Hash bcrypt d'un mot de passe avec le coût donné (2^rounds itérations)"""
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    """Vérifie un mot de passe en clair contre un hash"""
+    try:
+        # Si le hash commence par $2b$, c'est un hash bcrypt
+        if hashed_password.startswith("$2b$") or hashed_password.startswith("$2a$"):
+            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+        # Sinon, comparaison directe (pour compatibilité avec les mots de passe en clair en dev)
+        return plain_password == hashed_password
+    except Exception:
+        return False
+
+
+def needs_rehash(hashed_password: str, rounds: int) -> bool:
+    """Vrai si le hash n'est pas un bcrypt au coût configuré (ancien coût ou mot de passe en clair)"""
+    match = _BCRYPT_COST.match(hashed_password)
+    return match is None or int(match.group(1)) != rounds
+
+
+def _init_worker() -> None:
+    # Priorité réduite : sur une machine chargée, l'API et l'ingestion passent avant bcrypt
+    try:
+        os.nice(5)
+    except OSError:
+        pass
+
+
+class PasswordHashingBusy(Exception):
+    """Trop de hachages en attente"""
+
+
+class PasswordHasher:
+    """
+    Hachage et vérification bcrypt dans un pool de processus dédié et borné.
+    bcrypt est volontairement coûteux (~0,3 s au coût 12) : exécuté dans le pool
+    de threads de l'API, une rafale de connexions (changement d'équipe) en occupe
+    tous les threads et ralentit les autres requêtes. Le pool de processus répartit
+    le travail sur les cœurs, à priorité réduite, et au-delà de max_pending
+    opérations en attente les nouvelles connexions sont refusées (503).
+    """
+
+    def __init__(self, rounds: int, workers: Optional[int], max_pending: int):
+        self.rounds = rounds
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Compteurs modifiés uniquement depuis la boucle d'événements
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if self._executor is None:
+            # "forkserver" : les processus sont forkés depuis un serveur sans threads (pas depuis
+            # l'API, qui a déjà le writer et les connexions SQLite), qui ne charge que ce module
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload([__name__])
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_init_worker,
+            )
+            # Démarrer les processus maintenant plutôt qu'à la première connexion
+            for _ in range(self.workers):
+                self._executor.submit(os.getpid)
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHashingBusy()
+        self.start()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(hash_password, password, self.rounds)
+        self.hashed += 1
+        return hashed
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        valid = await self._run(check_password, plain_password, hashed_password)
+        self.verified += 1
+        return valid
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return needs_rehash(hashed_password, self.rounds)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "pending": self.pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    rounds=settings.password_hash_rounds,
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+)
+
+
+def _busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, retry later",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Vérifie un mot de passe sans bloquer la boucle d'événements (503 si le pool est saturé)"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHashingBusy:
+        raise _busy()
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash un mot de passe au coût configuré sans bloquer la boucle d'événements"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHashingBusy:
+        raise _busy()
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+from typing import Dict, List, Optional, Set
+
+from app.config import settings
+
+
+def telemetry_message(row: dict) -> dict:
+    """Message diffusé aux abonnés pour une lecture commitée"""
+    message = dict(row)
+    message["created_at"] = row["created_at"].isoformat()
+    return message
+
+
+class Subscription:
+    """
+    Abonnement d'un client (WebSocket ou SSE) à la télémétrie d'un moteur, ou de tout
+    le parc si motor_id est None. Sa file est bornée : un client trop lent est
+    déconnecté plutôt que de faire grossir la mémoire du serveur.
+    """
+
+    def __init__(self, motor_id: Optional[int], maxsize: int):
+        self.motor_id = motor_id
+        self.dropped = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._loop = asyncio.get_running_loop()
+
+    async def get(self) -> Optional[dict]:
+        """Prochain message, ou None si l'abonné a été abandonné (client trop lent)"""
+        return await self._queue.get()
+
+    def _offer(self, messages: List[dict]) -> None:
+        # Exécuté dans la boucle asyncio de l'abonné
+        if self.dropped:
+            return
+        for message in messages:
+            try:
+                self._queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped = True
+                while not self._queue.empty():
+                    self._queue.get_nowait()
+                self._queue.put_nowait(None)
+                return
+
+
+class TelemetryBus:
+    """
+    Bus de diffusion en mémoire de la télémétrie commitée.
+    publish() peut être appelé depuis n'importe quel thread (le writer d'ingestion) ;
+    les messages sont remis à la boucle asyncio de chaque abonné, un appel par lot.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped_subscribers = 0
+        # motor_id -> abonnés ; la clé None regroupe les abonnés à tout le parc
+        self._subscriptions: Dict[Optional[int], Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, motor_id: Optional[int] = None) -> Subscription:
+        """Crée un abonnement (à appeler depuis la boucle asyncio)"""
+        subscription = Subscription(motor_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(motor_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.motor_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.motor_id]
+        if subscription.dropped:
+            self.dropped_subscribers += 1
+
+    def publish(self, rows: List[dict]) -> None:
+        """Diffuse des lectures commitées aux abonnés concernés"""
+        if not self._subscriptions:
+            return
+        with self._lock:
+            subscriptions = {motor_id: list(subs) for motor_id, subs in self._subscriptions.items()}
+
+        deliveries: Dict[Subscription, List[dict]] = {}
+        for row in rows:
+            targets = subscriptions.get(row["motor_id"], []) + subscriptions.get(None, [])
+            if not targets:
+                continue
+            message = telemetry_message(row)
+            for subscription in targets:
+                deliveries.setdefault(subscription, []).append(message)
+            self.published += 1
+
+        for subscription, messages in deliveries.items():
+            try:
+                subscription._loop.call_soon_threadsafe(subscription._offer, messages)
+            except RuntimeError:
+                # Boucle fermée (arrêt du serveur)
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscribers = sum(len(subs) for subs in self._subscriptions.values())
+        return {
+            "subscribers": subscribers,
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+telemetry_bus = TelemetryBus(queue_size=settings.live_queue_size)
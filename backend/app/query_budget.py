@@ -0,0 +1,128 @@
+import contextvars
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudget(NamedTuple):
+    """Requêtes SQL autorisées pour un appel de route"""
+    statements: int  # Nombre maximal de requêtes
+    repeats: int  # Nombre maximal d'exécutions d'une même forme de requête (N+1 au-delà)
+
+
+def query_budget(statements: int, repeats: int = 1) -> Callable:
+    """
+    Déclare le budget de requêtes SQL d'une route, vérifié par check_query_budgets.py.
+    Le budget couvre le pire cas (caches d'authentification froids, dépendances comprises) ;
+    les écritures différées (writer d'ingestion, tâches de fond) n'en font pas partie.
+    À placer sous le décorateur du router ; sans effet à l'exécution.
+    """
+    def decorate(endpoint: Callable) -> Callable:
+        endpoint.query_budget = QueryBudget(statements, repeats)
+        return endpoint
+    return decorate
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST = re.compile(r"VALUES \(\?\)(?:\s*,\s*\(\?\))+")
+_PARTITION_TABLE = re.compile(r"telemetry_p\d{8}_\d{8}")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Forme d'une requête : littéraux et listes de paramètres remplacés, pour reconnaître
+    la même requête exécutée avec des valeurs différentes (boucle N+1)
+    """
+    statement = " ".join(statement.split())
+    statement = _PARTITION_TABLE.sub("telemetry_p?", statement)
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("(?)", statement)
+    return _VALUES_LIST.sub("VALUES (?)", statement)
+
+
+class QueryCall(NamedTuple):
+    """Requêtes SQL exécutées pendant un appel de route"""
+    method: str
+    route: str
+    status: int
+    budget: Optional[QueryBudget]
+    statements: List[str]
+
+    def violations(self) -> List[str]:
+        if self.budget is None:
+            return ["aucun budget déclaré (@query_budget)"]
+        problems = []
+        if len(self.statements) > self.budget.statements:
+            problems.append(f"{len(self.statements)} requêtes pour un budget de {self.budget.statements}")
+        for shape, count in Counter(self.statements).items():
+            if count > self.budget.repeats:
+                problems.append(f"{count} exécutions de la même requête (N+1) : {shape}")
+        return problems
+
+
+# Requêtes de l'appel de route en cours (None hors appel : writer, tâches de fond)
+_current_call: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar(
+    "query_budget_call", default=None
+)
+
+
+class QueryRecorder:
+    """
+    Middleware ASGI de test : enregistre la forme des requêtes SQL exécutées par chaque
+    appel de route (HTTP et WebSocket) et le budget déclaré de la route
+    """
+
+    def __init__(self, app, engines: Iterable[Engine]):
+        self.app = app
+        self.calls: List[QueryCall] = []
+        for sync_engine in engines:
+            event.listen(sync_engine, "before_cursor_execute", self._record)
+
+    @staticmethod
+    def _record(connection, cursor, statement, parameters, context, executemany):
+        statements = _current_call.get()
+        if statements is not None:
+            statements.append(normalize_sql(statement))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] in ("http.response.start", "websocket.accept"):
+                status = message.get("status", 101)
+            elif message["type"] == "websocket.close" and status == 500:
+                status = 403  # Connexion WebSocket refusée
+            await send(message)
+
+        statements: List[str] = []
+        token = _current_call.set(statements)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_call.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                self.calls.append(QueryCall(
+                    scope.get("method", "WS"),
+                    route.path,
+                    status,
+                    getattr(route.endpoint, "query_budget", None),
+                    statements,
+                ))
+
+    def by_route(self) -> Dict[str, List[QueryCall]]:
+        routes: Dict[str, List[QueryCall]] = {}
+        for call in self.calls:
+            routes.setdefault(f"{call.method} {call.route}", []).append(call)
+        return routes
@@ -0,0 +1,241 @@
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, case, cast, delete, func, insert, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import TelemetryHistogram, TelemetryRollup
+from app.partitions import drop_expired_partitions, retention_cutoff, telemetry_partitions
+
+# Intervalles d'agrégation et format SQLite du début d'intervalle
+# (identique au stockage des datetime par SQLAlchemy, pour que les clés coïncident)
+RESOLUTIONS: Dict[str, str] = {
+    "1m": "%Y-%m-%d %H:%M:00.000000",
+    "1h": "%Y-%m-%d %H:00:00.000000",
+    "1d": "%Y-%m-%d 00:00:00.000000",
+}
+METRICS = ("temperature", "vibration", "current", "speed_rpm")
+
+# Histogrammes : intervalles tenus à jour et largeur fixe des classes par mesure
+# (changer une largeur impose de vider la table telemetryhistogram pour la recalculer)
+HISTOGRAM_RESOLUTIONS = ("1h", "1d")
+HISTOGRAM_BIN_WIDTHS: Dict[str, float] = {
+    "temperature": 0.5,  # °C
+    "vibration": 0.05,  # mm/s
+    "current": 0.1,  # A
+    "speed_rpm": 10.0,  # tr/min
+}
+
+_rollups = TelemetryRollup.__table__
+_histograms = TelemetryHistogram.__table__
+
+# Upsert des histogrammes en SQL brut : une lecture produit une ligne par résolution et
+# par mesure, et les paramètres (déjà au format de stockage) sont passés tels quels à
+# sqlite3, sans le traitement par ligne de SQLAlchemy qui coûtait plus que l'écriture
+_HISTOGRAM_UPSERT = (
+    f"INSERT INTO {_histograms.name} (motor_id, resolution, bucket_start, metric, bin, count) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (motor_id, resolution, bucket_start, metric, bin) DO UPDATE SET count = count + excluded.count"
+)
+
+
+def bucket_start(timestamp: datetime, resolution: str) -> datetime:
+    """Début de l'intervalle `resolution` contenant `timestamp`"""
+    if resolution == "1m":
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == "1h":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def histogram_bin(value: float, metric: str) -> int:
+    """Classe de largeur fixe contenant `value` (même calcul que _sql_histogram_bin)"""
+    return math.floor(value / HISTOGRAM_BIN_WIDTHS[metric])
+
+
+def aggregate_rows(rows: List[dict]) -> List[dict]:
+    """Agrège des lectures par moteur, résolution et intervalle"""
+    buckets: Dict[tuple, dict] = {}
+    for row in rows:
+        for resolution in RESOLUTIONS:
+            key = (row["motor_id"], resolution, bucket_start(row["created_at"], resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = {
+                    "motor_id": key[0], "resolution": key[1], "bucket_start": key[2],
+                    "count": 0, "running_count": 0
+                }
+                for metric in METRICS:
+                    bucket[f"{metric}_sum"] = 0.0
+                    bucket[f"{metric}_sumsq"] = 0.0
+                    bucket[f"{metric}_min"] = row[metric]
+                    bucket[f"{metric}_max"] = row[metric]
+                buckets[key] = bucket
+            bucket["count"] += 1
+            bucket["running_count"] += bool(row["is_running"])
+            for metric in METRICS:
+                value = row[metric]
+                bucket[f"{metric}_sum"] += value
+                bucket[f"{metric}_sumsq"] += value * value
+                bucket[f"{metric}_min"] = min(bucket[f"{metric}_min"], value)
+                bucket[f"{metric}_max"] = max(bucket[f"{metric}_max"], value)
+    return list(buckets.values())
+
+
+def aggregate_histograms(rows: List[dict]) -> List[tuple]:
+    """
+    Compte des lectures par moteur, résolution, intervalle, mesure et classe, en tuples
+    (motor_id, resolution, bucket_start, metric, bin, count) prêts pour _HISTOGRAM_UPSERT
+    (bucket_start au format de stockage des datetime)
+    """
+    counts: Dict[tuple, int] = {}
+    for row in rows:
+        for resolution in HISTOGRAM_RESOLUTIONS:
+            start = row["created_at"].strftime(RESOLUTIONS[resolution])
+            for metric in METRICS:
+                key = (row["motor_id"], resolution, start, metric, histogram_bin(row[metric], metric))
+                counts[key] = counts.get(key, 0) + 1
+    return [key + (count,) for key, count in counts.items()]
+
+
+def upsert_rollups(session: Session, rows: List[dict]) -> None:
+    """
+    Fusionne des lectures dans les agrégats et les histogrammes (une requête multi-lignes
+    chacun, sans relire les données brutes). À appeler dans la transaction qui insère
+    ces lectures.
+    """
+    buckets = aggregate_rows(rows)
+    if not buckets:
+        return
+    statement = sqlite_insert(_rollups)
+    excluded = statement.excluded
+    values = {
+        "count": _rollups.c.count + excluded.count,
+        "running_count": _rollups.c.running_count + excluded.running_count,
+    }
+    for metric in METRICS:
+        values[f"{metric}_sum"] = _rollups.c[f"{metric}_sum"] + excluded[f"{metric}_sum"]
+        values[f"{metric}_sumsq"] = _rollups.c[f"{metric}_sumsq"] + excluded[f"{metric}_sumsq"]
+        values[f"{metric}_min"] = func.min(_rollups.c[f"{metric}_min"], excluded[f"{metric}_min"])
+        values[f"{metric}_max"] = func.max(_rollups.c[f"{metric}_max"], excluded[f"{metric}_max"])
+    statement = statement.on_conflict_do_update(
+        index_elements=["motor_id", "resolution", "bucket_start"],
+        set_=values
+    )
+    session.exec(statement, params=buckets)
+
+    session.connection().exec_driver_sql(_HISTOGRAM_UPSERT, aggregate_histograms(rows))
+
+
+def _sql_histogram_bin(column, metric: str):
+    """floor(column / largeur) en SQL (CAST tronque vers zéro)"""
+    quotient = column / HISTOGRAM_BIN_WIDTHS[metric]
+    truncated = cast(quotient, Integer)
+    return case((quotient < truncated, truncated - 1), else_=truncated)
+
+
+def rebuild_rollups(connection: Connection) -> None:
+    """
+    Calcule les agrégats et les histogrammes à partir des partitions existantes si leur
+    table est vide (première mise en service). Les partitions étant alignées sur des
+    jours entiers, aucun intervalle n'est à cheval sur deux partitions.
+    """
+    if connection.execute(select(_rollups.c.motor_id).limit(1)).first() is None:
+        columns = ["motor_id", "resolution", "bucket_start", "count", "running_count"]
+        for metric in METRICS:
+            columns += [f"{metric}_sum", f"{metric}_sumsq", f"{metric}_min", f"{metric}_max"]
+
+        for partition in telemetry_partitions.all():
+            table = partition.table
+            for resolution, bucket_format in RESOLUTIONS.items():
+                bucket = func.strftime(bucket_format, table.c.created_at)
+                aggregates = []
+                for metric in METRICS:
+                    value = table.c[metric]
+                    aggregates += [func.sum(value), func.sum(value * value), func.min(value), func.max(value)]
+                connection.execute(
+                    insert(_rollups).from_select(
+                        columns,
+                        select(
+                            table.c.motor_id, literal(resolution), bucket, func.count(),
+                            func.sum(cast(table.c.is_running, Integer)), *aggregates
+                        ).group_by(table.c.motor_id, bucket)
+                    )
+                )
+
+    if connection.execute(select(_histograms.c.motor_id).limit(1)).first() is None:
+        columns = ["motor_id", "resolution", "bucket_start", "metric", "bin", "count"]
+        for partition in telemetry_partitions.all():
+            table = partition.table
+            for resolution in HISTOGRAM_RESOLUTIONS:
+                bucket = func.strftime(RESOLUTIONS[resolution], table.c.created_at)
+                for metric in METRICS:
+                    bin_ = _sql_histogram_bin(table.c[metric], metric)
+                    connection.execute(
+                        insert(_histograms).from_select(
+                            columns,
+                            select(
+                                table.c.motor_id, literal(resolution), bucket, literal(metric), bin_, func.count()
+                            ).group_by(table.c.motor_id, bucket, bin_)
+                        )
+                    )
+    connection.commit()
+
+
+def drop_expired_telemetry() -> List[str]:
+    """
+    Rétention : supprime les partitions expirées, les agrégats à la minute et les
+    histogrammes horaires correspondants (les agrégats horaires et journaliers et les
+    histogrammes journaliers sont conservés).
+    """
+    cutoff = retention_cutoff()
+    if cutoff is None:
+        return []
+    dropped = drop_expired_partitions()
+    with engine.connect() as connection:
+        connection.execute(
+            delete(_rollups)
+            .where(_rollups.c.resolution == "1m")
+            .where(_rollups.c.bucket_start < cutoff)
+        )
+        connection.execute(
+            delete(_histograms)
+            .where(_histograms.c.resolution == "1h")
+            .where(_histograms.c.bucket_start < cutoff)
+        )
+        connection.commit()
+    return dropped
+
+
+def fetch_rollups(
+    session: Session,
+    motor_id: int,
+    resolution: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> List[dict]:
+    """Agrégats d'un moteur sur [start, end), par ordre chronologique, avec les moyennes"""
+    statement = (
+        select(TelemetryRollup)
+        .where(TelemetryRollup.motor_id == motor_id)
+        .where(TelemetryRollup.resolution == resolution)
+    )
+    if start is not None:
+        statement = statement.where(TelemetryRollup.bucket_start >= bucket_start(start, resolution))
+    if end is not None:
+        statement = statement.where(TelemetryRollup.bucket_start < end)
+    statement = statement.order_by(TelemetryRollup.bucket_start)
+
+    results = []
+    for rollup in session.exec(statement).all():
+        result = {"bucket_start": rollup.bucket_start, "count": rollup.count}
+        for metric in METRICS:
+            result[f"{metric}_min"] = getattr(rollup, f"{metric}_min")
+            result[f"{metric}_max"] = getattr(rollup, f"{metric}_max")
+            result[f"{metric}_mean"] = getattr(rollup, f"{metric}_sum") / rollup.count
+        results.append(result)
+    return results
@@ -1,34 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.database import get_session
-from app.deps import verify_password, create_access_token
+from app.database import async_engine, async_read_engine
+from app.deps import create_tokens, decode_token, get_user, invalidate_user
 from app.models import User
-from app.schemas import Token, UserLogin, UserResponse
+from app.passwords import hash_password_async, password_hasher, verify_password_async
+from app.query_budget import query_budget
+from app.schemas import Token, TokenRefresh, UserLogin, UserResponse
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.post("/login", response_model=Token)
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session)
-):
+async def _authenticate(email: str, password: str) -> User:
     """
-    Connexion utilisateur (OAuth2 Password Flow)
-    
-    ⚠️ **Important pour Swagger UI** :
-    - Le champ "username" = votre EMAIL (ex: admin@motorguard.local)
-    - Le champ "password" = votre mot de passe (ex: admin123)
-    
-    Swagger UI utilisera automatiquement cet endpoint pour l'authentification.
+    Vérifie email et mot de passe (bcrypt dans le pool de processus dédié).
+    Un hash d'un autre coût que password_hash_rounds est refait au passage.
     """
-    # Rechercher l'utilisateur par email (form_data.username contient l'email)
-    statement = select(User).where(User.email == form_data.username)
-    user = session.exec(statement).first()
+    # Connexion en lecture rendue au pool avant bcrypt : une rafale de connexions
+    # n'immobilise pas les connexions des autres routes pendant le hachage
+    async with AsyncSession(async_read_engine) as session:
+        statement = select(User).where(User.email == email)
+        user = (await session.exec(statement)).first()
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password_async(password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -41,33 +38,68 @@ def login(
             detail="Inactive user"
         )
     
-    # Créer le token
-    access_token = create_access_token(data={"sub": user.id})
-    return {"access_token": access_token, "token_type": "bearer"}
+    if password_hasher.needs_rehash(user.password_hash):
+        await _rehash(user, password)
+    return user
+
+
+async def _rehash(user: User, password: str) -> None:
+    # Session d'écriture dédiée (la connexion lit sur le pool en lecture seule) ;
+    # le hash n'est remplacé que s'il n'a pas changé entre-temps
+    new_hash = await hash_password_async(password)
+    table = User.__table__
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            update(table)
+            .where(table.c.id == user.id, table.c.password_hash == user.password_hash)
+            .values(password_hash=new_hash)
+        )
+        await session.commit()
+    invalidate_user(user.id)
+
+
+@router.post("/login", response_model=Token)
+@query_budget(2)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends()
+):
+    """
+    Connexion utilisateur (OAuth2 Password Flow)
+    
+    ⚠️ **Important pour Swagger UI** :
+    - Le champ "username" = votre EMAIL (ex: admin@motorguard.local)
+    - Le champ "password" = votre mot de passe (ex: admin123)
+    
+    Swagger UI utilisera automatiquement cet endpoint pour l'authentification.
+    """
+    # form_data.username contient l'email
+    user = await _authenticate(form_data.username, form_data.password)
+    return create_tokens(user.id)
 
 
 @router.post("/login-json", response_model=Token)
-def login_json(
-    user_data: UserLogin,
-    session: Session = Depends(get_session)
+@query_budget(2)
+async def login_json(
+    user_data: UserLogin
 ):
     """Connexion utilisateur (format JSON)"""
-    statement = select(User).where(User.email == user_data.email)
-    user = session.exec(statement).first()
-    
-    if not user or not verify_password(user_data.password, user.password_hash):
+    user = await _authenticate(user_data.email, user_data.password)
+    return create_tokens(user.id)
+
+
+@router.post("/refresh", response_model=Token)
+@query_budget(1)
+async def refresh(request: TokenRefresh):
+    """
+    Échanger un token de rafraîchissement contre un nouveau token d'accès
+    (et un nouveau token de rafraîchissement), sans mot de passe ni bcrypt.
+    """
+    user_id = decode_token(request.refresh_token, "refresh")
+    user = await get_user(user_id) if user_id is not None else None
+    if user is None or not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
+            detail="Invalid or expired refresh token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    if not user.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Inactive user"
-        )
-    
-    access_token = create_access_token(data={"sub": user.id})
-    return {"access_token": access_token, "token_type": "bearer"}
-
+    return create_tokens(user.id)
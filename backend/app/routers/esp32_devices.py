@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
 import secrets
 from datetime import datetime
 
-from app.database import get_session
-from app.deps import get_current_admin_user
+from app.commands import command_queue
+from app.database import get_async_read_session, get_async_session
+from app.deps import get_current_admin_user, invalidate_esp32_device, last_seen_tracker
+from app.fleet import fleet_overview
 from app.models import ESP32Device, Motor
+from app.query_budget import query_budget
 from app.schemas import ESP32DeviceCreate, ESP32DeviceResponse
 
 router = APIRouter(prefix="/esp32-devices", tags=["esp32-devices"])
@@ -18,15 +22,16 @@ def generate_api_key() -> str:
 
 
 @router.post("/", response_model=ESP32DeviceResponse, status_code=status.HTTP_201_CREATED)
-def create_esp32_device(
+@query_budget(4)
+async def create_esp32_device(
     device_data: ESP32DeviceCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_admin_user)
 ):
     """Créer un nouveau device ESP32 avec une API Key générée automatiquement"""
     # Vérifier que l'ESP32 n'existe pas déjà
     statement = select(ESP32Device).where(ESP32Device.esp32_uid == device_data.esp32_uid)
-    existing = session.exec(statement).first()
+    existing = (await session.exec(statement)).first()
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -35,7 +40,7 @@ def create_esp32_device(
     
     # Vérifier que le moteur existe si motor_id est fourni
     if device_data.motor_id:
-        motor = session.get(Motor, device_data.motor_id)
+        motor = await session.get(Motor, device_data.motor_id)
         if not motor:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -53,31 +58,33 @@ def create_esp32_device(
         is_active=True,
     )
     session.add(new_device)
-    session.commit()
-    session.refresh(new_device)
+    await session.commit()
+    fleet_overview.invalidate()
     
     return new_device
 
 
 @router.get("/", response_model=List[ESP32DeviceResponse])
-def list_esp32_devices(
-    session: Session = Depends(get_session),
+@query_budget(2)
+async def list_esp32_devices(
+    session: AsyncSession = Depends(get_async_read_session),
     current_user = Depends(get_current_admin_user)
 ):
     """Liste tous les devices ESP32"""
     statement = select(ESP32Device).order_by(ESP32Device.created_at.desc())
-    devices = session.exec(statement).all()
+    devices = (await session.exec(statement)).all()
     return devices
 
 
 @router.get("/{device_id}", response_model=ESP32DeviceResponse)
-def get_esp32_device(
+@query_budget(2)
+async def get_esp32_device(
     device_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user = Depends(get_current_admin_user)
 ):
     """Récupérer un device ESP32 par ID"""
-    device = session.get(ESP32Device, device_id)
+    device = await session.get(ESP32Device, device_id)
     if not device:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -87,21 +94,22 @@ def get_esp32_device(
 
 
 @router.patch("/{device_id}/motor", response_model=ESP32DeviceResponse)
-def associate_motor_to_esp32(
+@query_budget(3)
+async def associate_motor_to_esp32(
     device_id: int,
     motor_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_admin_user)
 ):
     """Associer un moteur à un ESP32"""
-    device = session.get(ESP32Device, device_id)
+    device = await session.get(ESP32Device, device_id)
     if not device:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="ESP32 device not found"
         )
     
-    motor = session.get(Motor, motor_id)
+    motor = await session.get(Motor, motor_id)
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -110,43 +118,48 @@ def associate_motor_to_esp32(
     
     device.motor_id = motor_id
     session.add(device)
-    session.commit()
-    session.refresh(device)
+    await session.commit()
+    fleet_overview.invalidate()
+    invalidate_esp32_device(device.api_key)
     
     return device
 
 
 @router.post("/{device_id}/regenerate-api-key", response_model=ESP32DeviceResponse)
-def regenerate_api_key(
+@query_budget(3)
+async def regenerate_api_key(
     device_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_admin_user)
 ):
     """Régénérer l'API Key d'un ESP32"""
-    device = session.get(ESP32Device, device_id)
+    device = await session.get(ESP32Device, device_id)
     if not device:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="ESP32 device not found"
         )
     
+    old_api_key = device.api_key
     device.api_key = generate_api_key()
     session.add(device)
-    session.commit()
-    session.refresh(device)
+    await session.commit()
+    # L'ancienne clé ne doit plus être acceptée, même depuis le cache
+    invalidate_esp32_device(old_api_key)
     
     return device
 
 
 @router.patch("/{device_id}/activate", response_model=ESP32DeviceResponse)
-def activate_esp32_device(
+@query_budget(2)
+async def activate_esp32_device(
     device_id: int,
     is_active: bool,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_admin_user)
 ):
     """Activer ou désactiver un ESP32"""
-    device = session.get(ESP32Device, device_id)
+    device = await session.get(ESP32Device, device_id)
     if not device:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -155,27 +168,35 @@ def activate_esp32_device(
     
     device.is_active = is_active
     session.add(device)
-    session.commit()
-    session.refresh(device)
+    await session.commit()
+    fleet_overview.invalidate()
+    invalidate_esp32_device(device.api_key)
     
     return device
 
 
 @router.delete("/{device_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_esp32_device(
+@query_budget(4)
+async def delete_esp32_device(
     device_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_admin_user)
 ):
     """Supprimer un device ESP32"""
-    device = session.get(ESP32Device, device_id)
+    device = await session.get(ESP32Device, device_id)
     if not device:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="ESP32 device not found"
         )
     
-    session.delete(device)
-    session.commit()
+    api_key, device_id = device.api_key, device.id
+    await command_queue.remove_device(session, device_id)
+    await session.delete(device)
+    await session.commit()
+    command_queue.forget_device(device_id)
+    fleet_overview.invalidate()
+    invalidate_esp32_device(api_key)
+    last_seen_tracker.discard(device_id)
     return None
 
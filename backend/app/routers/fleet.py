@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Header, Response, status
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional
+
+from app.database import get_async_read_session
+from app.deps import get_current_active_user
+from app.fleet import etag_matches, fleet_overview
+from app.query_budget import query_budget
+from app.schemas import FleetOverviewResponse
+
+router = APIRouter(prefix="/fleet", tags=["fleet"])
+
+
+@router.get("/overview", response_model=FleetOverviewResponse)
+@query_budget(3)
+async def get_fleet_overview(
+    if_none_match: Optional[str] = Header(default=None),
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Vue d'ensemble du parc en une requête : valeurs en direct, état de sécurité, tâches de
+    maintenance ouvertes et dernier contact (en ligne / hors ligne) de chaque moteur.
+    Renvoyer l'ETag reçu dans If-None-Match : 304 sans corps si rien n'a changé.
+    """
+    snapshot = await fleet_overview.snapshot(session)
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
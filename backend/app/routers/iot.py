@@ -1,20 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
+from typing import List
 
-from app.database import get_session
+from app.commands import COMMAND_ACTIONS, command_queue
+from app.config import settings
+from app.database import get_async_read_session, get_async_session
 from app.deps import get_current_active_user, get_esp32_device_by_api_key
-from app.models import Motor, Telemetry, ESP32Device
-from app.schemas import MotorStatusResponse, MotorCommandRequest, TelemetryCreate
+from app.ingest import build_telemetry_rows, enqueue_telemetry
+from app.models import DeviceCommand, Motor, ESP32Device
+from app.motor_state import motor_state_store
+from app.packed import PACKED_MEDIA_TYPE, decode_packed_telemetry
+from app.query_budget import query_budget
+from app.schemas import (
+    DeviceCommandResponse, MotorStatusResponse, MotorCommandRequest, TelemetryCreate, TelemetryBatchCreate
+)
 
 router = APIRouter(prefix="/iot", tags=["iot"])
 
 
 @router.get("/motor/status", response_model=MotorStatusResponse)
-def get_motor_status(
+@query_budget(1)
+async def get_motor_status(
     esp32_uid: str = None,
     motor_code: str = None,
-    session: Session = Depends(get_session),
     current_user = Depends(get_current_active_user)
 ):
     """
@@ -22,19 +32,17 @@ def get_motor_status(
     Cette route simule ce que l'ESP32 devrait exposer.
     En production, cette route serait appelée directement par l'ESP32.
     """
-    # Rechercher le moteur
-    statement = None
+    # Rechercher le moteur (état en direct servi depuis la mémoire)
     if esp32_uid:
-        statement = select(Motor).where(Motor.esp32_uid == esp32_uid)
+        motor = motor_state_store.get_by_esp32_uid(esp32_uid)
     elif motor_code:
-        statement = select(Motor).where(Motor.code == motor_code)
+        motor = motor_state_store.get_by_code(motor_code)
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="esp32_uid or motor_code required"
         )
     
-    motor = session.exec(statement).first()
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -56,36 +64,53 @@ def get_motor_status(
 
 
 @router.post("/motor/command")
-def send_motor_command(
+@query_budget(4)
+async def send_motor_command(
     command: MotorCommandRequest,
     esp32_uid: str = None,
     motor_code: str = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_active_user)
 ):
     """
     Envoyer une commande au moteur via l'ESP32.
-    Cette route simule ce que l'ESP32 devrait exposer.
-    En production, cette route serait appelée directement par l'ESP32.
+    La commande est ajoutée à la file de l'ESP32 associé au moteur, qui la reçoit par
+    long-polling (GET /iot/commands) dès qu'elle est commitée ; l'état du moteur est mis
+    à jour immédiatement, puis confirmé par la télémétrie de l'ESP32.
     """
-    # Rechercher le moteur
-    statement = None
+    if command.action not in COMMAND_ACTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="action must be START or STOP"
+        )
+    
+    # Rechercher le moteur et l'ESP32 actif qui lui est associé
+    statement = select(Motor, ESP32Device.id).outerjoin(
+        ESP32Device, (ESP32Device.motor_id == Motor.id) & (ESP32Device.is_active == True)
+    )
     if esp32_uid:
-        statement = select(Motor).where(Motor.esp32_uid == esp32_uid)
+        statement = statement.where(Motor.esp32_uid == esp32_uid)
     elif motor_code:
-        statement = select(Motor).where(Motor.code == motor_code)
+        statement = statement.where(Motor.code == motor_code)
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="esp32_uid or motor_code required"
         )
     
-    motor = session.exec(statement).first()
-    if not motor:
+    row = (await session.exec(statement.order_by(ESP32Device.id))).first()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Motor not found"
         )
+    motor, device_id = row
+    if device_id is None:
+        # Sans ESP32 pour l'exécuter, la commande ne doit pas changer l'état affiché
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="No active ESP32 for this motor"
+        )
     
     # Mettre à jour l'état du moteur selon la commande
     if command.action == "START":
@@ -98,62 +123,145 @@ def send_motor_command(
     
     motor.last_update = datetime.utcnow()
     session.add(motor)
-    session.commit()
+    # Commitée avec l'état du moteur
+    queued = await command_queue.enqueue(
+        session, device_id, motor.id, command.action, command.target_speed_rpm, current_user.id
+    )
+    motor_state_store.update_live(
+        motor.id,
+        is_running=motor.is_running,
+        last_speed_rpm=motor.last_speed_rpm,
+        last_update=motor.last_update
+    )
     
-    return {"status": "ok", "message": f"Command {command.action} executed"}
+    return {"status": "ok", "message": f"Command {command.action} queued", "command": queued}
 
 
-@router.post("/telemetry/from-esp32", status_code=status.HTTP_201_CREATED)
-def receive_telemetry_from_esp32(
-    telemetry_data: TelemetryCreate,
-    esp32_device: ESP32Device = Depends(get_esp32_device_by_api_key),
-    session: Session = Depends(get_session)
+@router.get("/commands", response_model=List[DeviceCommandResponse])
+@query_budget(4)
+async def poll_device_commands(
+    after: int = Query(default=0, ge=0),
+    wait: float = Query(default=30, ge=0, le=settings.command_poll_max_wait_seconds),
+    session: AsyncSession = Depends(get_async_session),
+    esp32_device: ESP32Device = Depends(get_esp32_device_by_api_key)
 ):
     """
-    Endpoint sécurisé pour recevoir la télémétrie directement de l'ESP32.
-    Authentification via API Key dans le header X-API-Key.
+    Commandes en attente pour l'ESP32 (long-polling, authentification par X-API-Key).
+    `after` est le numéro de la dernière commande exécutée : elle et les précédentes sont
+    acquittées. La réponse contient les commandes suivantes, triées par numéro ; sans
+    commande, la requête attend jusqu'à `wait` secondes et se termine dès qu'une commande
+    est envoyée (liste vide à l'expiration du délai). L'ESP32 la relance aussitôt.
     """
+    return await command_queue.poll(session, esp32_device.id, after, wait)
+
+
+@router.get("/motor/{motor_id}/commands", response_model=List[DeviceCommandResponse])
+@query_budget(2)
+async def list_motor_commands(
+    motor_id: int,
+    limit: int = Query(default=20, ge=1, le=200),
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user = Depends(get_current_active_user)
+):
+    """Dernières commandes envoyées à un moteur, avec leur remise et leur acquittement"""
+    statement = (
+        select(DeviceCommand)
+        .where(DeviceCommand.motor_id == motor_id)
+        .order_by(DeviceCommand.id.desc())
+        .limit(limit)
+    )
+    return (await session.exec(statement)).all()
+
+
+def check_device_motor(esp32_device: ESP32Device, motor_id: int) -> int:
+    """Vérifie que l'ESP32 est associé au moteur annoncé et retourne son motor_id"""
     # Utiliser le motor_id associé à l'ESP32
-    motor_id = esp32_device.motor_id
-    if not motor_id:
+    if not esp32_device.motor_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="ESP32 not associated with a motor"
         )
     
     # Vérifier que le motor_id correspond
-    if telemetry_data.motor_id != motor_id:
+    if motor_id != esp32_device.motor_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Motor ID mismatch"
         )
+    return esp32_device.motor_id
+
+
+@router.post("/telemetry/from-esp32", status_code=status.HTTP_201_CREATED)
+@query_budget(1)
+async def receive_telemetry_from_esp32(
+    telemetry_data: TelemetryCreate,
+    esp32_device: ESP32Device = Depends(get_esp32_device_by_api_key)
+):
+    """
+    Endpoint sécurisé pour recevoir la télémétrie directement de l'ESP32.
+    Authentification via API Key dans le header X-API-Key.
+    """
+    motor_id = check_device_motor(esp32_device, telemetry_data.motor_id)
     
-    # Créer la télémétrie
-    new_telemetry = Telemetry(
-        motor_id=motor_id,
-        temperature=telemetry_data.temperature,
-        vibration=telemetry_data.vibration,
-        current=telemetry_data.current,
-        speed_rpm=telemetry_data.speed_rpm,
-        is_running=telemetry_data.is_running,
-        battery_percent=telemetry_data.battery_percent,
-    )
-    session.add(new_telemetry)
+    # La lecture passe par le buffer d'ingestion (group commit avec les autres ESP32)
+    ids = await enqueue_telemetry(build_telemetry_rows(motor_id, [telemetry_data]))
     
-    # Mettre à jour le moteur avec les dernières valeurs
-    motor = session.get(Motor, motor_id)
-    if motor:
-        motor.is_running = telemetry_data.is_running
-        motor.last_temperature = telemetry_data.temperature
-        motor.last_vibration = telemetry_data.vibration
-        motor.last_current = telemetry_data.current
-        motor.last_speed_rpm = telemetry_data.speed_rpm
-        motor.last_battery_percent = telemetry_data.battery_percent
-        motor.last_update = datetime.utcnow()
-        session.add(motor)
+    return {"status": "ok", "telemetry_id": ids[0]}
+
+
+@router.post("/telemetry/from-esp32/batch", status_code=status.HTTP_201_CREATED)
+@query_budget(1)
+async def receive_telemetry_batch_from_esp32(
+    batch_data: TelemetryBatchCreate,
+    esp32_device: ESP32Device = Depends(get_esp32_device_by_api_key)
+):
+    """
+    Recevoir un lot de lectures de l'ESP32 (mesures bufferisées, éventuellement hors ligne).
+    Les lectures sont insérées en une seule requête et une seule transaction ;
+    les dernières valeurs du moteur proviennent de la lecture la plus récente.
+    """
+    motor_id = check_device_motor(esp32_device, batch_data.motor_id)
     
-    session.commit()
-    session.refresh(new_telemetry)
+    rows = build_telemetry_rows(motor_id, batch_data.readings)
+    ids = await enqueue_telemetry(rows)
     
-    return {"status": "ok", "telemetry_id": new_telemetry.id}
+    # Lectures hors de la période de rétention : écartées, pas stockées
+    return {"status": "ok", "count": len(ids), "dropped": len(rows) - len(ids)}
+
 
+@router.post(
+    "/telemetry/from-esp32/packed",
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {PACKED_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}}},
+    }},
+)
+@query_budget(1)
+async def receive_packed_telemetry_from_esp32(
+    request: Request,
+    content_type: str = Header(default=""),
+    esp32_device: ESP32Device = Depends(get_esp32_device_by_api_key)
+):
+    """
+    Recevoir une ou plusieurs lectures au format binaire compact (voir app/packed.py),
+    plus simple à produire sur l'ESP32 et moins coûteux à décoder qu'un JSON.
+    Les lectures suivent le même chemin que /telemetry/from-esp32 (buffer d'ingestion).
+    """
+    if content_type.split(";")[0].strip().lower() != PACKED_MEDIA_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type must be {PACKED_MEDIA_TYPE}"
+        )
+    try:
+        motor_id, rows = decode_packed_telemetry(await request.body())
+    except ValueError as error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(error)
+        )
+    check_device_motor(esp32_device, motor_id)
+    
+    ids = await enqueue_telemetry(rows)
+    
+    return {"status": "ok", "count": len(ids), "dropped": len(rows) - len(ids)}
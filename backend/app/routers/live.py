@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+import anyio
+import asyncio
+import json
+
+from app.config import settings
+from app.deps import get_current_active_user, get_current_user
+from app.pubsub import telemetry_bus
+from app.query_budget import query_budget
+
+router = APIRouter(prefix="/live", tags=["live"])
+
+
+async def stream_events(motor_id: Optional[int]) -> AsyncIterator[str]:
+    """Flux Server-Sent Events d'un abonnement (désabonné à la déconnexion du client)"""
+    subscription = telemetry_bus.subscribe(motor_id)
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.get(), timeout=settings.live_keepalive_seconds
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                yield "event: dropped\ndata: {}\n\n"
+                return
+            yield f"event: telemetry\ndata: {json.dumps(message)}\n\n"
+    finally:
+        telemetry_bus.unsubscribe(subscription)
+
+
+@router.get("/telemetry")
+@query_budget(1)
+async def stream_telemetry(
+    motor_id: Optional[int] = None,
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Télémétrie en direct (Server-Sent Events) d'un moteur, ou de tout le parc sans motor_id.
+    Les messages sont diffusés depuis la mémoire après le commit, sans lecture en base.
+    """
+    return StreamingResponse(
+        stream_events(motor_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+@query_budget(1)
+async def telemetry_websocket(
+    websocket: WebSocket,
+    token: str,
+    motor_id: Optional[int] = None
+):
+    """
+    Télémétrie en direct par WebSocket (token JWT en paramètre, les navigateurs ne
+    pouvant pas envoyer d'en-tête Authorization). Un client trop lent est déconnecté
+    avec le code 1013 et doit se reconnecter.
+    """
+    try:
+        user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if not user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscription = telemetry_bus.subscribe(motor_id)
+    try:
+        async with anyio.create_task_group() as task_group:
+            async def receive():
+                # Les messages du client sont ignorés ; sert à détecter la déconnexion
+                try:
+                    while True:
+                        await websocket.receive_text()
+                except WebSocketDisconnect:
+                    task_group.cancel_scope.cancel()
+
+            task_group.start_soon(receive)
+            while True:
+                message = await subscription.get()
+                if message is None:
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+                    break
+                await websocket.send_json(message)
+            task_group.cancel_scope.cancel()
+    finally:
+        telemetry_bus.unsubscribe(subscription)
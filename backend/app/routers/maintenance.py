@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
 from datetime import datetime
 
-from app.database import get_session
+from app.database import get_async_read_session, get_async_session
 from app.deps import get_current_active_user, get_current_admin_user
+from app.fleet import fleet_overview
 from app.models import Motor, User, MaintenanceTask, MaintenanceReport
+from app.query_budget import query_budget
 from app.schemas import (
     MaintenanceTaskCreate, MaintenanceTaskResponse,
     MaintenanceReportCreate, MaintenanceReportResponse
@@ -15,15 +18,16 @@ router = APIRouter(prefix="/maintenance", tags=["maintenance"])
 
 
 @router.post("/tasks", response_model=MaintenanceTaskResponse, status_code=status.HTTP_201_CREATED)
-def create_task(
+@query_budget(4, repeats=2)
+async def create_task(
     task_data: MaintenanceTaskCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Créer une tâche de maintenance (ADMIN uniquement)"""
     # Vérifier que le moteur existe
     statement = select(Motor).where(Motor.id == task_data.motor_id)
-    motor = session.exec(statement).first()
+    motor = (await session.exec(statement)).first()
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -32,7 +36,7 @@ def create_task(
     
     # Vérifier que l'utilisateur assigné existe
     statement = select(User).where(User.id == task_data.assigned_to_user_id)
-    assigned_user = session.exec(statement).first()
+    assigned_user = (await session.exec(statement)).first()
     if not assigned_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -44,17 +48,18 @@ def create_task(
         created_by_user_id=current_user.id
     )
     session.add(new_task)
-    session.commit()
-    session.refresh(new_task)
+    await session.commit()
+    fleet_overview.invalidate()
     return new_task
 
 
 @router.get("/tasks", response_model=List[MaintenanceTaskResponse])
-def list_tasks(
+@query_budget(2)
+async def list_tasks(
     motor_id: int = None,
     assigned_to_user_id: int = None,
     status: str = None,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Lister les tâches de maintenance"""
@@ -72,19 +77,20 @@ def list_tasks(
     if status:
         statement = statement.where(MaintenanceTask.status == status)
     
-    tasks = session.exec(statement).all()
+    tasks = (await session.exec(statement)).all()
     return tasks
 
 
 @router.get("/tasks/{task_id}", response_model=MaintenanceTaskResponse)
-def get_task(
+@query_budget(2)
+async def get_task(
     task_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Obtenir une tâche de maintenance"""
     statement = select(MaintenanceTask).where(MaintenanceTask.id == task_id)
-    task = session.exec(statement).first()
+    task = (await session.exec(statement)).first()
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -102,15 +108,16 @@ def get_task(
 
 
 @router.put("/tasks/{task_id}/status", response_model=MaintenanceTaskResponse)
-def update_task_status(
+@query_budget(3)
+async def update_task_status(
     task_id: int,
     new_status: str,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Mettre à jour le statut d'une tâche"""
     statement = select(MaintenanceTask).where(MaintenanceTask.id == task_id)
-    task = session.exec(statement).first()
+    task = (await session.exec(statement)).first()
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -127,21 +134,22 @@ def update_task_status(
     task.status = new_status
     task.updated_at = datetime.utcnow()
     session.add(task)
-    session.commit()
-    session.refresh(task)
+    await session.commit()
+    fleet_overview.invalidate()
     return task
 
 
 @router.post("/reports", response_model=MaintenanceReportResponse, status_code=status.HTTP_201_CREATED)
-def create_report(
+@query_budget(5)
+async def create_report(
     report_data: MaintenanceReportCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Créer un rapport de maintenance"""
     # Vérifier que la tâche existe
     statement = select(MaintenanceTask).where(MaintenanceTask.id == report_data.task_id)
-    task = session.exec(statement).first()
+    task = (await session.exec(statement)).first()
     if not task:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -157,7 +165,7 @@ def create_report(
     
     # Vérifier qu'il n'y a pas déjà un rapport
     statement = select(MaintenanceReport).where(MaintenanceReport.task_id == report_data.task_id)
-    existing_report = session.exec(statement).first()
+    existing_report = (await session.exec(statement)).first()
     if existing_report:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -172,20 +180,21 @@ def create_report(
     task.updated_at = datetime.utcnow()
     session.add(task)
     
-    session.commit()
-    session.refresh(new_report)
+    await session.commit()
+    fleet_overview.invalidate()
     return new_report
 
 
 @router.get("/reports/task/{task_id}", response_model=MaintenanceReportResponse)
-def get_task_report(
+@query_budget(2)
+async def get_task_report(
     task_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """Obtenir le rapport d'une tâche"""
     statement = select(MaintenanceReport).where(MaintenanceReport.task_id == task_id)
-    report = session.exec(statement).first()
+    report = (await session.exec(statement)).first()
     if not report:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
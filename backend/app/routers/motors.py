@@ -1,25 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
 
-from app.database import get_session
+from app.anomaly import anomaly_detector
+from app.database import get_async_session
 from app.deps import get_current_active_user
 from app.models import Motor
+from app.motor_state import motor_state_store
+from app.query_budget import query_budget
+from app.safety_engine import safety_engine
 from app.schemas import MotorCreate, MotorUpdate, MotorResponse
 
 router = APIRouter(prefix="/motors", tags=["motors"])
 
 
 @router.post("/", response_model=MotorResponse, status_code=status.HTTP_201_CREATED)
-def create_motor(
+@query_budget(3)
+async def create_motor(
     motor_data: MotorCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_active_user)
 ):
     """Créer un nouveau moteur"""
     # Vérifier si le code existe déjà
     statement = select(Motor).where(Motor.code == motor_data.code)
-    existing_motor = session.exec(statement).first()
+    existing_motor = (await session.exec(statement)).first()
     if existing_motor:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -28,31 +34,27 @@ def create_motor(
     
     new_motor = Motor(**motor_data.dict())
     session.add(new_motor)
-    session.commit()
-    session.refresh(new_motor)
-    return new_motor
+    await session.commit()
+    return motor_state_store.upsert_motor(new_motor)
 
 
 @router.get("/", response_model=List[MotorResponse])
-def list_motors(
-    session: Session = Depends(get_session),
+@query_budget(1)
+async def list_motors(
     current_user = Depends(get_current_active_user)
 ):
-    """Lister tous les moteurs"""
-    statement = select(Motor)
-    motors = session.exec(statement).all()
-    return motors
+    """Lister tous les moteurs (état en direct servi depuis la mémoire)"""
+    return motor_state_store.all()
 
 
 @router.get("/{motor_id}", response_model=MotorResponse)
-def get_motor(
+@query_budget(1)
+async def get_motor(
     motor_id: int,
-    session: Session = Depends(get_session),
     current_user = Depends(get_current_active_user)
 ):
     """Obtenir un moteur par ID"""
-    statement = select(Motor).where(Motor.id == motor_id)
-    motor = session.exec(statement).first()
+    motor = motor_state_store.get(motor_id)
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -62,15 +64,16 @@ def get_motor(
 
 
 @router.put("/{motor_id}", response_model=MotorResponse)
-def update_motor(
+@query_budget(3)
+async def update_motor(
     motor_id: int,
     motor_data: MotorUpdate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_active_user)
 ):
     """Mettre à jour un moteur"""
     statement = select(Motor).where(Motor.id == motor_id)
-    motor = session.exec(statement).first()
+    motor = (await session.exec(statement)).first()
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -82,27 +85,30 @@ def update_motor(
         setattr(motor, key, value)
     
     session.add(motor)
-    session.commit()
-    session.refresh(motor)
-    return motor
+    await session.commit()
+    return motor_state_store.upsert_motor(motor)
 
 
 @router.delete("/{motor_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_motor(
+@query_budget(3)
+async def delete_motor(
     motor_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user = Depends(get_current_active_user)
 ):
     """Supprimer un moteur"""
     statement = select(Motor).where(Motor.id == motor_id)
-    motor = session.exec(statement).first()
+    motor = (await session.exec(statement)).first()
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Motor not found"
         )
     
-    session.delete(motor)
-    session.commit()
+    await session.delete(motor)
+    await session.commit()
+    motor_state_store.remove(motor_id)
+    safety_engine.remove_motor(motor_id)
+    anomaly_detector.remove_motor(motor_id)
     return None
 
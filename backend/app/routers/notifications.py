@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import select, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+
+from app.database import get_async_read_session, get_async_session
+from app.deps import get_current_active_user
+from app.models import Notification
+from app.notifications import notification_store, read_by, unread_by, visible_to
+from app.pagination import NotificationCursor, decode_notification_cursor, encode_notification_cursor
+from app.query_budget import query_budget
+from app.schemas import NotificationMarkRead, NotificationResponse, NotificationUnreadCount
+
+router = APIRouter(prefix="/notifications", tags=["notifications"])
+
+
+@router.get("/", response_model=List[NotificationResponse])
+@query_budget(2)
+async def list_notifications(
+    response: Response,
+    unread_only: bool = False,
+    motor_id: Optional[int] = None,
+    type: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Lister les notifications de l'utilisateur (les siennes et celles adressées à tous),
+    de la plus récente à la plus ancienne selon leur dernière occurrence. L'en-tête
+    X-Next-Cursor donne le jeton à repasser dans `cursor` pour obtenir la page suivante.
+    """
+    # is_read du point de vue de l'utilisateur (lecture propre à chacun si adressée à tous)
+    table = Notification.__table__
+    columns = [column for column in table.c if column.name != "is_read"]
+    statement = select(*columns, read_by(current_user.id).label("is_read")).where(visible_to(current_user.id))
+    if unread_only:
+        statement = statement.where(unread_by(current_user.id))
+    if motor_id is not None:
+        statement = statement.where(Notification.motor_id == motor_id)
+    if type is not None:
+        statement = statement.where(Notification.type == type)
+    if cursor:
+        position = decode_notification_cursor(cursor)
+        statement = statement.where(
+            tuple_(Notification.last_occurred_at, Notification.id) < tuple_(*position.key)
+        )
+    statement = statement.order_by(Notification.last_occurred_at.desc(), Notification.id.desc()).limit(limit)
+    notifications = (await session.execute(statement)).mappings().all()
+
+    if len(notifications) >= limit:
+        oldest = notifications[-1]
+        response.headers["X-Next-Cursor"] = encode_notification_cursor(
+            NotificationCursor((oldest["last_occurred_at"], oldest["id"]))
+        )
+    return notifications
+
+
+@router.get("/unread-count", response_model=NotificationUnreadCount)
+@query_budget(1)
+async def get_unread_count(current_user = Depends(get_current_active_user)):
+    """Nombre de notifications non lues (compteur en mémoire, sans requête)"""
+    return {"unread": notification_store.unread_count(current_user.id)}
+
+
+@router.post("/read", response_model=NotificationUnreadCount)
+@query_budget(3)
+async def mark_notifications_read(
+    request: NotificationMarkRead,
+    session: AsyncSession = Depends(get_async_session),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Marquer des notifications comme lues : celles de `ids`, celles d'un moteur,
+    ou toutes si aucun filtre n'est donné. Retourne le nouveau nombre de non lues.
+    """
+    await session.run_sync(
+        notification_store.mark_read, current_user.id, ids=request.ids, motor_id=request.motor_id
+    )
+    return {"unread": notification_store.unread_count(current_user.id)}
@@ -1,102 +1,284 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-from typing import List, Optional
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Iterator, List, Literal, Optional
+from datetime import datetime, timedelta, timezone
+import csv
+import io
+import json
 
-from app.database import get_session
+from app.columnar import COLUMNAR_MEDIA_TYPE, accepts_columnar, encode_telemetry_columns
+from app.database import engine, get_async_read_session
 from app.deps import get_current_active_user
+from app.ingest import build_telemetry_rows, enqueue_telemetry
 from app.models import Motor, Telemetry
-from app.schemas import TelemetryCreate, TelemetryResponse
+from app.pagination import TelemetryCursor, decode_cursor, encode_cursor
+from app.partitions import fetch_telemetry, iter_telemetry
+from app.query_budget import query_budget
+from app.rollups import fetch_rollups
+from app.schemas import TelemetryAggregateResponse, TelemetryCreate, TelemetryResponse, TelemetryStatsResponse
+from app.telemetry_stats import fetch_telemetry_stats
 
 router = APIRouter(prefix="/telemetry", tags=["telemetry"])
 
 
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Convertit une borne de requête en UTC naïf (convention de la base)"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def check_time_window(start: Optional[datetime], end: Optional[datetime]) -> None:
+    """400 si les deux bornes sont données et ne forment pas une fenêtre"""
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must be before end"
+        )
+
+
 @router.post("/", response_model=TelemetryResponse, status_code=status.HTTP_201_CREATED)
-def create_telemetry(
+@query_budget(2)
+async def create_telemetry(
     telemetry_data: TelemetryCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user = Depends(get_current_active_user)
 ):
     """Créer un point de télémétrie"""
     # Vérifier que le moteur existe
     statement = select(Motor).where(Motor.id == telemetry_data.motor_id)
-    motor = session.exec(statement).first()
+    motor = (await session.exec(statement)).first()
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Motor not found"
         )
     
-    # Créer la télémétrie
-    new_telemetry = Telemetry(**telemetry_data.dict())
-    session.add(new_telemetry)
-    
-    # Mettre à jour les dernières valeurs du moteur
-    motor.is_running = telemetry_data.is_running
-    motor.last_temperature = telemetry_data.temperature
-    motor.last_vibration = telemetry_data.vibration
-    motor.last_current = telemetry_data.current
-    motor.last_speed_rpm = telemetry_data.speed_rpm
-    motor.last_battery_percent = telemetry_data.battery_percent
-    motor.last_update = datetime.utcnow()
-    session.add(motor)
-    
-    session.commit()
-    session.refresh(new_telemetry)
-    return new_telemetry
+    # Créer la télémétrie via le buffer d'ingestion ; la réponse contient la ligne
+    # créée, on attend donc toujours son commit quel que soit le mode de durabilité
+    row = build_telemetry_rows(motor.id, [telemetry_data])[0]
+    await enqueue_telemetry([row], wait_for_commit=True)
+    return Telemetry(**row)
 
 
 @router.get("/motor/{motor_id}", response_model=List[TelemetryResponse])
-def get_motor_telemetry(
+@query_budget(3)
+async def get_motor_telemetry(
     motor_id: int,
+    response: Response,
     limit: Optional[int] = 100,
     hours: Optional[int] = 24,
-    session: Session = Depends(get_session),
+    cursor: Optional[str] = None,
+    delta: bool = False,
+    accept: Optional[str] = Header(default=None),
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Obtenir l'historique de télémétrie d'un moteur (du plus récent au plus ancien).
+    Les en-têtes X-Next-Cursor (plus ancien) et X-Prev-Cursor (plus récent) donnent
+    les jetons à repasser dans `cursor` pour obtenir la page voisine.
+    Avec `Accept: application/vnd.motorguard.telemetry-columns`, la réponse est au
+    format binaire colonnaire (voir app/columnar.py), horodatages en delta si `delta`.
+    """
+    # Vérifier que le moteur existe
+    statement = select(Motor).where(Motor.id == motor_id)
+    motor = (await session.exec(statement)).first()
+    if not motor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Motor not found"
+        )
+    
+    if cursor:
+        # La fenêtre reste celle de la première page
+        position = decode_cursor(cursor)
+        start_date = position.start
+    else:
+        position = None
+        # Calculer la date de début
+        start_date = datetime.utcnow() - timedelta(hours=hours)
+    
+    # Récupérer la télémétrie (uniquement dans les partitions couvrant la période)
+    if position and position.direction == "prev":
+        telemetry = await session.run_sync(
+            fetch_telemetry, motor_id, start=start_date, limit=limit, descending=False, after=position.key
+        )
+        telemetry.reverse()
+    else:
+        telemetry = await session.run_sync(
+            fetch_telemetry, motor_id, start=start_date, limit=limit, after=position.key if position else None
+        )
+    
+    headers = {}
+    if telemetry:
+        newest, oldest = telemetry[0], telemetry[-1]
+        headers["X-Prev-Cursor"] = encode_cursor(
+            TelemetryCursor((newest.created_at, newest.id), "prev", start_date)
+        )
+        if limit is None or len(telemetry) >= limit or (position and position.direction == "prev"):
+            headers["X-Next-Cursor"] = encode_cursor(
+                TelemetryCursor((oldest.created_at, oldest.id), "next", start_date)
+            )
+    
+    if accepts_columnar(accept):
+        return Response(
+            content=encode_telemetry_columns(telemetry, delta=delta),
+            media_type=COLUMNAR_MEDIA_TYPE,
+            headers=headers
+        )
+    response.headers.update(headers)
+    return telemetry
+
+
+@router.get("/motor/{motor_id}/aggregate", response_model=List[TelemetryAggregateResponse])
+@query_budget(3)
+async def get_motor_telemetry_aggregate(
+    motor_id: int,
+    resolution: Literal["1m", "1h", "1d"] = "1h",
+    hours: Optional[int] = 24,
+    session: AsyncSession = Depends(get_async_read_session),
     current_user = Depends(get_current_active_user)
 ):
-    """Obtenir l'historique de télémétrie d'un moteur"""
+    """Obtenir les agrégats (min/max/moyenne) de télémétrie d'un moteur par minute, heure ou jour"""
     # Vérifier que le moteur existe
     statement = select(Motor).where(Motor.id == motor_id)
-    motor = session.exec(statement).first()
+    motor = (await session.exec(statement)).first()
     if not motor:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Motor not found"
         )
     
-    # Calculer la date de début
+    # Les agrégats sont précalculés à l'ingestion : un graphe sur 30 jours en "1d"
+    # ne lit que 30 lignes
     start_date = datetime.utcnow() - timedelta(hours=hours)
+    return await session.run_sync(fetch_rollups, motor_id, resolution, start=start_date)
+
+
+@router.get("/motor/{motor_id}/stats", response_model=TelemetryStatsResponse)
+@query_budget(5)
+async def get_motor_telemetry_stats(
+    motor_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    hours: int = 24,
+    bins: int = Query(default=20, ge=1, le=100),
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user = Depends(get_current_active_user)
+):
+    """
+    Statistiques de télémétrie d'un moteur sur une fenêtre (par défaut les `hours` dernières
+    heures) : nombre de lectures, min/max/moyenne/écart-type, centiles et histogramme (au plus
+    `bins` classes) par mesure, temps en marche et à l'arrêt. Calculées par SQLite sur les
+    agrégats et histogrammes tenus à jour à l'ingestion, la fenêtre est étendue aux heures entières.
+    """
+    # Vérifier que le moteur existe
+    statement = select(Motor).where(Motor.id == motor_id)
+    motor = (await session.exec(statement)).first()
+    if not motor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Motor not found"
+        )
+    
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    if end is None:
+        end = datetime.utcnow()
+    if start is None:
+        start = end - timedelta(hours=hours)
+    check_time_window(start, end)
+    return await session.run_sync(fetch_telemetry_stats, motor_id, start, end, bins)
+
+
+EXPORT_COLUMNS = [
+    "id", "motor_id", "temperature", "vibration", "current",
+    "speed_rpm", "is_running", "battery_percent", "created_at"
+]
+
+
+def stream_telemetry_export(
+    motor_id: int,
+    export_format: str,
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> Iterator[str]:
+    """
+    Génère l'export par paquets ; la connexion est ouverte (et fermée) par le générateur.
+    Générateur synchrone : StreamingResponse le parcourt dans le threadpool, un export
+    long n'occupe donc pas la boucle d'événements.
+    """
+    with engine.connect() as connection:
+        if export_format == "csv":
+            yield ",".join(EXPORT_COLUMNS) + "\r\n"
+        for rows in iter_telemetry(connection, motor_id, start=start, end=end):
+            buffer = io.StringIO()
+            if export_format == "csv":
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow(
+                        row.created_at.isoformat() if column == "created_at" else getattr(row, column)
+                        for column in EXPORT_COLUMNS
+                    )
+            else:
+                for row in rows:
+                    record = dict(row._mapping)
+                    record["created_at"] = row.created_at.isoformat()
+                    buffer.write(json.dumps(record))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+
+
+@router.get("/motor/{motor_id}/export")
+@query_budget(3)
+async def export_motor_telemetry(
+    motor_id: int,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user = Depends(get_current_active_user)
+):
+    """Exporter tout l'historique de télémétrie d'un moteur (NDJSON ou CSV, en flux)"""
+    # Vérifier que le moteur existe
+    statement = select(Motor).where(Motor.id == motor_id)
+    motor = (await session.exec(statement)).first()
+    if not motor:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Motor not found"
+        )
     
-    # Récupérer la télémétrie
-    statement = (
-        select(Telemetry)
-        .where(Telemetry.motor_id == motor_id)
-        .where(Telemetry.created_at >= start_date)
-        .order_by(Telemetry.created_at.desc())
-        .limit(limit)
+    # Avant la réponse : une erreur dans le flux surviendrait après l'envoi du statut 200
+    start, end = to_naive_utc(start), to_naive_utc(end)
+    check_time_window(start, end)
+    
+    if format == "csv":
+        media_type = "text/csv"
+    else:
+        media_type = "application/x-ndjson"
+    filename = f"telemetry_{motor.code}.{format}"
+    return StreamingResponse(
+        stream_telemetry_export(motor_id, format, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
-    telemetry_list = session.exec(statement).all()
-    return telemetry_list
 
 
 @router.get("/motor/{motor_id}/latest", response_model=TelemetryResponse)
-def get_latest_telemetry(
+@query_budget(2)
+async def get_latest_telemetry(
     motor_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user = Depends(get_current_active_user)
 ):
     """Obtenir la dernière télémétrie d'un moteur"""
-    statement = (
-        select(Telemetry)
-        .where(Telemetry.motor_id == motor_id)
-        .order_by(Telemetry.created_at.desc())
-        .limit(1)
-    )
-    telemetry = session.exec(statement).first()
+    telemetry = await session.run_sync(fetch_telemetry, motor_id, limit=1)
     if not telemetry:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No telemetry data found for this motor"
         )
-    return telemetry
-
+    return telemetry[0]
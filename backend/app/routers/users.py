@@ -1,25 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List
 
-from app.database import get_session
-from app.deps import get_current_admin_user, get_password_hash, get_current_active_user
+from app.database import get_async_read_session, get_async_session
+from app.deps import (
+    get_current_admin_user, get_current_active_user, invalidate_user
+)
 from app.models import User
-from app.schemas import UserCreate, UserResponse
+from app.passwords import hash_password_async
+from app.query_budget import query_budget
+from app.schemas import UserCreate, UserUpdate, UserResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(
+@query_budget(3)
+async def create_user(
     user_data: UserCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Créer un nouvel utilisateur (ADMIN uniquement)"""
+    # Hachage avant toute requête : la session n'a pas encore pris la connexion en
+    # écriture (unique), qui n'est donc pas immobilisée pendant bcrypt
+    hashed_password = await hash_password_async(user_data.password)
+    
     # Vérifier si l'email existe déjà
     statement = select(User).where(User.email == user_data.email)
-    existing_user = session.exec(statement).first()
+    existing_user = (await session.exec(statement)).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -27,7 +37,6 @@ def create_user(
         )
     
     # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user_data.password)
     new_user = User(
         full_name=user_data.full_name,
         email=user_data.email,
@@ -35,24 +44,25 @@ def create_user(
         role=user_data.role
     )
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
     return new_user
 
 
 @router.get("/", response_model=List[UserResponse])
-def list_users(
-    session: Session = Depends(get_session),
+@query_budget(2)
+async def list_users(
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Lister tous les utilisateurs (ADMIN uniquement)"""
     statement = select(User)
-    users = session.exec(statement).all()
+    users = (await session.exec(statement)).all()
     return users
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_info(
+@query_budget(1)
+async def get_current_user_info(
     current_user: User = Depends(get_current_active_user)
 ):
     """Obtenir les informations de l'utilisateur connecté"""
@@ -60,14 +70,15 @@ def get_current_user_info(
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(
+@query_budget(2, repeats=2)
+async def get_user(
     user_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_admin_user)
 ):
     """Obtenir un utilisateur par ID (ADMIN uniquement)"""
     statement = select(User).where(User.id == user_id)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -75,3 +86,32 @@ def get_user(
         )
     return user
 
+
+
+@router.put("/{user_id}", response_model=UserResponse)
+@query_budget(3, repeats=2)
+async def update_user(
+    user_id: int,
+    user_data: UserUpdate,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Mettre à jour le nom, le rôle ou l'état d'un utilisateur (ADMIN uniquement)"""
+    statement = select(User).where(User.id == user_id)
+    user = (await session.exec(statement)).first()
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    update_data = user_data.dict(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(user, key, value)
+    
+    session.add(user)
+    await session.commit()
+    
+    # Le rôle et l'état sont lus depuis le cache d'authentification
+    invalidate_user(user.id)
+    return user
@@ -0,0 +1,226 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Tuple
+
+from sqlalchemy import and_, bindparam, or_, update
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, select
+
+from app.commands import command_queue
+from app.models import Motor, SafetyConfig
+from app.motor_state import motor_state_store
+from app.notifications import notification_store
+
+# Règle -> (titre de la notification, unité, arrêt automatique du moteur)
+RULES: Dict[str, Tuple[str, str, bool]] = {
+    "high_temperature": ("Température élevée", "°C", True),
+    "high_vibration": ("Vibration élevée", "mm/s", True),
+    "low_battery": ("Batterie faible", "%", False),
+}
+
+
+class SafetyRules:
+    """Seuils d'un moteur, copiés de sa SafetyConfig"""
+    __slots__ = ("max_temperature", "max_vibration", "min_battery_percent", "delay")
+
+    def __init__(self, config: SafetyConfig):
+        self.max_temperature = config.max_temperature
+        self.max_vibration = config.max_vibration
+        self.min_battery_percent = config.min_battery_percent
+        self.delay = timedelta(seconds=config.emergency_stop_delay_seconds)
+
+
+class ViolationWindow:
+    """Dépassement en cours d'une règle : début de l'épisode et alerte déjà émise ou non"""
+    __slots__ = ("since", "fired")
+
+    def __init__(self, since: datetime):
+        self.since = since
+        self.fired = False
+
+
+class SafetyEvent(NamedTuple):
+    motor_id: int
+    type: str
+    value: float
+    limit: float
+    since: datetime
+    at: datetime
+
+
+class SafetyEngine:
+    """
+    Évalue les seuils de sécurité sur la télémétrie commitée, côté serveur.
+    Un dépassement doit durer emergency_stop_delay_seconds (horodatage des lectures)
+    avant de déclencher une notification et, pour la température et la vibration,
+    un arrêt automatique du moteur. Une seule alerte est émise par épisode ; l'épisode
+    se termine au retour d'une lecture dans les seuils.
+    Seuls les moteurs ayant une SafetyConfig sont surveillés.
+    """
+
+    def __init__(self):
+        self._rules: Dict[int, SafetyRules] = {}
+        # Utilisés uniquement par le writer d'ingestion
+        self._windows: Dict[Tuple[int, str], ViolationWindow] = {}
+        self._last_reading: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.triggered = 0
+        # Incrémentée quand les seuils ou les dépassements en cours changent
+        self.version = 0
+
+    def load(self, session: Session) -> None:
+        """Charge les configurations de sécurité en mémoire"""
+        configs = session.exec(select(SafetyConfig)).all()
+        with self._lock:
+            self._rules = {config.motor_id: SafetyRules(config) for config in configs}
+            self.version += 1
+
+    def set_rules(self, config: SafetyConfig) -> None:
+        """Prend en compte une configuration créée ou modifiée (après commit)"""
+        with self._lock:
+            rules = dict(self._rules)
+            rules[config.motor_id] = SafetyRules(config)
+            self._rules = rules
+            self.version += 1
+
+    def remove_motor(self, motor_id: int) -> None:
+        with self._lock:
+            rules = dict(self._rules)
+            rules.pop(motor_id, None)
+            self._rules = rules
+            self.version += 1
+
+    def evaluate(self, rows: List[dict]) -> List[SafetyEvent]:
+        """
+        Évalue un lot de lectures et retourne les alertes à émettre.
+        Les lectures sont traitées par ordre chronologique ; une lecture plus ancienne
+        que la dernière évaluée pour son moteur (lot rattrapé) est ignorée.
+        """
+        all_rules = self._rules
+        if not all_rules:
+            return []
+        windows = self._windows
+        last_reading = self._last_reading
+        events = []
+        for row in sorted(rows, key=lambda row: row["created_at"]):
+            motor_id = row["motor_id"]
+            rules = all_rules.get(motor_id)
+            if rules is None:
+                continue
+            at = row["created_at"]
+            previous = last_reading.get(motor_id)
+            if previous is not None and at < previous:
+                continue
+            last_reading[motor_id] = at
+            self.evaluated += 1
+
+            temperature, vibration, battery = row["temperature"], row["vibration"], row["battery_percent"]
+            checks = (
+                ("high_temperature", temperature, rules.max_temperature,
+                 temperature > rules.max_temperature),
+                ("high_vibration", vibration, rules.max_vibration,
+                 vibration > rules.max_vibration),
+                ("low_battery", battery, rules.min_battery_percent,
+                 battery is not None and battery < rules.min_battery_percent),
+            )
+            for rule, value, limit, violated in checks:
+                key = (motor_id, rule)
+                window = windows.get(key)
+                if not violated:
+                    if window is not None:
+                        del windows[key]
+                        self.version += 1
+                    continue
+                if window is None:
+                    window = windows[key] = ViolationWindow(at)
+                    self.version += 1
+                if not window.fired and at - window.since >= rules.delay:
+                    window.fired = True
+                    self.version += 1
+                    events.append(SafetyEvent(motor_id, rule, value, limit, window.since, at))
+        self.triggered += len(events)
+        return events
+
+    def apply(self, connection: Connection, events: List[SafetyEvent]) -> None:
+        """
+        Enregistre les notifications (regroupées) et arrête les moteurs concernés : état
+        en base et commande STOP à leur ESP32 (une transaction)
+        """
+        if not events:
+            return
+        notifications = []
+        stops: Dict[int, datetime] = {}
+        for event in events:
+            title, unit, stop = RULES[event.type]
+            motor = motor_state_store.get(event.motor_id)
+            name = motor.code if motor else f"#{event.motor_id}"
+            message = (
+                f"{name} : {event.value:.1f} {unit} (seuil {event.limit:.1f} {unit}) "
+                f"depuis {int((event.at - event.since).total_seconds())} s"
+            )
+            if stop:
+                message += ", arrêt automatique"
+                # L'arrêt devient le dernier état connu du moteur, même si le lot
+                # contenait des lectures postérieures au déclenchement
+                stopped_at = max(event.at, motor.last_update or event.at) if motor else event.at
+                stops[event.motor_id] = max(stopped_at, stops.get(event.motor_id, stopped_at))
+            notifications.append({
+                "motor_id": event.motor_id,
+                "user_id": None,
+                "type": event.type,
+                "title": title,
+                "message": message,
+                "is_read": False,
+                "created_at": event.at,
+            })
+
+        changes = notification_store.record(connection, notifications)
+        queued = []
+        if stops:
+            # Comme la commande STOP de /iot/motor/command : état du moteur et commande
+            # STOP mise en file pour son ESP32, dans la même transaction
+            queued = command_queue.record_stops(connection, stops)
+            table = Motor.__table__
+            connection.execute(
+                update(table)
+                .where(and_(
+                    table.c.id == bindparam("motor_id"),
+                    or_(table.c.last_update == None, table.c.last_update <= bindparam("stopped_at"))
+                ))
+                .values(is_running=False, last_speed_rpm=0.0, last_update=bindparam("stopped_at")),
+                [{"motor_id": motor_id, "stopped_at": at} for motor_id, at in stops.items()]
+            )
+        connection.commit()
+        notification_store.committed(changes)
+        command_queue.committed(queued)
+        for motor_id, at in stops.items():
+            motor_state_store.update_live(motor_id, is_running=False, last_speed_rpm=0.0, last_update=at)
+
+    def motor_status(self) -> Dict[int, Tuple[str, List[str]]]:
+        """
+        État de sécurité des moteurs surveillés : "OK", "WARNING" (dépassement en cours,
+        délai non écoulé) ou "ALARM" (alerte émise), et les règles en dépassement
+        """
+        rules = self._rules
+        # Copie atomique (clés et valeurs sans code Python) des fenêtres du writer
+        windows = self._windows.copy()
+        status: Dict[int, Tuple[str, List[str]]] = {motor_id: ("OK", []) for motor_id in rules}
+        for (motor_id, rule), window in sorted(windows.items()):
+            if motor_id not in status:
+                continue
+            level, violations = status[motor_id]
+            level = "ALARM" if window.fired or level == "ALARM" else "WARNING"
+            status[motor_id] = (level, violations + [rule])
+        return status
+
+    def stats(self) -> dict:
+        return {
+            "monitored_motors": len(self._rules),
+            "open_violations": len(self._windows),
+            "evaluated": self.evaluated,
+            "triggered": self.triggered,
+        }
+
+
+safety_engine = SafetyEngine()
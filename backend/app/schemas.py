@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -11,6 +11,12 @@ class UserCreate(BaseModel):
     role: str  # "ADMIN" ou "TECHNICIAN"
 
 
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = None
+    role: Optional[str] = None  # "ADMIN" ou "TECHNICIAN"
+    is_active: Optional[bool] = None
+
+
 class UserResponse(BaseModel):
     id: int
     full_name: str
@@ -31,6 +37,12 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    expires_in: Optional[int] = None  # Durée de validité du token d'accès (secondes)
+    refresh_token: Optional[str] = None
+
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
 
 
 # Motor schemas
@@ -78,6 +90,28 @@ class TelemetryCreate(BaseModel):
     is_running: bool
     battery_percent: Optional[float] = None
 
+    class Config:
+        # NaN / Infinity (acceptés par le JSON de Python) : 422 plutôt qu'un échec à l'ingestion
+        allow_inf_nan = False
+
+
+class TelemetryReading(BaseModel):
+    temperature: float
+    vibration: float
+    current: float
+    speed_rpm: float
+    is_running: bool
+    battery_percent: Optional[float] = None
+    timestamp: Optional[datetime] = None  # Horodatage de la mesure côté ESP32 (UTC)
+
+    class Config:
+        allow_inf_nan = False
+
+
+class TelemetryBatchCreate(BaseModel):
+    motor_id: int
+    readings: List[TelemetryReading] = Field(..., min_length=1, max_length=1000)
+
 
 class TelemetryResponse(BaseModel):
     id: int
@@ -94,6 +128,48 @@ class TelemetryResponse(BaseModel):
         from_attributes = True
 
 
+
+class TelemetryAggregateResponse(BaseModel):
+    bucket_start: datetime
+    count: int
+    temperature_min: float
+    temperature_max: float
+    temperature_mean: float
+    vibration_min: float
+    vibration_max: float
+    vibration_mean: float
+    current_min: float
+    current_max: float
+    current_mean: float
+    speed_rpm_min: float
+    speed_rpm_max: float
+    speed_rpm_mean: float
+
+
+class HistogramBin(BaseModel):
+    lower: float  # Inclus
+    upper: float  # Exclu
+    count: int
+
+
+class TelemetryChannelStats(BaseModel):
+    min: float
+    max: float
+    mean: float
+    stddev: float
+    percentiles: Dict[str, float]  # "p5", "p25", "p50", "p75", "p95", "p99"
+    histogram: List[HistogramBin]
+
+
+class TelemetryStatsResponse(BaseModel):
+    motor_id: int
+    start: datetime  # Fenêtre étendue aux heures entières
+    end: datetime
+    count: int
+    running_seconds: float
+    stopped_seconds: float
+    channels: Dict[str, TelemetryChannelStats]  # Par mesure (vide sans lecture)
+
 # Maintenance schemas
 class MaintenanceTaskCreate(BaseModel):
     motor_id: int
@@ -176,6 +252,32 @@ class SafetyConfigResponse(BaseModel):
         from_attributes = True
 
 
+# Notification schemas
+class NotificationResponse(BaseModel):
+    id: int
+    motor_id: Optional[int]
+    user_id: Optional[int]
+    type: str
+    title: str
+    message: str
+    is_read: bool
+    occurrences: int
+    created_at: datetime
+    last_occurred_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class NotificationMarkRead(BaseModel):
+    ids: Optional[List[int]] = None  # None : toutes les notifications non lues
+    motor_id: Optional[int] = None
+
+
+class NotificationUnreadCount(BaseModel):
+    unread: int
+
+
 # IoT schemas (pour communication ESP32)
 class MotorStatusResponse(BaseModel):
     esp32_uid: str
@@ -194,6 +296,22 @@ class MotorCommandRequest(BaseModel):
     target_speed_rpm: Optional[float] = None
 
 
+class DeviceCommandResponse(BaseModel):
+    id: int
+    device_id: int
+    motor_id: int
+    seq: int
+    action: str
+    target_speed_rpm: Optional[float]
+    created_at: datetime
+    expires_at: datetime
+    delivered_at: Optional[datetime]
+    acked_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
 # ESP32 Device schemas
 class ESP32DeviceCreate(BaseModel):
     esp32_uid: str
@@ -212,3 +330,29 @@ class ESP32DeviceResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+# Fleet schemas (vue d'ensemble du parc)
+class FleetMotorOverview(BaseModel):
+    id: int
+    name: str
+    code: str
+    location: Optional[str]
+    esp32_uid: Optional[str]
+    is_running: bool
+    last_temperature: Optional[float]
+    last_vibration: Optional[float]
+    last_current: Optional[float]
+    last_speed_rpm: Optional[float]
+    last_battery_percent: Optional[float]
+    last_update: Optional[datetime]
+    last_seen: Optional[datetime]  # Dernier contact de l'ESP32 ou dernière lecture
+    online: bool
+    safety_status: str  # "UNMONITORED", "OK", "WARNING" ou "ALARM"
+    safety_violations: List[str]  # Règles en dépassement (high_temperature, ...)
+    open_tasks: int  # Tâches de maintenance PLANNED ou IN_PROGRESS
+
+
+class FleetOverviewResponse(BaseModel):
+    online_timeout_seconds: float
+    motors: List[FleetMotorOverview]
@@ -0,0 +1,171 @@
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, union_all
+from sqlmodel import Session, select
+
+from app.models import TelemetryHistogram, TelemetryRollup
+from app.rollups import HISTOGRAM_BIN_WIDTHS, METRICS, bucket_start
+
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+
+_rollups = TelemetryRollup.__table__
+_histograms = TelemetryHistogram.__table__
+
+# Intervalle de la fenêtre : (résolution, début inclus, fin exclue)
+WindowPart = Tuple[str, datetime, datetime]
+
+
+def align_window(start: datetime, end: datetime) -> Tuple[datetime, datetime]:
+    """Fenêtre étendue aux heures entières qui la contiennent (granularité des histogrammes)"""
+    aligned_end = bucket_start(end, "1h")
+    if aligned_end < end:
+        aligned_end += timedelta(hours=1)
+    return bucket_start(start, "1h"), aligned_end
+
+
+def window_parts(start: datetime, end: datetime) -> List[WindowPart]:
+    """
+    Découpe une fenêtre alignée sur l'heure : jours entiers en "1d", heures restantes
+    en "1h" (au plus 23 de chaque côté). Sur 30 jours, on lit 30 intervalles
+    journaliers au lieu de 720 horaires.
+    """
+    first_day = bucket_start(start, "1d")
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = bucket_start(end, "1d")
+    if first_day >= last_day:
+        return [("1h", start, end)]
+    parts = [("1h", start, first_day), ("1d", first_day, last_day), ("1h", last_day, end)]
+    return [part for part in parts if part[1] < part[2]]
+
+
+def _window_rows(table, motor_id: int, parts: List[WindowPart], *columns):
+    """
+    Lignes d'un moteur dans les intervalles de la fenêtre : une sous-requête par
+    intervalle réunies par UNION ALL (un OR empêcherait SQLite de parcourir la clé
+    primaire par plage)
+    """
+    selects = [
+        select(*columns)
+        .where(table.c.motor_id == motor_id)
+        .where(table.c.resolution == resolution)
+        .where(table.c.bucket_start >= low)
+        .where(table.c.bucket_start < high)
+        for resolution, low, high in parts
+    ]
+    return (union_all(*selects) if len(selects) > 1 else selects[0]).subquery()
+
+
+def percentile_values(bins: List[Tuple[int, int]], width: float, low: float, high: float) -> Dict[str, float]:
+    """
+    Centiles interpolés dans des classes de largeur fixe triées (bin, effectif), bornés
+    par le minimum et le maximum exacts : l'erreur est inférieure à une largeur de classe
+    """
+    count = sum(bin_count for _, bin_count in bins)
+    values = {}
+    cumulative, index = 0, 0
+    for percentile in PERCENTILES:
+        rank = percentile / 100 * count
+        while index < len(bins) - 1 and cumulative + bins[index][1] < rank:
+            cumulative += bins[index][1]
+            index += 1
+        bin_, bin_count = bins[index]
+        value = (bin_ + (rank - cumulative) / bin_count) * width
+        values[f"p{percentile}"] = min(max(value, low), high)
+    return values
+
+
+def merge_bins(bins: List[Tuple[int, int]], width: float, max_bins: int) -> List[dict]:
+    """
+    Regroupe des classes fixes consécutives en au plus `max_bins` classes de même largeur
+    (un multiple de la largeur fixe) : les effectifs restent exacts
+    """
+    first, last = bins[0][0], bins[-1][0]
+    step = math.ceil((last - first + 1) / max_bins)
+    counts = [0] * ((last - first) // step + 1)
+    for bin_, count in bins:
+        counts[(bin_ - first) // step] += count
+    return [
+        {"lower": round((first + i * step) * width, 6), "upper": round((first + (i + 1) * step) * width, 6), "count": count}
+        for i, count in enumerate(counts)
+    ]
+
+
+def fetch_telemetry_stats(
+    session: Session,
+    motor_id: int,
+    start: datetime,
+    end: datetime,
+    histogram_bins: int = 20
+) -> dict:
+    """
+    Statistiques de la télémétrie d'un moteur sur [start, end), étendue aux heures entières.
+    Tout est calculé par SQLite sur les agrégats et histogrammes tenus à jour à l'ingestion
+    (app/rollups.py), sans relire les lectures : trois requêtes, dont le coût dépend du
+    nombre d'intervalles de la fenêtre et non du nombre de lectures.
+    - moyenne et écart-type à partir des sommes et sommes des carrés ;
+    - temps en marche / à l'arrêt : chaque minute ayant des lectures compte 60 s, répartis
+      selon la part de lectures en marche (agrégats à la minute, soumis à la rétention) ;
+    - centiles et histogrammes à partir des classes de largeur fixe (HISTOGRAM_BIN_WIDTHS).
+    """
+    start, end = align_window(start, end)
+    parts = window_parts(start, end)
+    result = {
+        "motor_id": motor_id, "start": start, "end": end, "count": 0,
+        "running_seconds": 0.0, "stopped_seconds": 0.0, "channels": {},
+    }
+
+    columns = ["count"]
+    for metric in METRICS:
+        columns += [f"{metric}_sum", f"{metric}_sumsq", f"{metric}_min", f"{metric}_max"]
+    rollups = _window_rows(_rollups, motor_id, parts, *(_rollups.c[column] for column in columns))
+    row = session.exec(select(*(
+        (func.min if column.endswith("_min") else func.max if column.endswith("_max") else func.sum)(rollups.c[column])
+        for column in columns
+    ))).one()
+    count = row[0] or 0
+    if count == 0:
+        return result
+    result["count"] = count
+
+    running_share = _rollups.c.running_count * 60.0 / _rollups.c.count
+    running, stopped = session.exec(
+        select(func.sum(running_share), func.sum(60.0 - running_share))
+        .where(_rollups.c.motor_id == motor_id)
+        .where(_rollups.c.resolution == "1m")
+        .where(_rollups.c.bucket_start >= start)
+        .where(_rollups.c.bucket_start < end)
+    ).one()
+    result["running_seconds"] = running or 0.0
+    result["stopped_seconds"] = stopped or 0.0
+
+    bins: Dict[str, List[Tuple[int, int]]] = {metric: [] for metric in METRICS}
+    histograms = _window_rows(
+        _histograms, motor_id, parts, _histograms.c.metric, _histograms.c.bin, _histograms.c.count
+    )
+    for metric, bin_, bin_count in session.exec(
+        select(histograms.c.metric, histograms.c.bin, func.sum(histograms.c.count))
+        .group_by(histograms.c.metric, histograms.c.bin)
+        .order_by(histograms.c.metric, histograms.c.bin)
+    ):
+        bins[metric].append((bin_, bin_count))
+
+    for index, metric in enumerate(METRICS):
+        total, squares, low, high = row[1 + 4 * index: 5 + 4 * index]
+        mean = total / count
+        width = HISTOGRAM_BIN_WIDTHS[metric]
+        channel = {
+            "min": low,
+            "max": high,
+            "mean": mean,
+            "stddev": math.sqrt(max(squares / count - mean * mean, 0.0)),
+            "percentiles": {},
+            "histogram": [],
+        }
+        if bins[metric]:
+            channel["percentiles"] = percentile_values(bins[metric], width, low, high)
+            channel["histogram"] = merge_bins(bins[metric], width, histogram_bins)
+        result["channels"][metric] = channel
+    return result
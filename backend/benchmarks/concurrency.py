@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concurrence de l'API MotorGuard (serveur lancé séparément)
+Usage: python benchmarks/concurrency.py [--url http://localhost:8000] [--devices 200] [--readers 50] [--duration 20]
+
+Simule des ESP32 qui envoient leur télémétrie en continu (POST /iot/telemetry/from-esp32)
+et des tableaux de bord qui lisent l'historique et les agrégats, tous en parallèle.
+Affiche le débit et les latences (p50/p99/max) par type de requête.
+Pour comparer deux versions, lancer le même benchmark contre chacune avec un seul worker
+uvicorn (ex. `uvicorn app.main:app --port 8000 --log-level warning`), le benchmark tournant
+sur d'autres cœurs que le serveur (sinon il mesure surtout son propre coût CPU).
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def setup(client, devices):
+    """Crée les moteurs et ESP32 du benchmark ; retourne le token admin et les clés API"""
+    response = await client.post(
+        "/auth/login", data={"username": "admin@motorguard.local", "password": "admin123"}
+    )
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    run = uuid.uuid4().hex[:6]
+    fleet = []
+    for i in range(devices):
+        uid = f"BENCH_{run}_{i}"
+        motor = await client.post("/motors/", headers=headers, json={
+            "name": f"Bench {i}", "code": f"BENCH-{run}-{i}", "esp32_uid": uid
+        })
+        motor.raise_for_status()
+        device = await client.post("/esp32-devices/", headers=headers, json={
+            "esp32_uid": uid, "motor_id": motor.json()["id"]
+        })
+        device.raise_for_status()
+        fleet.append((motor.json()["id"], {"X-API-Key": device.json()["api_key"]}))
+    return headers, fleet
+
+
+async def device_loop(client, motor_id, api_headers, deadline, results):
+    reading = 0
+    while time.perf_counter() < deadline:
+        reading += 1
+        payload = {
+            "motor_id": motor_id, "temperature": 40 + reading % 10, "vibration": 1.5,
+            "current": 10.0, "speed_rpm": 1450, "is_running": True, "battery_percent": 80
+        }
+        await timed(results, "POST telemetry", client.post(
+            "/iot/telemetry/from-esp32", headers=api_headers, json=payload
+        ))
+
+
+async def reader_loop(client, fleet, headers, deadline, results):
+    i = 0
+    while time.perf_counter() < deadline:
+        motor_id = fleet[i % len(fleet)][0]
+        i += 1
+        await timed(results, "GET history", client.get(
+            f"/telemetry/motor/{motor_id}", headers=headers, params={"limit": 50}
+        ))
+        await timed(results, "GET safety config", client.get(
+            f"/safety/configs/motor/{motor_id}", headers=headers
+        ))
+
+
+async def timed(results, name, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+        ok = response.status_code < 500
+    except httpx.HTTPError:
+        ok = False
+    results[name].append((time.perf_counter() - start, ok))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--devices", type=int, default=200, help="ESP32 simulés en parallèle")
+    parser.add_argument("--readers", type=int, default=50, help="Clients de lecture en parallèle")
+    parser.add_argument("--duration", type=float, default=20, help="Durée de la mesure (s)")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.devices + args.readers + 10)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        headers, fleet = await setup(client, args.devices)
+        results = defaultdict(list)
+        deadline = time.perf_counter() + args.duration
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(device_loop(client, motor_id, api_headers, deadline, results) for motor_id, api_headers in fleet),
+            *(reader_loop(client, fleet, headers, deadline, results) for _ in range(args.readers)),
+        )
+        elapsed = time.perf_counter() - started
+
+    print(f"{args.devices} ESP32, {args.readers} lecteurs, {elapsed:.1f} s")
+    print(f"{'requête':<20}{'total':>8}{'req/s':>9}{'erreurs':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, samples in sorted(results.items()):
+        latencies = [latency * 1000 for latency, _ in samples]
+        errors = sum(1 for _, ok in samples if not ok)
+        print(
+            f"{name:<20}{len(samples):>8}{len(samples) / elapsed:>9.0f}{errors:>9}"
+            f"{statistics.median(latencies):>9.1f}{percentile(latencies, 0.99):>9.1f}{max(latencies):>9.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Générateur de charge MotorGuard à l'échelle d'un parc (serveur lancé séparément)
+Usage: python benchmarks/loadgen.py [--url http://localhost:8000] [--motors 100] [--rate 1]
+       [--dashboards 20] [--technicians 20] [--duration 60] [--output loadgen_results.json]
+
+Crée le parc par l'API (moteurs, ESP32, techniciens), puis fait tourner en même temps :
+- l'ingestion : chaque ESP32 envoie `--rate` lectures par seconde (par lots de `--batch`),
+  à cadence fixe ; un envoi qui ne peut pas partir à temps (réponse précédente trop lente)
+  est compté comme manqué, comme sur un ESP32 qui n'a qu'une connexion ;
+- les tableaux de bord : `--dashboards` clients qui enchaînent des lectures tirées selon
+  `--mix` (poids par type de requête), avec `--think` secondes entre deux requêtes ;
+- les connexions : toutes les `--login-every` secondes, tous les techniciens se
+  reconnectent en même temps (changement d'équipe).
+Le résultat (débit, latences p50/p90/p99/max, taux d'erreur par requête, attente du verrou
+d'écriture SQLite côté serveur) est écrit en JSON dans `--output` et résumé à l'écran.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import httpx
+
+PASSWORD = "loadgen-password"
+
+# Lectures des tableaux de bord : nom -> chemin ({motor_id} et {code} : moteur tiré au hasard)
+DASHBOARD_REQUESTS = {
+    "history": "/telemetry/motor/{motor_id}?limit=50",
+    "latest": "/telemetry/motor/{motor_id}/latest",
+    "aggregate": "/telemetry/motor/{motor_id}/aggregate?resolution=1m&hours=1",
+    "motors": "/motors/",
+    "status": "/iot/motor/status?motor_code={code}",
+    "notifications": "/notifications/?limit=20",
+    "unread": "/notifications/unread-count",
+}
+DEFAULT_MIX = "history=4,latest=3,aggregate=2,motors=1,status=1,notifications=1,unread=2"
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in DASHBOARD_REQUESTS:
+            raise argparse.ArgumentTypeError(f"requête inconnue : {name} (parmi {', '.join(DASHBOARD_REQUESTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Recorder:
+    """Latences et statuts par type de requête"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    async def timed(self, name, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            status = response.status_code
+        except httpx.HTTPError as exc:
+            response, status = None, type(exc).__name__
+        self.samples[name].append(time.perf_counter() - start)
+        self.statuses[name][status] += 1
+        return response
+
+    def summary(self, elapsed):
+        results = {}
+        for name, samples in sorted(self.samples.items()):
+            latencies = sorted(latency * 1000 for latency in samples)
+            statuses = self.statuses[name]
+            errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+            results[name] = {
+                "requests": len(samples),
+                "throughput": round(len(samples) / elapsed, 2),
+                "errors": errors,
+                "error_rate": round(errors / len(samples), 4),
+                "statuses": {str(status): count for status, count in statuses.items()},
+                "latency_ms": {
+                    "p50": round(statistics.median(latencies), 2),
+                    "p90": round(percentile(latencies, 0.90), 2),
+                    "p99": round(percentile(latencies, 0.99), 2),
+                    "max": round(latencies[-1], 2),
+                },
+            }
+        return results
+
+
+async def provision(client, args):
+    """Crée moteurs, ESP32 et techniciens ; retourne les en-têtes admin, le parc et les emails"""
+    response = await client.post("/auth/login", data={"username": args.admin_email, "password": args.admin_password})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    run = uuid.uuid4().hex[:6]
+    semaphore = asyncio.Semaphore(20)
+
+    async def create_motor(i):
+        uid = f"LOAD_{run}_{i}"
+        code = f"LOAD-{run}-{i}"
+        async with semaphore:
+            motor = await client.post("/motors/", headers=headers, json={
+                "name": f"Charge {i}", "code": code, "esp32_uid": uid
+            })
+            motor.raise_for_status()
+            device = await client.post("/esp32-devices/", headers=headers, json={
+                "esp32_uid": uid, "motor_id": motor.json()["id"]
+            })
+            device.raise_for_status()
+        return {"id": motor.json()["id"], "code": code, "headers": {"X-API-Key": device.json()["api_key"]}}
+
+    async def create_technician(i):
+        email = f"loadgen-{run}-{i}@example.com"
+        async with semaphore:
+            response = await client.post("/users/", headers=headers, json={
+                "full_name": f"Technicien {i}", "email": email, "password": PASSWORD, "role": "TECHNICIAN"
+            })
+            response.raise_for_status()
+        return email
+
+    fleet = await asyncio.gather(*(create_motor(i) for i in range(args.motors)))
+    technicians = await asyncio.gather(*(create_technician(i) for i in range(args.technicians)))
+    return headers, fleet, technicians
+
+
+async def device_loop(client, recorder, motor, args, deadline, counters):
+    """Un ESP32 : args.rate lectures/s, envoyées par lots de args.batch à cadence fixe"""
+    interval = args.batch / args.rate
+    next_at = time.perf_counter() + random.uniform(0, interval)
+    while next_at < deadline:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        readings = [
+            {
+                "temperature": 45 + random.gauss(0, 1), "vibration": 1.5 + random.gauss(0, 0.1),
+                "current": 10.0, "speed_rpm": 1450, "is_running": True, "battery_percent": 80,
+            }
+            for _ in range(args.batch)
+        ]
+        if args.batch == 1:
+            request = client.post("/iot/telemetry/from-esp32", headers=motor["headers"],
+                                  json={"motor_id": motor["id"], **readings[0]})
+        else:
+            request = client.post("/iot/telemetry/from-esp32/batch", headers=motor["headers"],
+                                  json={"motor_id": motor["id"], "readings": readings})
+        response = await recorder.timed("ingest", request)
+        if response is not None and response.status_code < 400:
+            counters["readings"] += args.batch
+        next_at += interval
+        late = time.perf_counter() - next_at
+        if late > interval:
+            missed = int(late / interval)
+            counters["missed_sends"] += missed
+            next_at += missed * interval
+
+
+async def dashboard_loop(client, recorder, headers, fleet, args, deadline):
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    await asyncio.sleep(random.uniform(0, args.think))
+    while time.perf_counter() < deadline:
+        name = random.choices(names, weights)[0]
+        motor = random.choice(fleet)
+        path = DASHBOARD_REQUESTS[name].format(motor_id=motor["id"], code=motor["code"])
+        await recorder.timed(f"dashboard:{name}", client.get(path, headers=headers))
+        await asyncio.sleep(random.uniform(0.5, 1.5) * args.think)
+
+
+async def login_bursts(client, recorder, technicians, args, deadline):
+    """Toutes les args.login_every secondes, tous les techniciens se reconnectent ensemble"""
+
+    async def login(email):
+        response = await recorder.timed("login", client.post(
+            "/auth/login", data={"username": email, "password": PASSWORD}
+        ))
+        if response is not None and response.status_code == 200 and response.json().get("refresh_token"):
+            await recorder.timed("refresh", client.post(
+                "/auth/refresh", json={"refresh_token": response.json()["refresh_token"]}
+            ))
+
+    next_at = time.perf_counter() + min(args.login_every, args.duration / 2)
+    while technicians and next_at < deadline:
+        await asyncio.sleep(max(0, next_at - time.perf_counter()))
+        await asyncio.gather(*(login(email) for email in technicians))
+        next_at += args.login_every
+
+
+async def server_stats(client, headers):
+    response = await client.get("/health/database", headers=headers)
+    return response.json() if response.status_code == 200 else {}
+
+
+def lock_wait_delta(before, after):
+    before = before.get("write_lock", {})
+    after = after.get("write_lock", {})
+    if not after:
+        return None
+    transactions = after["transactions"] - before.get("transactions", 0)
+    wait = after["wait_seconds"] - before.get("wait_seconds", 0)
+    return {
+        "transactions": transactions,
+        "wait_seconds": round(wait, 6),
+        "mean_wait_ms": round(wait * 1000 / transactions, 3) if transactions else 0.0,
+        "max_wait_ms_since_start": round(after["max_wait_seconds"] * 1000, 3),
+        "locked_errors": after["locked_errors"] - before.get("locked_errors", 0),
+    }
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.motors + args.dashboards + args.technicians + 10)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        print(f"Création du parc : {args.motors} moteurs et ESP32, {args.technicians} techniciens...")
+        headers, fleet, technicians = await provision(client, args)
+
+        recorder = Recorder()
+        counters = Counter()
+        before = await server_stats(client, headers)
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(
+            *(device_loop(client, recorder, motor, args, deadline, counters) for motor in fleet),
+            *(dashboard_loop(client, recorder, headers, fleet, args, deadline) for _ in range(args.dashboards)),
+            login_bursts(client, recorder, technicians, args, deadline),
+        )
+        elapsed = time.perf_counter() - started
+        after = await server_stats(client, headers)
+
+    return {
+        "started_at": started_at.isoformat() + "Z",
+        "config": {key: value for key, value in vars(args).items() if key not in ("admin_password", "output")},
+        "elapsed_seconds": round(elapsed, 2),
+        "ingest": {
+            "target_readings_per_second": args.motors * args.rate,
+            "readings_per_second": round(counters["readings"] / elapsed, 2),
+            "missed_sends": counters["missed_sends"],
+        },
+        "requests": recorder.summary(elapsed),
+        "server": {
+            "write_lock": lock_wait_delta(before, after),
+            "ingest_pending_rows": after.get("ingest_pending_rows"),
+        },
+    }
+
+
+def print_summary(results):
+    ingest = results["ingest"]
+    print(f"\n{results['elapsed_seconds']:.1f} s, ingestion {ingest['readings_per_second']:.0f} lectures/s "
+          f"(cible {ingest['target_readings_per_second']:.0f}, {ingest['missed_sends']} envois manqués)")
+    print(f"{'requête':<26}{'total':>8}{'req/s':>9}{'erreurs':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for name, stats in results["requests"].items():
+        latency = stats["latency_ms"]
+        print(f"{name:<26}{stats['requests']:>8}{stats['throughput']:>9.1f}{stats['errors']:>9}"
+              f"{latency['p50']:>9.1f}{latency['p90']:>9.1f}{latency['p99']:>9.1f}{latency['max']:>9.1f}")
+    lock = results["server"]["write_lock"]
+    if lock:
+        print(f"verrou d'écriture SQLite : {lock['transactions']} transactions, attente moyenne "
+              f"{lock['mean_wait_ms']:.2f} ms, max {lock['max_wait_ms_since_start']:.1f} ms depuis le démarrage, "
+              f"{lock['locked_errors']} erreurs \"database is locked\"")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--admin-email", default="admin@motorguard.local")
+    parser.add_argument("--admin-password", default="admin123")
+    parser.add_argument("--motors", type=int, default=100, help="Moteurs (un ESP32 chacun)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Lectures par seconde et par ESP32")
+    parser.add_argument("--batch", type=int, default=1, help="Lectures par requête (> 1 : endpoint batch)")
+    parser.add_argument("--dashboards", type=int, default=20, help="Tableaux de bord en parallèle")
+    parser.add_argument("--think", type=float, default=1.0, help="Pause moyenne entre deux lectures d'un tableau de bord (s)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f"Poids des lectures (défaut : {DEFAULT_MIX})")
+    parser.add_argument("--technicians", type=int, default=20, help="Techniciens qui se reconnectent ensemble")
+    parser.add_argument("--login-every", type=float, default=30, help="Intervalle entre deux rafales de connexions (s)")
+    parser.add_argument("--duration", type=float, default=60, help="Durée de la mesure (s)")
+    parser.add_argument("--timeout", type=float, default=30, help="Délai max d'une requête (s)")
+    parser.add_argument("--output", default="loadgen_results.json", help="Fichier de résultats JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print_summary(results)
+    print(f"\nRésultats : {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark des connexions pendant l'ingestion (serveur lancé séparément)
+Usage: python benchmarks/login.py [--url http://localhost:8000] [--users 50] [--devices 50] [--duration 10]
+
+Simule un changement d'équipe : des ESP32 envoient leur télémétrie en continu pendant
+que tous les techniciens se reconnectent en même temps, en boucle. Mesure la latence
+des connexions (POST /auth/login, bcrypt), celle des rafraîchissements (POST /auth/refresh)
+et l'effet des connexions sur la télémétrie, comparée à une phase sans connexion.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+from concurrency import percentile, setup
+
+PASSWORD = "bench-password"
+
+
+async def create_users(client, headers, count):
+    run = uuid.uuid4().hex[:6]
+    emails = []
+    for i in range(count):
+        email = f"bench-{run}-{i}@example.com"
+        response = await client.post("/users/", headers=headers, json={
+            "full_name": f"Bench {i}", "email": email, "password": PASSWORD, "role": "TECHNICIAN"
+        })
+        response.raise_for_status()
+        emails.append(email)
+    return emails
+
+
+async def device_loop(client, motor_id, api_headers, deadline, samples):
+    while time.perf_counter() < deadline:
+        await timed(samples, client.post("/iot/telemetry/from-esp32", headers=api_headers, json={
+            "motor_id": motor_id, "temperature": 45, "vibration": 1.5,
+            "current": 10.0, "speed_rpm": 1450, "is_running": True, "battery_percent": 80
+        }))
+
+
+async def user_loop(client, email, deadline, logins, refreshes):
+    while time.perf_counter() < deadline:
+        response = await timed(logins, client.post(
+            "/auth/login", data={"username": email, "password": PASSWORD}
+        ))
+        if response is not None and response.status_code == 200:
+            await timed(refreshes, client.post(
+                "/auth/refresh", json={"refresh_token": response.json().get("refresh_token")}
+            ))
+
+
+async def timed(samples, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    samples.append((time.perf_counter() - start, ok))
+    return response
+
+
+def report(name, samples, elapsed):
+    if not samples:
+        print(f"{name:<28}{'-':>8}")
+        return
+    latencies = [latency * 1000 for latency, _ in samples]
+    errors = sum(1 for _, ok in samples if not ok)
+    print(
+        f"{name:<28}{len(samples):>8}{len(samples) / elapsed:>9.1f}{errors:>9}"
+        f"{statistics.median(latencies):>9.1f}{percentile(latencies, 0.99):>9.1f}{max(latencies):>9.1f}"
+    )
+
+
+async def phase(client, fleet, emails, duration):
+    """Retourne les mesures et les durées réelles de l'ingestion et des connexions"""
+    telemetry, logins, refreshes = [], [], []
+    deadline = time.perf_counter() + duration
+
+    async def timed(coroutines):
+        started = time.perf_counter()
+        await asyncio.gather(*coroutines)
+        return time.perf_counter() - started
+
+    # Les connexions en cours à l'échéance se terminent après l'ingestion
+    telemetry_elapsed, login_elapsed = await asyncio.gather(
+        timed(device_loop(client, motor_id, api_headers, deadline, telemetry) for motor_id, api_headers in fleet),
+        timed(user_loop(client, email, deadline, logins, refreshes) for email in emails),
+    )
+    return telemetry, logins, refreshes, telemetry_elapsed, login_elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=50, help="Techniciens qui se reconnectent en parallèle")
+    parser.add_argument("--devices", type=int, default=50, help="ESP32 simulés en parallèle")
+    parser.add_argument("--duration", type=float, default=10, help="Durée de chaque phase (s)")
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.devices + args.users + 10)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120) as client:
+        headers, fleet = await setup(client, args.devices)
+        emails = await create_users(client, headers, args.users)
+
+        quiet_telemetry, _, _, quiet_elapsed, _ = await phase(client, fleet, [], args.duration)
+        telemetry, logins, refreshes, telemetry_elapsed, login_elapsed = await phase(
+            client, fleet, emails, args.duration
+        )
+
+    print(f"{args.devices} ESP32, {args.users} techniciens, {args.duration:.0f} s par phase")
+    print(f"{'requête':<28}{'total':>8}{'req/s':>9}{'erreurs':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    report("telemetry (sans connexion)", quiet_telemetry, quiet_elapsed)
+    report("telemetry (connexions)", telemetry, telemetry_elapsed)
+    report("POST /auth/login", logins, login_elapsed)
+    report("POST /auth/refresh", refreshes, login_elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark du décodage de la télémétrie des ESP32 : JSON contre format binaire compact
+Usage: python benchmarks/packed_ingest.py [--sizes 1,10,100,1000] [--runs 5]
+
+Pour chaque taille d'envoi, mesure le coût par lecture de ce que fait le serveur avant le
+buffer d'ingestion, sans réseau ni base :
+- JSON : json.loads du corps, validation Pydantic (TelemetryCreate pour une lecture,
+  TelemetryBatchCreate au-delà, comme FastAPI) puis build_telemetry_rows ;
+- binaire : decode_packed_telemetry (app/packed.py), qui produit directement les lignes.
+Affiche aussi la taille du corps par lecture.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ingest import build_telemetry_rows  # noqa: E402
+from app.packed import decode_packed_telemetry, encode_packed_telemetry  # noqa: E402
+from app.schemas import TelemetryBatchCreate, TelemetryCreate  # noqa: E402
+
+MOTOR_ID = 1
+
+
+def make_readings(count):
+    """Lectures réalistes (valeurs à 2 décimales comme un ESP32) ; horodatées dans un lot"""
+    now = datetime.utcnow().replace(microsecond=0)
+    return [
+        {
+            "temperature": round(random.gauss(55, 3), 2),
+            "vibration": round(random.random() * 3, 2),
+            "current": round(random.gauss(10, 0.5), 2),
+            "speed_rpm": round(random.gauss(1450, 5), 1),
+            "is_running": True,
+            "battery_percent": 87.0,
+            "timestamp": now - timedelta(seconds=count - i) if count > 1 else None,
+        }
+        for i in range(count)
+    ]
+
+
+def json_body(readings):
+    if len(readings) == 1:
+        reading = {key: value for key, value in readings[0].items() if key != "timestamp"}
+        return json.dumps({"motor_id": MOTOR_ID, **reading}).encode()
+    return json.dumps({"motor_id": MOTOR_ID, "readings": [
+        {**reading, "timestamp": reading["timestamp"].isoformat() + "Z"} for reading in readings
+    ]}).encode()
+
+
+def decode_json(body):
+    """Ce que font FastAPI et la route JSON avant enqueue_telemetry"""
+    data = json.loads(body)
+    if "readings" in data:
+        batch = TelemetryBatchCreate.model_validate(data)
+        return build_telemetry_rows(batch.motor_id, batch.readings)
+    reading = TelemetryCreate.model_validate(data)
+    return build_telemetry_rows(reading.motor_id, [reading])
+
+
+def decode_packed(body):
+    return decode_packed_telemetry(body)[1]
+
+
+def per_reading_us(function, body, count, runs):
+    """Médiane sur `runs` mesures d'au moins ~0,2 s, en microsecondes par lecture"""
+    repeats = max(1, 20_000 // count)
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            function(body)
+        durations.append((time.perf_counter() - started) / (repeats * count))
+    return statistics.median(durations) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1,10,100,1000", help="Lectures par envoi, séparées par des virgules")
+    parser.add_argument("--runs", type=int, default=5, help="Mesures par taille (médiane)")
+    args = parser.parse_args()
+
+    print(f"{'lectures':>9}{'JSON o/lect.':>14}{'binaire o/lect.':>17}{'JSON µs/lect.':>15}{'binaire µs/lect.':>18}{'gain':>7}")
+    for count in (int(size) for size in args.sizes.split(",")):
+        readings = make_readings(count)
+        text = json_body(readings)
+        packed = encode_packed_telemetry(MOTOR_ID, readings)
+        # Les deux décodages doivent produire les mêmes lignes (hors heure de réception)
+        json_rows, packed_rows = decode_json(text), decode_packed(packed)
+        assert [
+            {key: value for key, value in row.items() if count > 1 or key != "created_at"} for row in json_rows
+        ] == [
+            {key: value for key, value in row.items() if count > 1 or key != "created_at"} for row in packed_rows
+        ]
+
+        json_us = per_reading_us(decode_json, text, count, args.runs)
+        packed_us = per_reading_us(decode_packed, packed, count, args.runs)
+        print(
+            f"{count:>9}{len(text) / count:>14.0f}{len(packed) / count:>17.0f}"
+            f"{json_us:>15.2f}{packed_us:>18.2f}{json_us / packed_us:>6.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark du profil SQLite : lectures et écritures concurrentes
+Usage: python benchmarks/sqlite_profile.py [--readers 4] [--duration 10] [--batch 50]
+
+Compare, sur une base temporaire, l'ancien profil (journal DELETE, synchronous FULL)
+et le profil des paramètres (WAL, synchronous NORMAL, mmap, cache, voir app/database.py).
+Un thread écrit des lots de télémétrie (un commit par lot, comme le writer d'ingestion)
+pendant que des threads lecteurs lisent les 100 dernières lectures d'un moteur.
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine, insert, select
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.database import set_sqlite_pragmas, sqlite_pragmas  # noqa: E402
+from app.partitions import partition_table  # noqa: E402
+
+MOTORS = 200
+LEGACY_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000}
+
+
+def make_rows(count, start):
+    return [
+        {
+            "motor_id": random.randint(1, MOTORS),
+            "temperature": 40 + random.random() * 10,
+            "vibration": random.random() * 3,
+            "current": 10.0,
+            "speed_rpm": 1450.0,
+            "is_running": True,
+            "battery_percent": 80.0,
+            "created_at": start + timedelta(milliseconds=i),
+        }
+        for i in range(count)
+    ]
+
+
+def run_profile(name, pragmas, args):
+    directory = tempfile.mkdtemp()
+    url = f"sqlite:///{directory}/bench.db"
+    engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=args.readers + 2)
+    set_sqlite_pragmas(engine, pragmas)
+    table = partition_table("telemetry_bench")
+    table.create(engine)
+
+    # Historique initial
+    start = datetime(2026, 1, 1)
+    with engine.begin() as connection:
+        for i in range(args.preload // 10_000):
+            connection.execute(insert(table), make_rows(10_000, start))
+            start += timedelta(seconds=10)
+
+    stop = threading.Event()
+    written = [0, 0]  # lignes, commits
+    latencies = []
+
+    def writer():
+        nonlocal start
+        with engine.connect() as connection:
+            while not stop.is_set():
+                connection.execute(insert(table), make_rows(args.batch, start))
+                connection.commit()
+                start += timedelta(seconds=1)
+                written[0] += args.batch
+                written[1] += 1
+
+    def reader():
+        local = []
+        statement = (
+            select(table)
+            .where(table.c.motor_id == random.randint(1, MOTORS))
+            .order_by(table.c.created_at.desc())
+            .limit(100)
+        )
+        while not stop.is_set():
+            began = time.perf_counter()
+            with engine.connect() as connection:
+                connection.execute(statement).all()
+            local.append(time.perf_counter() - began)
+        latencies.extend(local)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    latencies = sorted(latency * 1000 for latency in latencies) or [float("nan")]
+    print(
+        f"{name:<12}{written[0] / args.duration:>12.0f}{written[1] / args.duration:>11.1f}"
+        f"{len(latencies) / args.duration:>11.0f}{statistics.median(latencies):>9.2f}"
+        f"{latencies[int(len(latencies) * 0.99)]:>9.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--readers", type=int, default=4, help="Threads lecteurs")
+    parser.add_argument("--duration", type=float, default=10, help="Durée par profil (s)")
+    parser.add_argument("--batch", type=int, default=50, help="Lectures par commit")
+    parser.add_argument("--preload", type=int, default=200_000, help="Lignes d'historique initial")
+    args = parser.parse_args()
+
+    print(f"{args.readers} lecteurs, lots de {args.batch}, {args.preload} lignes initiales, {args.duration:.0f} s par profil")
+    print(f"{'profil':<12}{'lignes/s':>12}{'commits/s':>11}{'lectures/s':>11}{'p50 ms':>9}{'p99 ms':>9}")
+    run_profile("ancien", LEGACY_PRAGMAS, args)
+    run_profile("paramètres", sqlite_pragmas(), args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
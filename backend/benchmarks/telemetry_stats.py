@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark des statistiques de télémétrie (sans serveur, base temporaire)
+Usage: python benchmarks/telemetry_stats.py [--motors 2] [--days 30] [--interval 10] [--runs 5]
+
+Remplit une base temporaire par le chemin d'ingestion (partitions, agrégats, histogrammes),
+puis compare pour un moteur, sur 1, 7 et `--days` jours :
+- les statistiques calculées par SQLite sur les agrégats (GET /telemetry/motor/{id}/stats) ;
+- le calcul côté client : lecture de toutes les lectures brutes de la fenêtre, puis
+  min/max/moyenne/écart-type/centiles en Python (sans le transfert réseau ni le JSON).
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+METRICS = ("temperature", "vibration", "current", "speed_rpm")
+
+
+def make_rows(motors, start, end, interval):
+    """Lectures de tous les moteurs toutes les `interval` secondes, par ordre chronologique"""
+    timestamp = start
+    while timestamp < end:
+        running = timestamp.hour % 6 != 0  # Une heure d'arrêt toutes les six heures
+        for motor_id in range(1, motors + 1):
+            yield {
+                "motor_id": motor_id,
+                "temperature": random.gauss(55 if running else 30, 3),
+                "vibration": random.random() * 3,
+                "current": random.gauss(10 if running else 0.2, 0.5),
+                "speed_rpm": random.gauss(1450, 5) if running else 0.0,
+                "is_running": running,
+                "battery_percent": 80.0,
+                "created_at": timestamp,
+            }
+        timestamp += timedelta(seconds=interval)
+
+
+def client_side_stats(rows):
+    """Ce que calculait l'application à partir des lectures brutes"""
+    result = {"count": len(rows)}
+    for metric in METRICS:
+        values = sorted(getattr(row, metric) for row in rows)
+        result[metric] = {
+            "min": values[0], "max": values[-1],
+            "mean": statistics.fmean(values), "stddev": statistics.pstdev(values),
+            "p50": values[len(values) // 2], "p95": values[int(len(values) * 0.95)],
+        }
+    return result
+
+
+def timed(function, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--motors", type=int, default=2, help="Moteurs (lectures entrelacées)")
+    parser.add_argument("--days", type=int, default=30, help="Jours d'historique")
+    parser.add_argument("--interval", type=float, default=10, help="Secondes entre deux lectures d'un moteur")
+    parser.add_argument("--batch", type=int, default=500, help="Lectures par commit à l'ingestion")
+    parser.add_argument("--runs", type=int, default=5, help="Mesures par fenêtre (médiane)")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="motorguard-stats-")
+    os.environ["MOTORGUARD_DATABASE_PATH"] = os.path.join(directory, "motorguard.db")
+
+    from sqlmodel import Session
+
+    from app.database import create_db_and_tables, engine
+    from app.ingest import write_telemetry_rows
+    from app.partitions import fetch_telemetry, init_telemetry_storage, telemetry_partitions
+    from app.telemetry_stats import fetch_telemetry_stats
+
+    try:
+        create_db_and_tables()
+        end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        start = end - timedelta(days=args.days)
+
+        started = time.perf_counter()
+        total = 0
+        with engine.connect() as connection:
+            init_telemetry_storage(connection)
+            batch = []
+            for row in make_rows(args.motors, start, end, args.interval):
+                batch.append(row)
+                if len(batch) == args.batch:
+                    telemetry_partitions.ensure(connection, (row["created_at"] for row in batch))
+                    with Session(connection) as session:
+                        write_telemetry_rows(session, batch)
+                        session.commit()
+                    total += len(batch)
+                    batch = []
+            if batch:
+                telemetry_partitions.ensure(connection, (row["created_at"] for row in batch))
+                with Session(connection) as session:
+                    write_telemetry_rows(session, batch)
+                    session.commit()
+                total += len(batch)
+        elapsed = time.perf_counter() - started
+        print(f"{total} lectures ingérées en {elapsed:.1f} s ({total / elapsed:.0f} lectures/s)")
+
+        print(f"{'fenêtre':<10}{'lectures':>10}{'agrégats ms':>13}{'brut ms':>10}")
+        for days in sorted({1, 7, args.days}):
+            window_start = end - timedelta(days=days)
+            with Session(engine) as session:
+                stats_ms, stats = timed(
+                    lambda: fetch_telemetry_stats(session, 1, window_start, end), args.runs
+                )
+                raw_ms, raw = timed(
+                    lambda: client_side_stats(fetch_telemetry(session, 1, start=window_start, end=end)),
+                    max(1, args.runs // 2)
+                )
+            assert stats["count"] == raw["count"]
+            print(f"{str(days) + ' j':<10}{stats['count']:>10}{stats_ms:>13.1f}{raw_ms:>10.0f}")
+
+        # Écart des centiles (classes de largeur fixe) au calcul exact, sur la dernière fenêtre
+        for metric in METRICS:
+            channel = stats["channels"][metric]
+            print(
+                f"  {metric:<12} p50 {channel['percentiles']['p50']:.2f} (exact {raw[metric]['p50']:.2f})"
+                f"  p95 {channel['percentiles']['p95']:.2f} (exact {raw[metric]['p95']:.2f})"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Vérification des budgets de requêtes SQL des routes (sans serveur, base temporaire)
+Usage: python check_query_budgets.py [--verbose]
+
+Appelle chaque route de l'API dans l'application chargée en mémoire, avec plusieurs
+moteurs, tâches et notifications en base pour que les boucles N+1 apparaissent, et
+enregistre les requêtes SQL de chaque appel (événements SQLAlchemy). Échoue (code 1)
+si un appel dépasse le budget déclaré par @query_budget sur sa route, exécute une même
+forme de requête plus de fois que permis, ou si une route n'a pas de budget.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+PASSWORD = "budget-password"
+
+
+def scenario(client):
+    """Appelle toutes les routes ; les caches d'authentification démarrent froids"""
+    from app.packed import PACKED_MEDIA_TYPE, encode_packed_telemetry
+
+    login = client.post("/auth/login", data={"username": "admin@motorguard.local", "password": "admin123"}).json()
+    admin = {"Authorization": f"Bearer {login['access_token']}"}
+    client.post("/auth/refresh", json={"refresh_token": login["refresh_token"]})
+
+    # Utilisateurs
+    technicians = []
+    for i in range(3):
+        user = client.post("/users/", headers=admin, json={
+            "full_name": f"Tech {i}", "email": f"tech{i}@example.com", "password": PASSWORD, "role": "TECHNICIAN"
+        }).json()
+        technicians.append(user)
+    client.get("/users/", headers=admin)
+    client.get(f"/users/{technicians[0]['id']}", headers=admin)
+    client.put(f"/users/{technicians[2]['id']}", headers=admin, json={"full_name": "Tech 2 bis"})
+    tech_login = client.post("/auth/login", data={"username": "tech0@example.com", "password": PASSWORD}).json()
+    tech = {"Authorization": f"Bearer {tech_login['access_token']}"}
+    client.post("/auth/login-json", json={"email": "tech1@example.com", "password": PASSWORD})
+    client.get("/users/me", headers=tech)
+
+    # Moteurs, ESP32 et seuils de sécurité
+    motors, devices = [], []
+    for i in range(3):
+        motor = client.post("/motors/", headers=admin, json={
+            "name": f"Moteur {i}", "code": f"M{i:03d}", "esp32_uid": f"ESP32_{i:03d}"
+        }).json()
+        device = client.post("/esp32-devices/", headers=admin, json={
+            "esp32_uid": f"ESP32_{i:03d}", "motor_id": motor["id"]
+        }).json()
+        client.post("/safety/configs", headers=admin, json={"motor_id": motor["id"], "max_temperature": 70})
+        motors.append(motor)
+        devices.append(device)
+    motor_id = motors[0]["id"]
+    client.get("/motors/", headers=tech)
+    client.get(f"/motors/{motor_id}", headers=tech)
+    client.put(f"/motors/{motor_id}", headers=admin, json={"location": "Atelier A"})
+    client.get("/esp32-devices/", headers=admin)
+    client.get(f"/esp32-devices/{devices[0]['id']}", headers=admin)
+    client.patch(f"/esp32-devices/{devices[1]['id']}/motor", headers=admin, params={"motor_id": motors[1]["id"]})
+    client.patch(f"/esp32-devices/{devices[1]['id']}/activate", headers=admin, params={"is_active": True})
+    client.get(f"/safety/configs/motor/{motor_id}", headers=tech)
+    client.put(f"/safety/configs/motor/{motor_id}", headers=admin, json={"max_vibration": 4.0})
+
+    # Télémétrie (dépassement de seuil : notifications)
+    for motor, device in zip(motors, devices):
+        api_key = {"X-API-Key": device["api_key"]}
+        for temperature in (40, 80, 85):
+            client.post("/iot/telemetry/from-esp32", headers=api_key, json={
+                "motor_id": motor["id"], "temperature": temperature, "vibration": 1.5,
+                "current": 10.0, "speed_rpm": 1450, "is_running": True, "battery_percent": 80
+            })
+        now = datetime.utcnow()
+        client.post("/iot/telemetry/from-esp32/batch", headers=api_key, json={
+            "motor_id": motor["id"], "readings": [
+                {"temperature": 45, "vibration": 1.5, "current": 10.0, "speed_rpm": 1450,
+                 "is_running": True, "timestamp": (now - timedelta(seconds=s)).isoformat()}
+                for s in range(10)
+            ]
+        })
+        client.post(
+            "/iot/telemetry/from-esp32/packed",
+            headers={**api_key, "Content-Type": PACKED_MEDIA_TYPE},
+            content=encode_packed_telemetry(motor["id"], [
+                {"temperature": 46, "vibration": 1.5, "current": 10.0, "speed_rpm": 1450,
+                 "is_running": True, "timestamp": now - timedelta(seconds=s)}
+                for s in range(10)
+            ])
+        )
+        client.post("/telemetry/", headers=admin, json={
+            "motor_id": motor["id"], "temperature": 50, "vibration": 1.5,
+            "current": 10.0, "speed_rpm": 1450, "is_running": True
+        })
+    client.get(f"/telemetry/motor/{motor_id}", headers=tech)
+    history = client.get(f"/telemetry/motor/{motor_id}", headers=tech, params={"limit": 5})
+    client.get(f"/telemetry/motor/{motor_id}", headers=tech, params={"limit": 5, "cursor": history.headers.get("X-Next-Cursor")})
+    client.get(f"/telemetry/motor/{motor_id}", headers={**tech, "Accept": "application/vnd.motorguard.telemetry-columns"})
+    for resolution in ("1m", "1h", "1d"):
+        client.get(f"/telemetry/motor/{motor_id}/aggregate", headers=tech, params={"resolution": resolution})
+    client.get(f"/telemetry/motor/{motor_id}/stats", headers=tech)
+    client.get(f"/telemetry/motor/{motor_id}/stats", headers=tech, params={"hours": 24 * 30, "bins": 5})
+    client.get(f"/telemetry/motor/{motor_id}/export", headers=tech)
+    client.get(f"/telemetry/motor/{motor_id}/export", headers=tech, params={"format": "csv"})
+    client.get(f"/telemetry/motor/{motor_id}/latest", headers=tech)
+
+    # Simulation IoT
+    client.get("/iot/motor/status", headers=tech, params={"motor_code": "M000"})
+    client.post("/iot/motor/command", headers=tech, params={"esp32_uid": "ESP32_000"}, json={"action": "STOP"})
+    client.post("/iot/motor/command", headers=tech, params={"motor_code": "M000"}, json={"action": "START", "target_speed_rpm": 1200})
+    client.get(f"/iot/motor/{motors[0]['id']}/commands", headers=tech)
+
+    # File de commandes de l'ESP32 : remise des deux commandes, acquittement, puis rien à remettre
+    device_key = {"X-API-Key": devices[0]["api_key"]}
+    client.get("/iot/commands", headers=device_key, params={"after": 0, "wait": 0})
+    client.get("/iot/commands", headers=device_key, params={"after": 2, "wait": 0})
+
+    # Notifications
+    client.get("/notifications/", headers=tech)
+    client.get("/notifications/", headers=tech, params={"unread_only": True, "motor_id": motor_id})
+    client.get("/notifications/unread-count", headers=tech)
+    client.post("/notifications/read", headers=tech, json={"motor_id": motor_id})
+    client.post("/notifications/read", headers=tech, json={})
+
+    # Maintenance
+    tasks = []
+    for technician in technicians[:2]:
+        task = client.post("/maintenance/tasks", headers=admin, json={
+            "motor_id": motor_id, "assigned_to_user_id": technician["id"], "title": "Graissage",
+            "scheduled_date": (datetime.utcnow() + timedelta(days=1)).isoformat()
+        }).json()
+        tasks.append(task)
+    client.get("/maintenance/tasks", headers=admin)
+    client.get("/maintenance/tasks", headers=tech)
+    client.get(f"/maintenance/tasks/{tasks[0]['id']}", headers=tech)
+    client.put(f"/maintenance/tasks/{tasks[0]['id']}/status", headers=tech, params={"new_status": "IN_PROGRESS"})
+    started = datetime.utcnow()
+    client.post("/maintenance/reports", headers=tech, json={
+        "task_id": tasks[0]["id"], "summary": "Fait", "start_time": started.isoformat(),
+        "end_time": (started + timedelta(hours=1)).isoformat()
+    })
+    client.get(f"/maintenance/reports/task/{tasks[0]['id']}", headers=tech)
+
+    # Vue d'ensemble du parc (invalidée par les tâches), puis rafraîchissement sans changement
+    overview = client.get("/fleet/overview", headers=tech)
+    client.get("/fleet/overview", headers={**tech, "If-None-Match": overview.headers.get("ETag", "")})
+
+    # Temps réel : flux SSE refusé (le flux accepté ne se termine pas), WebSocket ouvert puis fermé
+    client.get("/live/telemetry", headers={"Authorization": "Bearer invalide"})
+    with client.websocket_connect(f"/live/ws?token={tech_login['access_token']}&motor_id={motor_id}"):
+        pass
+
+    # Suppressions
+    client.delete(f"/esp32-devices/{devices[2]['id']}", headers=admin)
+    client.post(f"/esp32-devices/{devices[0]['id']}/regenerate-api-key", headers=admin)
+    client.delete(f"/motors/{motors[2]['id']}", headers=admin)
+
+    # Routes système
+    for path in ("/", "/health", "/health/caches", "/health/database", "/metrics"):
+        client.get(path, headers=admin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--verbose", action="store_true", help="Afficher les requêtes SQL de chaque route")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="motorguard-budgets-")
+    os.environ["MOTORGUARD_DATABASE_PATH"] = os.path.join(directory, "motorguard.db")
+    os.environ.setdefault("MOTORGUARD_PASSWORD_HASH_ROUNDS", "4")  # Budget SQL, pas bcrypt
+
+    from fastapi.routing import APIRoute, APIWebSocketRoute
+    from fastapi.testclient import TestClient
+
+    from app.database import async_engine, async_read_engine, engine
+    from app.deps import esp32_device_cache, user_cache
+    from app.main import app
+    from app.query_budget import QueryRecorder
+
+    recorder = QueryRecorder(app, [engine, async_engine.sync_engine, async_read_engine.sync_engine])
+
+    async def cold_caches(scope, receive, send):
+        # Le budget couvre le pire cas : authentification sans cache
+        if scope["type"] != "lifespan":
+            user_cache.clear()
+            esp32_device_cache.clear()
+        await recorder(scope, receive, send)
+
+    try:
+        with TestClient(cold_caches) as client:
+            scenario(client)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    routes = recorder.by_route()
+    failures = 0
+    print(f"{'route':<52}{'statuts':>12}{'max SQL':>9}{'budget':>8}")
+    for name, calls in sorted(routes.items(), key=lambda item: item[0].split(" ", 1)[::-1]):
+        budget = calls[0].budget
+        worst = max(calls, key=lambda call: len(call.statements))
+        problems = sorted({problem for call in calls for problem in call.violations()})
+        failures += bool(problems)
+        statuses = ",".join(str(status) for status in sorted({call.status for call in calls}))
+        print(
+            f"{name:<52}{statuses:>12}{len(worst.statements):>9}"
+            f"{budget.statements if budget else '-':>8}  {'ÉCHEC' if problems else 'ok'}"
+        )
+        for problem in problems:
+            print(f"    {problem}")
+        if args.verbose:
+            for statement in worst.statements:
+                print(f"      {statement[:140]}")
+
+    # Routes déclarées mais jamais appelées par le scénario
+    for route in app.routes:
+        if isinstance(route, (APIRoute, APIWebSocketRoute)):
+            methods = sorted(getattr(route, "methods", None) or ["WS"])
+            for method in methods:
+                if f"{method} {route.path}" not in routes:
+                    budget = getattr(route.endpoint, "query_budget", None)
+                    if budget is None:
+                        failures += 1
+                    print(f"{method + ' ' + route.path:<52}{'non appelée':>29}  {'ÉCHEC : aucun budget' if budget is None else ''}")
+
+    print(f"\n{failures} route(s) en échec" if failures else "\nTous les budgets sont respectés")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
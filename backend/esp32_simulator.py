@@ -1,121 +1,205 @@
 #!/usr/bin/env python3
 """
 Simulateur ESP32 pour tests sans matériel
-Votre PC joue le rôle de l'ESP32
+Votre PC joue le rôle de l'ESP32, ou de tout un atelier d'ESP32
+
+Usage :
+  python esp32_simulator.py [port]
+      Un ESP32 (ESP32_001 / M001) sur http://<ip>:<port>/api/...  (port 8001 par défaut)
+  python esp32_simulator.py --devices 200 [--port 8001]
+      200 ESP32 sur un seul port, chacun sous /devices/<uid>/api/... (GET /devices : la liste)
+  python esp32_simulator.py --devices 200 --port 9000 --port-per-device
+      200 ESP32, chacun sur son port (9000, 9001, ...) sous /api/...
+  python esp32_simulator.py --devices 200 --push http://localhost:8000 --rate 1 --jitter 0.2
+      Mode push : chaque ESP32 envoie sa télémétrie au backend (POST /iot/telemetry/from-esp32).
+      Les moteurs et ESP32 manquants sont créés par l'API avec le compte admin
+      (--admin-email / --admin-password) ; les clés API existantes sont réutilisées.
+      Chaque ESP32 reçoit aussi ses commandes par long-polling (GET /iot/commands),
+      sauf avec --no-commands. --binary : télémétrie au format compact
+      (POST /iot/telemetry/from-esp32/packed, voir app/packed.py).
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import argparse
 import json
 import random
-from datetime import datetime
-from urllib.parse import urlparse, parse_qs
 import socket
+import struct
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Format binaire compact du backend (app/packed.py) : en-tête puis une lecture par envoi
+PACKED_MEDIA_TYPE = "application/vnd.motorguard.telemetry-packed"
+PACKED_HEADER = struct.Struct("<4sBBHI")
+PACKED_READING = struct.Struct("<qdddddB")
+
+
+class VirtualESP32:
+    """Un ESP32 simulé : identité, clé API et état du moteur (protégé par un verrou)"""
+
+    def __init__(self, esp32_uid, motor_code, seed=None):
+        rng = random.Random(seed)
+        self.esp32_uid = esp32_uid
+        self.motor_code = motor_code
+        self.motor_id = None
+        self.api_key = None
+        # Chaque moteur a son propre point de fonctionnement
+        self.base_temperature = 50 + rng.uniform(-5, 5)
+        self.base_current = 10 + rng.uniform(-2, 2)
+        self.state = {
+            "esp32_uid": esp32_uid,
+            "motor_code": motor_code,
+            "temperature": 55.0,
+            "vibration": 2.4,
+            "current": 12.5,
+            "speed_rpm": 1450.0,
+            "is_running": True,
+            "battery_percent": 87.0,
+        }
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.errors = 0
+        self.last_command_seq = 0  # Dernière commande du backend exécutée (acquittée au prochain appel)
+        self.commands = 0
+        self.command_latency = 0.0  # Somme des délais création -> réception des commandes
+
+    def sample(self):
+        """Nouvelle mesure (variations aléatoires réalistes), retourne une copie de l'état"""
+        with self._lock:
+            state = self.state
+            if state["is_running"]:
+                state["temperature"] = round(self.base_temperature + random.uniform(-5, 15), 1)
+                state["vibration"] = round(2.0 + random.uniform(-0.5, 2.0), 1)
+                state["current"] = round(self.base_current + random.uniform(-2, 8), 1)
+                state["speed_rpm"] = round(1400 + random.uniform(-50, 100), 1)
+            else:
+                state["temperature"] = round(25 + random.uniform(-2, 5), 1)
+                state["vibration"] = round(0.1 + random.uniform(-0.05, 0.1), 1)
+                state["current"] = 0.0
+                state["speed_rpm"] = 0.0
+
+            state["battery_percent"] = round(
+                max(0, state["battery_percent"] - random.uniform(0, 0.2)), 1
+            )
+            state["timestamp"] = datetime.utcnow().isoformat() + "Z"
+            return dict(state)
+
+    def command(self, data):
+        """Applique une commande START/STOP ; retourne False si l'action est invalide"""
+        action = data.get("action")
+        with self._lock:
+            if action == "START":
+                self.state["is_running"] = True
+                self.state["speed_rpm"] = data.get("target_speed_rpm", 1500.0)
+                print(f"✅ [COMMANDE] {self.esp32_uid} : moteur démarré à {self.state['speed_rpm']} RPM")
+            elif action == "STOP":
+                self.state["is_running"] = False
+                self.state["speed_rpm"] = 0.0
+                print(f"🛑 [COMMANDE] {self.esp32_uid} : moteur arrêté")
+            else:
+                return False
+        return True
 
-# État simulé du moteur
-motor_state = {
-    "esp32_uid": "ESP32_001",
-    "motor_code": "M001",
-    "temperature": 55.0,
-    "vibration": 2.4,
-    "current": 12.5,
-    "speed_rpm": 1450.0,
-    "is_running": True,
-    "battery_percent": 87.0,
-}
 
 class ESP32SimulatorHandler(BaseHTTPRequestHandler):
+    """
+    Routes d'un ESP32 (/api/health, /api/motor/status, /api/motor/command).
+    Sur un serveur partagé, chaque ESP32 est sous /devices/<uid>/api/... et /api/...
+    désigne le premier (compatibilité avec l'app Flutter en mode local).
+    """
+    devices = {}  # uid -> VirtualESP32, défini par serveur (voir make_server)
+    default_device = None
+    verbose = True
+
+    def _resolve(self):
+        """Retourne (ESP32, route) pour le chemin de la requête"""
+        path = urlparse(self.path).path
+        if path.startswith("/devices/"):
+            _, _, uid, *rest = path.split("/", 3)
+            return self.devices.get(uid), "/" + (rest[0] if rest else "")
+        return self.default_device, path
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_found(self):
+        self.send_response(404)
+        self.send_header("Content-Length", "9")
+        self.end_headers()
+        self.wfile.write(b"Not Found")
+
     def do_GET(self):
-        parsed_path = urlparse(self.path)
-        
-        # Health check - utilisé par le scan réseau
-        if parsed_path.path == "/api/health":
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "ok"}).encode())
+        if urlparse(self.path).path == "/devices":
+            self._send_json(200, [
+                {"esp32_uid": device.esp32_uid, "motor_code": device.motor_code}
+                for device in self.devices.values()
+            ])
             return
-        
+
+        device, route = self._resolve()
+        if device is None:
+            self._not_found()
+        # Health check - utilisé par le scan réseau
+        elif route == "/api/health":
+            self._send_json(200, {"status": "ok"})
         # Motor status - récupère l'état du moteur
-        elif parsed_path.path == "/api/motor/status":
-            # Simuler des variations aléatoires réalistes
-            if motor_state["is_running"]:
-                motor_state["temperature"] = round(50 + random.uniform(-5, 15), 1)
-                motor_state["vibration"] = round(2.0 + random.uniform(-0.5, 2.0), 1)
-                motor_state["current"] = round(10 + random.uniform(-2, 8), 1)
-                motor_state["speed_rpm"] = round(1400 + random.uniform(-50, 100), 1)
-            else:
-                motor_state["temperature"] = round(25 + random.uniform(-2, 5), 1)
-                motor_state["vibration"] = round(0.1 + random.uniform(-0.05, 0.1), 1)
-                motor_state["current"] = 0.0
-                motor_state["speed_rpm"] = 0.0
-            
-            motor_state["battery_percent"] = round(
-                max(0, motor_state["battery_percent"] - random.uniform(0, 0.2)), 1
-            )
-            motor_state["timestamp"] = datetime.utcnow().isoformat() + "Z"
-            
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.end_headers()
-            self.wfile.write(json.dumps(motor_state).encode())
-            return
-        
+        elif route == "/api/motor/status":
+            self._send_json(200, device.sample())
         # Route non trouvée
         else:
-            self.send_response(404)
-            self.end_headers()
-            self.wfile.write(b"Not Found")
-    
+            self._not_found()
+
     def do_POST(self):
-        parsed_path = urlparse(self.path)
-        
+        device, route = self._resolve()
         # Motor command - contrôle le moteur
-        if parsed_path.path == "/api/motor/command":
+        if device is not None and route == "/api/motor/command":
             content_length = int(self.headers.get("Content-Length", 0))
             body = self.rfile.read(content_length)
-            
             try:
                 data = json.loads(body.decode())
-                action = data.get("action")
-                
-                if action == "START":
-                    motor_state["is_running"] = True
-                    motor_state["speed_rpm"] = data.get("target_speed_rpm", 1500.0)
-                    print(f"✅ [COMMANDE] Moteur démarré à {motor_state['speed_rpm']} RPM")
-                elif action == "STOP":
-                    motor_state["is_running"] = False
-                    motor_state["speed_rpm"] = 0.0
-                    print(f"🛑 [COMMANDE] Moteur arrêté")
-                else:
-                    self.send_response(400)
-                    self.send_header("Content-Type", "application/json")
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Invalid action"}).encode())
-                    return
-                
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.send_header("Access-Control-Allow-Origin", "*")
-                self.end_headers()
-                self.wfile.write(json.dumps({"status": "ok"}).encode())
-                
             except json.JSONDecodeError:
-                self.send_response(400)
-                self.end_headers()
-                self.wfile.write(b"Invalid JSON")
-            return
-        
+                self._send_json(400, {"error": "Invalid JSON"})
+                return
+            if device.command(data):
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(400, {"error": "Invalid action"})
         # Route non trouvée
         else:
-            self.send_response(404)
-            self.end_headers()
-            self.wfile.write(b"Not Found")
-    
+            self._not_found()
+
     def log_message(self, format, *args):
-        # Logs personnalisés
-        print(f"[ESP32 Sim] {args[0]}")
+        # Logs personnalisés (désactivés au-delà d'un ESP32, sauf --verbose)
+        if self.verbose:
+            print(f"[ESP32 Sim] {args[0]}")
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    """Serveur HTTP multi-thread (un thread par connexion)"""
+    daemon_threads = True
+    request_queue_size = 128  # File d'attente TCP : des centaines de clients qui interrogent en même temps
+
+
+def make_server(port, devices, verbose):
+    """Serveur HTTP pour un groupe d'ESP32"""
+    handler = type("Handler", (ESP32SimulatorHandler,), {
+        "devices": {device.esp32_uid: device for device in devices},
+        "default_device": devices[0],
+        "verbose": verbose,
+    })
+    return SimulatorServer(("0.0.0.0", port), handler)  # 0.0.0.0 = écouter sur toutes les interfaces
+
 
 def get_local_ip():
     """Trouve l'IP locale du PC"""
@@ -126,40 +210,254 @@ def get_local_ip():
         ip = s.getsockname()[0]
         s.close()
         return ip
-    except:
+    except OSError:
         return "127.0.0.1"
 
-def run(server_class=HTTPServer, handler_class=ESP32SimulatorHandler, port=8001):
-    server_address = ("0.0.0.0", port)  # 0.0.0.0 = écouter sur toutes les interfaces
-    httpd = server_class(server_address, handler_class)
-    
+
+def api_request(base_url, method, path, token=None, payload=None, form=None):
+    """Requête JSON vers le backend MotorGuard"""
+    headers = {}
+    data = None
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    if payload is not None:
+        data = json.dumps(payload).encode()
+        headers["Content-Type"] = "application/json"
+    elif form is not None:
+        data = urllib.parse.urlencode(form).encode()
+        headers["Content-Type"] = "application/x-www-form-urlencoded"
+    request = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read() or b"null")
+
+
+def provision(base_url, devices, email, password):
+    """
+    Associe chaque ESP32 simulé à un moteur et une clé API du backend,
+    en créant par l'API les moteurs et ESP32 qui n'existent pas encore
+    """
+    token = api_request(base_url, "POST", "/auth/login", form={"username": email, "password": password})["access_token"]
+    motors = {motor["code"]: motor for motor in api_request(base_url, "GET", "/motors/", token)}
+    registered = {device["esp32_uid"]: device for device in api_request(base_url, "GET", "/esp32-devices/", token)}
+
+    created = 0
+    for device in devices:
+        motor = motors.get(device.motor_code)
+        if motor is None:
+            motor = api_request(base_url, "POST", "/motors/", token, {
+                "name": f"Moteur simulé {device.motor_code}",
+                "code": device.motor_code,
+                "esp32_uid": device.esp32_uid,
+            })
+            created += 1
+        registration = registered.get(device.esp32_uid)
+        if registration is None:
+            registration = api_request(base_url, "POST", "/esp32-devices/", token, {
+                "esp32_uid": device.esp32_uid, "motor_id": motor["id"]
+            })
+        elif registration["motor_id"] != motor["id"]:
+            registration = api_request(
+                base_url, "PATCH", f"/esp32-devices/{registration['id']}/motor?motor_id={motor['id']}", token
+            )
+        device.motor_id = motor["id"]
+        device.api_key = registration["api_key"]
+    print(f"🔑 {len(devices)} ESP32 associés au backend ({created} moteurs créés)")
+
+
+def pack_reading(motor_id, reading):
+    """Une lecture au format compact, horodatée à la réception par le backend (timestamp 0)"""
+    return PACKED_HEADER.pack(b"MGTP", 1, 0, 1, motor_id) + PACKED_READING.pack(
+        0, reading["temperature"], reading["vibration"], reading["current"], reading["speed_rpm"],
+        reading["battery_percent"], 1 if reading["is_running"] else 0,
+    )
+
+
+def push_loop(device, base_url, rate, jitter, stop, binary=False):
+    """Envoie la télémétrie d'un ESP32 au backend, `rate` fois par seconde (± jitter)"""
+    interval = 1.0 / rate
+    # Démarrages étalés : les ESP32 d'un atelier ne sont pas synchronisés
+    if stop.wait(random.uniform(0, interval)):
+        return
+    url = base_url + ("/iot/telemetry/from-esp32/packed" if binary else "/iot/telemetry/from-esp32")
+    content_type = PACKED_MEDIA_TYPE if binary else "application/json"
+    while not stop.is_set():
+        reading = device.sample()
+        if binary:
+            data = pack_reading(device.motor_id, reading)
+        else:
+            data = json.dumps({
+                "motor_id": device.motor_id,
+                **{key: reading[key] for key in (
+                    "temperature", "vibration", "current", "speed_rpm", "is_running", "battery_percent"
+                )},
+            }).encode()
+        request = urllib.request.Request(
+            url,
+            data=data,
+            headers={"Content-Type": content_type, "X-API-Key": device.api_key},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+            device.sent += 1
+        except (urllib.error.URLError, OSError):
+            device.errors += 1
+        stop.wait(interval * random.uniform(1 - jitter, 1 + jitter))
+
+
+def command_loop(device, base_url, stop, wait=30):
+    """
+    Reçoit les commandes d'un ESP32 par long-polling : la requête reste ouverte jusqu'à
+    `wait` secondes et revient dès qu'une commande est envoyée. Le numéro de la dernière
+    commande exécutée est renvoyé à chaque appel (acquittement).
+    """
+    while not stop.is_set():
+        query = urllib.parse.urlencode({"after": device.last_command_seq, "wait": wait})
+        request = urllib.request.Request(
+            f"{base_url}/iot/commands?{query}", headers={"X-API-Key": device.api_key}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=wait + 10) as response:
+                commands = json.loads(response.read())
+        except (urllib.error.URLError, OSError, ValueError):
+            device.errors += 1
+            stop.wait(1)
+            continue
+        received = datetime.utcnow()
+        for command in commands:
+            if command["seq"] <= device.last_command_seq:
+                continue  # Déjà exécutée (remise à nouveau faute d'acquittement)
+            payload = {"action": command["action"]}
+            if command["target_speed_rpm"] is not None:
+                payload["target_speed_rpm"] = command["target_speed_rpm"]
+            device.command(payload)
+            device.last_command_seq = command["seq"]
+            device.commands += 1
+            device.command_latency += (received - datetime.fromisoformat(command["created_at"])).total_seconds()
+
+
+def report_loop(devices, stop, period=10):
+    last = 0
+    while not stop.wait(period):
+        sent = sum(device.sent for device in devices)
+        errors = sum(device.errors for device in devices)
+        commands = sum(device.commands for device in devices)
+        latency = sum(device.command_latency for device in devices)
+        line = f"📤 {sent} lectures envoyées ({(sent - last) / period:.0f}/s), {errors} erreurs"
+        if commands:
+            line += f", {commands} commandes reçues ({latency / commands * 1000:.0f} ms en moyenne)"
+        print(line)
+        last = sent
+
+
+def make_devices(count):
+    if count == 1:
+        return [VirtualESP32("ESP32_001", "M001")]
+    width = max(3, len(str(count)))
+    return [
+        VirtualESP32(f"ESP32_{i:0{width}d}", f"M{i:0{width}d}", seed=i)
+        for i in range(1, count + 1)
+    ]
+
+
+def run(args):
+    devices = make_devices(args.devices)
+    verbose = args.verbose or len(devices) == 1
+    stop = threading.Event()
+    threads = []
+    servers = []
+
+    if not args.no_serve:
+        if args.port_per_device:
+            servers = [make_server(args.port + i, [device], verbose) for i, device in enumerate(devices)]
+        else:
+            servers = [make_server(args.port, devices, verbose)]
+        for server in servers:
+            threads.append(threading.Thread(target=server.serve_forever, daemon=True))
+
+    if args.push:
+        base_url = args.push.rstrip("/")
+        provision(base_url, devices, args.admin_email, args.admin_password)
+        threads += [
+            threading.Thread(
+                target=push_loop, args=(device, base_url, args.rate, args.jitter, stop, args.binary), daemon=True
+            )
+            for device in devices
+        ]
+        if not args.no_commands:
+            threads += [
+                threading.Thread(target=command_loop, args=(device, base_url, stop), daemon=True)
+                for device in devices
+            ]
+        threads.append(threading.Thread(target=report_loop, args=(devices, stop), daemon=True))
+
     local_ip = get_local_ip()
-    
     print("=" * 60)
     print("🚀 SIMULATEUR ESP32 DÉMARRÉ")
     print("=" * 60)
     print(f"📡 IP du PC (ESP32) : {local_ip}")
-    print(f"🌐 Port : {port}")
-    print(f"\n📋 Endpoints disponibles :")
-    print(f"   - GET  http://{local_ip}:{port}/api/health")
-    print(f"   - GET  http://{local_ip}:{port}/api/motor/status")
-    print(f"   - POST http://{local_ip}:{port}/api/motor/command")
-    print(f"\n💡 Configuration dans l'app Flutter :")
-    print(f"   - Mode : Local autonome")
-    print(f"   - IP ESP32 : {local_ip}")
-    print(f"   - Port : {port}")
+    if servers and len(devices) == 1:
+        port = args.port
+        print(f"🌐 Port : {port}")
+        print(f"\n📋 Endpoints disponibles :")
+        print(f"   - GET  http://{local_ip}:{port}/api/health")
+        print(f"   - GET  http://{local_ip}:{port}/api/motor/status")
+        print(f"   - POST http://{local_ip}:{port}/api/motor/command")
+        print(f"\n💡 Configuration dans l'app Flutter :")
+        print(f"   - Mode : Local autonome")
+        print(f"   - IP ESP32 : {local_ip}")
+        print(f"   - Port : {port}")
+    elif servers and args.port_per_device:
+        print(f"🌐 {len(devices)} ESP32 sur les ports {args.port} à {args.port + len(devices) - 1}")
+        print(f"   - GET  http://{local_ip}:{args.port}/api/motor/status  ({devices[0].esp32_uid})")
+    elif servers:
+        print(f"🌐 {len(devices)} ESP32 sur le port {args.port}")
+        print(f"   - GET  http://{local_ip}:{args.port}/devices")
+        print(f"   - GET  http://{local_ip}:{args.port}/devices/{devices[0].esp32_uid}/api/motor/status")
+    if args.push:
+        print(
+            f"📤 Push : {args.rate:g} lecture(s)/s par ESP32 (± {args.jitter:.0%}) vers {args.push}"
+            f" ({'binaire compact' if args.binary else 'JSON'})"
+        )
+        if not args.no_commands:
+            print(f"📥 Commandes : long-polling de {args.push}/iot/commands")
     print(f"\n⏹️  Appuyez sur Ctrl+C pour arrêter")
     print("=" * 60)
     print()
-    
+
+    for thread in threads:
+        thread.start()
     try:
-        httpd.serve_forever()
+        while True:
+            time.sleep(1)
     except KeyboardInterrupt:
         print("\n\n🛑 Arrêt du simulateur ESP32...")
-        httpd.shutdown()
+        stop.set()
+        for server in servers:
+            server.shutdown()
 
-if __name__ == "__main__":
-    import sys
-    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8001
-    run(port=port)
 
+def main():
+    parser = argparse.ArgumentParser(description="Simulateur ESP32 pour tests sans matériel")
+    parser.add_argument("legacy_port", nargs="?", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=8001, help="Port HTTP (premier port avec --port-per-device)")
+    parser.add_argument("--devices", type=int, default=1, help="Nombre d'ESP32 simulés")
+    parser.add_argument("--port-per-device", action="store_true", help="Un port par ESP32 au lieu d'un préfixe /devices/<uid>")
+    parser.add_argument("--no-serve", action="store_true", help="Ne pas exposer l'API HTTP des ESP32 (push seul)")
+    parser.add_argument("--push", metavar="BACKEND_URL", help="Envoyer la télémétrie au backend (ex. http://localhost:8000)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Lectures par seconde et par ESP32 en mode push")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variation aléatoire de l'intervalle d'envoi (0.2 = ±20 %%)")
+    parser.add_argument("--binary", action="store_true", help="Télémétrie au format binaire compact en mode push")
+    parser.add_argument("--no-commands", action="store_true", help="Ne pas recevoir les commandes du backend en mode push")
+    parser.add_argument("--admin-email", default="admin@motorguard.local")
+    parser.add_argument("--admin-password", default="admin123")
+    parser.add_argument("--verbose", action="store_true", help="Journaliser chaque requête reçue")
+    args = parser.parse_args()
+    if args.legacy_port is not None:
+        args.port = args.legacy_port
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Arrêt automatique du moteur de sécurité : la commande STOP doit parvenir à l'ESP32
+Usage: python -m pytest tests (depuis backend/)
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Base temporaire, avant le chargement de la configuration
+os.environ["MOTORGUARD_DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(), "motorguard.db")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+def test_threshold_breach_queues_stop_command():
+    with TestClient(app) as client:
+        login = client.post("/auth/login", data={"username": "admin@motorguard.local", "password": "admin123"})
+        admin = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        motor = client.post("/motors/", headers=admin, json={
+            "name": "Moteur sécurité", "code": "S001", "esp32_uid": "ESP32_S001"
+        }).json()
+        device = client.post("/esp32-devices/", headers=admin, json={
+            "esp32_uid": "ESP32_S001", "motor_id": motor["id"]
+        }).json()
+        client.post("/safety/configs", headers=admin, json={
+            "motor_id": motor["id"], "max_temperature": 70, "emergency_stop_delay_seconds": 5
+        })
+        api_key = {"X-API-Key": device["api_key"]}
+
+        # Dépassement de seuil maintenu au-delà du délai d'arrêt
+        now = datetime.utcnow()
+        response = client.post("/iot/telemetry/from-esp32/batch", headers=api_key, json={
+            "motor_id": motor["id"], "readings": [
+                {"temperature": 85, "vibration": 1.5, "current": 10.0, "speed_rpm": 1450,
+                 "is_running": True, "timestamp": (now - timedelta(seconds=s)).isoformat()}
+                for s in (10, 5, 0)
+            ]
+        })
+        assert response.status_code == 201
+
+        commands = client.get("/iot/commands", headers=api_key, params={"after": 0, "wait": 5}).json()
+        assert [command["action"] for command in commands] == ["STOP"]
+        assert commands[0]["motor_id"] == motor["id"]
+
+        status = client.get("/iot/motor/status", headers=admin, params={"motor_code": "S001"}).json()
+        assert status["is_running"] is False
@@ -12,6 +12,7 @@ class AuthProvider with ChangeNotifier {
   User? _currentUser;
   bool _isAuthenticated = false;
   String? _token;
+  String? _refreshToken;
   DateTime? _tokenExpiry;
 
   User? get currentUser => _currentUser;
@@ -36,15 +37,18 @@ class AuthProvider with ChangeNotifier {
     final prefs = await SharedPreferences.getInstance();
     final userId = prefs.getInt('current_user_id');
     final token = prefs.getString('auth_token');
+    final refreshToken = prefs.getString('refresh_token');
     final operationMode = prefs.getString('operation_mode') ?? 'autonomous';
 
     if (operationMode == 'server' && token != null) {
       // Mode serveur : vérifier si le token est valide
       _token = token;
+      _refreshToken = refreshToken;
       _tokenExpiry = _getTokenExpiry(token);
-      if (_isTokenValid) {
+      if (_isTokenValid || _refreshToken != null) {
         // Charger l'utilisateur depuis le backend
         // Note: nécessite ConfigProvider, sera fait après l'initialisation
+        // (un token expiré est renouvelé par getValidToken)
       } else {
         // Token expiré, déconnecter
         await logout();
@@ -71,8 +75,9 @@ class AuthProvider with ChangeNotifier {
       if (parts.length != 3) return null;
 
       final payload = parts[1];
-      final normalized = base64.normalize(payload);
-      final decoded = utf8.decode(base64.decode(normalized));
+      // Le payload d'un JWT est encodé en base64url
+      final normalized = base64Url.normalize(payload);
+      final decoded = utf8.decode(base64Url.decode(normalized));
       final data = json.decode(decoded) as Map<String, dynamic>;
 
       final exp = data['exp'] as int?;
@@ -87,11 +92,31 @@ class AuthProvider with ChangeNotifier {
 
   Future<String?> getValidToken() async {
     if (_isTokenValid) return _token;
-    // Token expiré, déconnecter
+    // Token expiré : le renouveler sans mot de passe si possible
+    if (_refreshToken != null && _backendAuthRepository != null) {
+      final result = await _backendAuthRepository!.refresh(_refreshToken!);
+      if (result != null) {
+        await _saveTokens(result);
+        return _token;
+      }
+    }
+    // Renouvellement impossible, déconnecter
     await logout();
     return null;
   }
 
+  Future<void> _saveTokens(Map<String, dynamic> tokens) async {
+    _token = tokens['access_token'];
+    _refreshToken = tokens['refresh_token'];
+    _tokenExpiry = _getTokenExpiry(_token!);
+
+    final prefs = await SharedPreferences.getInstance();
+    await prefs.setString('auth_token', _token!);
+    if (_refreshToken != null) {
+      await prefs.setString('refresh_token', _refreshToken!);
+    }
+  }
+
   Future<bool> login(String email, String password,
       {ConfigProvider? configProvider}) async {
     // Détecter le mode d'opération
@@ -123,8 +148,8 @@ class AuthProvider with ChangeNotifier {
           _currentUser = user;
           _isAuthenticated = true;
 
-          // Sauvegarder le token et le mode
-          await prefs.setString('auth_token', _token!);
+          // Sauvegarder les tokens et le mode
+          await _saveTokens(result);
           await prefs.setString('operation_mode', 'server');
 
           notifyListeners();
@@ -153,11 +178,13 @@ class AuthProvider with ChangeNotifier {
     _currentUser = null;
     _isAuthenticated = false;
     _token = null;
+    _refreshToken = null;
     _tokenExpiry = null;
 
     final prefs = await SharedPreferences.getInstance();
     await prefs.remove('current_user_id');
     await prefs.remove('auth_token');
+    await prefs.remove('refresh_token');
 
     notifyListeners();
   }
@@ -19,6 +19,8 @@ class MotorProvider with ChangeNotifier {
 
   List<Motor> _motors = [];
   Map<int, Telemetry?> _latestTelemetry = {};
+  // Vue d'ensemble du parc (mode serveur) : sécurité, tâches ouvertes, en ligne
+  final Map<int, Map<String, dynamic>> _fleetStatus = {};
   Timer? _telemetryTimer;
   bool _isPolling = false;
   bool _isConnected = true;
@@ -26,6 +28,7 @@ class MotorProvider with ChangeNotifier {
 
   List<Motor> get motors => _motors;
   Map<int, Telemetry?> get latestTelemetry => _latestTelemetry;
+  Map<int, Map<String, dynamic>> get fleetStatus => _fleetStatus;
   bool get isConnected => _isConnected;
   String? get connectionError => _connectionError;
 
@@ -170,45 +173,18 @@ class MotorProvider with ChangeNotifier {
       {AuthProvider? authProvider}) async {
     if (configProvider.operationMode == 'server') {
       // Mode serveur : les données viennent du backend (l'ESP32 envoie directement)
-      // On récupère juste les dernières valeurs depuis le backend
+      // Une seule requête pour tout le parc ; 304 si rien n'a changé
       if (_backendMotorRepository != null) {
-        bool hasSuccess = false;
-        for (final motor in _motors) {
-          try {
-            final status =
-                await _backendMotorRepository!.getMotorStatus(motor.id!);
-            if (status != null) {
-              hasSuccess = true;
-              // Mettre à jour le moteur avec les dernières valeurs
-              final updatedMotor = motor.copyWith(
-                isRunning: status['is_running'] ?? false,
-                lastTemperature: status['temperature']?.toDouble(),
-                lastVibration: status['vibration']?.toDouble(),
-                lastCurrent: status['current']?.toDouble(),
-                lastSpeedRpm: status['speed_rpm']?.toDouble(),
-                lastBatteryPercent: status['battery_percent']?.toDouble(),
-                lastUpdate: status['created_at'] != null
-                    ? DateTime.parse(status['created_at'])
-                    : null,
-              );
-              // Mettre à jour dans la liste
-              final index = _motors.indexWhere((m) => m.id == motor.id);
-              if (index != -1) {
-                _motors[index] = updatedMotor;
-              }
-            }
-          } catch (e) {
-            // Erreur de connexion - on continue pour les autres moteurs
-            if (!hasSuccess) {
-              _isConnected = false;
-              _connectionError = 'Erreur de connexion au serveur';
-            }
-          }
-        }
-        // Si au moins une requête a réussi, on considère la connexion OK
-        if (hasSuccess) {
+        try {
+          final overview = await _backendMotorRepository!.getFleetOverview();
           _isConnected = true;
           _connectionError = null;
+          if (overview != null) {
+            _applyFleetOverview(overview);
+          }
+        } catch (e) {
+          _isConnected = false;
+          _connectionError = 'Erreur de connexion au serveur';
         }
         notifyListeners();
       }
@@ -275,6 +251,33 @@ class MotorProvider with ChangeNotifier {
     }
   }
 
+  /// Statistiques d'un moteur calculées par le backend (mode serveur uniquement)
+  Future<Map<String, dynamic>?> fetchMotorStatistics(int motorId,
+      {int hours = 24}) async {
+    if (_backendMotorRepository == null) return null;
+    return _backendMotorRepository!.getMotorStatistics(motorId, hours: hours);
+  }
+
+  void _applyFleetOverview(List<Map<String, dynamic>> overview) {
+    for (final status in overview) {
+      final motorId = status['id'] as int;
+      _fleetStatus[motorId] = status;
+      final index = _motors.indexWhere((m) => m.id == motorId);
+      if (index == -1) continue;
+      _motors[index] = _motors[index].copyWith(
+        isRunning: status['is_running'] ?? false,
+        lastTemperature: status['last_temperature']?.toDouble(),
+        lastVibration: status['last_vibration']?.toDouble(),
+        lastCurrent: status['last_current']?.toDouble(),
+        lastSpeedRpm: status['last_speed_rpm']?.toDouble(),
+        lastBatteryPercent: status['last_battery_percent']?.toDouble(),
+        lastUpdate: status['last_update'] != null
+            ? DateTime.parse(status['last_update'])
+            : null,
+      );
+    }
+  }
+
   Future<bool> sendMotorCommand(
     int motorId,
     String action, {
@@ -26,6 +26,33 @@ class BackendAuthRepository {
         return {
           'access_token': data['access_token'],
           'token_type': data['token_type'] ?? 'bearer',
+          'refresh_token': data['refresh_token'],
+        };
+      }
+      return null;
+    } catch (e) {
+      return null;
+    }
+  }
+
+  /// Nouveau token d'accès à partir du token de rafraîchissement (sans mot de passe)
+  Future<Map<String, dynamic>?> refresh(String refreshToken) async {
+    try {
+      final uri = Uri.parse('$baseUrl/auth/refresh');
+      final response = await http
+          .post(
+            uri,
+            headers: {'Content-Type': 'application/json'},
+            body: json.encode({'refresh_token': refreshToken}),
+          )
+          .timeout(const Duration(seconds: 10));
+
+      if (response.statusCode == 200) {
+        final data = json.decode(response.body) as Map<String, dynamic>;
+        return {
+          'access_token': data['access_token'],
+          'token_type': data['token_type'] ?? 'bearer',
+          'refresh_token': data['refresh_token'],
         };
       }
       return null;
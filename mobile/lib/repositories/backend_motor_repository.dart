@@ -139,6 +139,47 @@ class BackendMotorRepository {
     }
   }
 
+  /// Statistiques de télémétrie sur les `hours` dernières heures, calculées par le
+  /// serveur (GET /telemetry/motor/{id}/stats) : min/max/moyenne/écart-type, centiles,
+  /// histogrammes par mesure et temps en marche / à l'arrêt.
+  Future<Map<String, dynamic>?> getMotorStatistics(int motorId,
+      {int hours = 24}) async {
+    try {
+      final uri =
+          Uri.parse('$baseUrl/telemetry/motor/$motorId/stats?hours=$hours');
+      final response = await _client
+          .get(uri, headers: _headers)
+          .timeout(const Duration(seconds: 10));
+
+      if (response.statusCode == 200) {
+        return json.decode(response.body) as Map<String, dynamic>;
+      }
+      return null;
+    } catch (e) {
+      return null;
+    }
+  }
+
+  String? _fleetEtag;
+
+  /// Vue d'ensemble du parc en une requête (GET /fleet/overview).
+  /// Retourne null si rien n'a changé depuis l'appel précédent (304, ETag).
+  Future<List<Map<String, dynamic>>?> getFleetOverview() async {
+    final uri = Uri.parse('$baseUrl/fleet/overview');
+    final response = await _client.get(uri, headers: {
+      ..._headers,
+      if (_fleetEtag != null) 'If-None-Match': _fleetEtag!,
+    }).timeout(const Duration(seconds: 10));
+
+    if (response.statusCode == 304) return null;
+    if (response.statusCode == 200) {
+      _fleetEtag = response.headers['etag'];
+      final data = json.decode(response.body) as Map<String, dynamic>;
+      return (data['motors'] as List<dynamic>).cast<Map<String, dynamic>>();
+    }
+    throw Exception('Failed to load fleet overview: ${response.statusCode}');
+  }
+
   Future<bool> sendMotorCommand(int motorId, String action,
       {double? targetSpeedRpm}) async {
     try {
@@ -1,14 +1,48 @@
 import 'package:flutter/material.dart';
+import 'package:provider/provider.dart';
+import '../providers/motor_provider.dart';
 import '../theme/app_theme.dart';
 
-class MotorStatisticsScreen extends StatelessWidget {
+class MotorStatisticsScreen extends StatefulWidget {
   final int motorId;
 
   const MotorStatisticsScreen({super.key, required this.motorId});
 
+  @override
+  State<MotorStatisticsScreen> createState() => _MotorStatisticsScreenState();
+}
+
+class _MotorStatisticsScreenState extends State<MotorStatisticsScreen> {
+  late Future<Map<String, dynamic>?> _statistics;
+
+  @override
+  void initState() {
+    super.initState();
+    // Statistiques des 24 dernières heures calculées par le serveur (null en mode autonome)
+    _statistics = Provider.of<MotorProvider>(context, listen: false)
+        .fetchMotorStatistics(widget.motorId);
+  }
+
+  String _formatDuration(double seconds) {
+    final minutes = seconds ~/ 60;
+    return '${minutes ~/ 60}h ${(minutes % 60).toString().padLeft(2, '0')}m';
+  }
+
   @override
   Widget build(BuildContext context) {
-    // TODO: Récupérer les vraies statistiques depuis le provider
+    return FutureBuilder<Map<String, dynamic>?>(
+      future: _statistics,
+      builder: (context, snapshot) => _buildContent(context, snapshot.data),
+    );
+  }
+
+  Widget _buildContent(BuildContext context, Map<String, dynamic>? stats) {
+    final running = (stats?['running_seconds'] as num?)?.toDouble() ?? 0;
+    final stopped = (stats?['stopped_seconds'] as num?)?.toDouble() ?? 0;
+    final total = running + stopped;
+    final runningPercent = total > 0 ? (running * 100 / total).round() : 0;
+    final channels = (stats?['channels'] as Map<String, dynamic>?) ?? {};
+
     return SingleChildScrollView(
       padding: const EdgeInsets.all(AppTheme.baseSpacing),
       child: Column(
@@ -31,7 +65,7 @@ class MotorStatisticsScreen extends StatelessWidget {
                 ),
                 const SizedBox(height: 16),
                 Text(
-                  '85%',
+                  total > 0 ? '$runningPercent%' : '--',
                   style: Theme.of(context).textTheme.displayLarge?.copyWith(
                         color: Colors.white,
                         fontWeight: FontWeight.bold,
@@ -39,7 +73,7 @@ class MotorStatisticsScreen extends StatelessWidget {
                 ),
                 const SizedBox(height: 8),
                 Text(
-                  'Score d\'efficacité',
+                  'Temps en marche sur 24h',
                   style: Theme.of(context).textTheme.bodyMedium?.copyWith(
                         color: Colors.white70,
                       ),
@@ -55,8 +89,8 @@ class MotorStatisticsScreen extends StatelessWidget {
               Expanded(
                 child: _DonutCard(
                   title: 'Temps de marche',
-                  percentage: 85,
-                  value: '12h 40m',
+                  percentage: runningPercent,
+                  value: total > 0 ? _formatDuration(running) : '--',
                   color: AppTheme.accentGreen,
                 ),
               ),
@@ -64,8 +98,8 @@ class MotorStatisticsScreen extends StatelessWidget {
               Expanded(
                 child: _DonutCard(
                   title: 'Temps d\'arrêt',
-                  percentage: 15,
-                  value: '2h 15m',
+                  percentage: total > 0 ? 100 - runningPercent : 0,
+                  value: total > 0 ? _formatDuration(stopped) : '--',
                   color: Colors.orange,
                 ),
               ),
@@ -73,6 +107,37 @@ class MotorStatisticsScreen extends StatelessWidget {
           ),
           const SizedBox(height: 24),
 
+          // Mesures sur 24h : moyenne et 95e centile calculés par le serveur
+          if (channels.isNotEmpty) ...[
+            Text(
+              'Mesures sur 24h',
+              style: Theme.of(context).textTheme.titleMedium,
+            ),
+            const SizedBox(height: 12),
+            _MeasureCard(
+              icon: Icons.thermostat,
+              title: 'Température',
+              channel: channels['temperature'],
+              unit: '°C',
+            ),
+            const SizedBox(height: 8),
+            _MeasureCard(
+              icon: Icons.vibration,
+              title: 'Vibration',
+              channel: channels['vibration'],
+              unit: 'mm/s',
+              decimals: 2,
+            ),
+            const SizedBox(height: 8),
+            _MeasureCard(
+              icon: Icons.bolt,
+              title: 'Courant',
+              channel: channels['current'],
+              unit: 'A',
+            ),
+            const SizedBox(height: 24),
+          ],
+
           // Chronologie 24h
           Card(
             child: Padding(
@@ -291,6 +356,45 @@ class _LegendItem extends StatelessWidget {
   }
 }
 
+class _MeasureCard extends StatelessWidget {
+  final IconData icon;
+  final String title;
+  final Map<String, dynamic>? channel;
+  final String unit;
+  final int decimals;
+
+  const _MeasureCard({
+    required this.icon,
+    required this.title,
+    required this.channel,
+    required this.unit,
+    this.decimals = 1,
+  });
+
+  String _format(Object? value) =>
+      value is num ? '${value.toStringAsFixed(decimals)} $unit' : '--';
+
+  @override
+  Widget build(BuildContext context) {
+    final percentiles = channel?['percentiles'] as Map<String, dynamic>?;
+    return Card(
+      child: ListTile(
+        leading: Icon(icon, color: AppTheme.primaryBlue),
+        title: Text(title),
+        subtitle: Text(
+          'Moy. ${_format(channel?['mean'])} · Max ${_format(channel?['max'])}',
+        ),
+        trailing: Text(
+          'P95 ${_format(percentiles?['p95'])}',
+          style: Theme.of(context).textTheme.titleMedium?.copyWith(
+                fontWeight: FontWeight.w600,
+              ),
+        ),
+      ),
+    );
+  }
+}
+
 class _ProductionMetricCard extends StatelessWidget {
   final IconData icon;
   final String title;